@@ -0,0 +1,328 @@
+#-------------------------------------------------------------------------------
+# Name:        Sliding Puzzle batch solver
+# Purpose:     Solve many puzzles at once across a pool of processes, without
+#              opening a window.
+#-------------------------------------------------------------------------------
+import os
+import sys
+import json
+import math
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from solver import solve, SearchAborted
+
+# Korf's 100 random 15-puzzles (Korf, 1985), in his notation, each with the
+# length of its shortest solution, so every run can check it got them right
+KORF_100 = (
+    ('14 13 15 7 11 12 9 5 6 0 2 1 4 8 10 3', 57),
+    ('13 5 4 10 9 12 8 14 2 3 7 1 0 15 11 6', 55),
+    ('14 7 8 2 13 11 10 4 9 12 5 0 3 6 1 15', 59),
+    ('5 12 10 7 15 11 14 0 8 2 1 13 3 4 9 6', 56),
+    ('4 7 14 13 10 3 9 12 11 5 6 15 1 2 8 0', 56),
+    ('14 7 1 9 12 3 6 15 8 11 2 5 10 0 4 13', 52),
+    ('2 11 15 5 13 4 6 7 12 8 10 1 9 3 14 0', 52),
+    ('12 11 15 3 8 0 4 2 6 13 9 5 14 1 10 7', 50),
+    ('3 14 9 11 5 4 8 2 13 12 6 7 10 1 15 0', 46),
+    ('13 11 8 9 0 15 7 10 4 3 6 14 5 12 2 1', 59),
+    ('5 9 13 14 6 3 7 12 10 8 4 0 15 2 11 1', 57),
+    ('14 1 9 6 4 8 12 5 7 2 3 0 10 11 13 15', 45),
+    ('3 6 5 2 10 0 15 14 1 4 13 12 9 8 11 7', 46),
+    ('7 6 8 1 11 5 14 10 3 4 9 13 15 2 0 12', 59),
+    ('13 11 4 12 1 8 9 15 6 5 14 2 7 3 10 0', 62),
+    ('1 3 2 5 10 9 15 6 8 14 13 11 12 4 7 0', 42),
+    ('15 14 0 4 11 1 6 13 7 5 8 9 3 2 10 12', 66),
+    ('6 0 14 12 1 15 9 10 11 4 7 2 8 3 5 13', 55),
+    ('7 11 8 3 14 0 6 15 1 4 13 9 5 12 2 10', 46),
+    ('6 12 11 3 13 7 9 15 2 14 8 10 4 1 5 0', 52),
+    ('12 8 14 6 11 4 7 0 5 1 10 15 3 13 9 2', 54),
+    ('14 3 9 1 15 8 4 5 11 7 10 13 0 2 12 6', 59),
+    ('10 9 3 11 0 13 2 14 5 6 4 7 8 15 1 12', 49),
+    ('7 3 14 13 4 1 10 8 5 12 9 11 2 15 6 0', 54),
+    ('11 4 2 7 1 0 10 15 6 9 14 8 3 13 5 12', 52),
+    ('5 7 3 12 15 13 14 8 0 10 9 6 1 4 2 11', 58),
+    ('14 1 8 15 2 6 0 3 9 12 10 13 4 7 5 11', 53),
+    ('13 14 6 12 4 5 1 0 9 3 10 2 15 11 8 7', 52),
+    ('9 8 0 2 15 1 4 14 3 10 7 5 11 13 6 12', 54),
+    ('12 15 2 6 1 14 4 8 5 3 7 0 10 13 9 11', 47),
+    ('12 8 15 13 1 0 5 4 6 3 2 11 9 7 14 10', 50),
+    ('14 10 9 4 13 6 5 8 2 12 7 0 1 3 11 15', 59),
+    ('14 3 5 15 11 6 13 9 0 10 2 12 4 1 7 8', 60),
+    ('6 11 7 8 13 2 5 4 1 10 3 9 14 0 12 15', 52),
+    ('1 6 12 14 3 2 15 8 4 5 13 9 0 7 11 10', 55),
+    ('12 6 0 4 7 3 15 1 13 9 8 11 2 14 5 10', 52),
+    ('8 1 7 12 11 0 10 5 9 15 6 13 14 2 3 4', 58),
+    ('7 15 8 2 13 6 3 12 11 0 4 10 9 5 1 14', 53),
+    ('9 0 4 10 1 14 15 3 12 6 5 7 11 13 8 2', 49),
+    ('11 5 1 14 4 12 10 0 2 7 13 3 9 15 6 8', 54),
+    ('8 13 10 9 11 3 15 6 0 1 2 14 12 5 4 7', 54),
+    ('4 5 7 2 9 14 12 13 0 3 6 11 8 1 15 10', 42),
+    ('11 15 14 13 1 9 10 4 3 6 2 12 7 5 8 0', 64),
+    ('12 9 0 6 8 3 5 14 2 4 11 7 10 1 15 13', 50),
+    ('3 14 9 7 12 15 0 4 1 8 5 6 11 10 2 13', 51),
+    ('8 4 6 1 14 12 2 15 13 10 9 5 3 7 0 11', 49),
+    ('6 10 1 14 15 8 3 5 13 0 2 7 4 9 11 12', 47),
+    ('8 11 4 6 7 3 10 9 2 12 15 13 0 1 5 14', 49),
+    ('10 0 2 4 5 1 6 12 11 13 9 7 15 3 14 8', 59),
+    ('12 5 13 11 2 10 0 9 7 8 4 3 14 6 15 1', 53),
+    ('10 2 8 4 15 0 1 14 11 13 3 6 9 7 5 12', 56),
+    ('10 8 0 12 3 7 6 2 1 14 4 11 15 13 9 5', 56),
+    ('14 9 12 13 15 4 8 10 0 2 1 7 3 11 5 6', 64),
+    ('12 11 0 8 10 2 13 15 5 4 7 3 6 9 14 1', 56),
+    ('13 8 14 3 9 1 0 7 15 5 4 10 12 2 6 11', 41),
+    ('3 15 2 5 11 6 4 7 12 9 1 0 13 14 10 8', 55),
+    ('5 11 6 9 4 13 12 0 8 2 15 10 1 7 3 14', 50),
+    ('5 0 15 8 4 6 1 14 10 11 3 9 7 12 2 13', 51),
+    ('15 14 6 7 10 1 0 11 12 8 4 9 2 5 13 3', 57),
+    ('11 14 13 1 2 3 12 4 15 7 9 5 10 6 8 0', 66),
+    ('6 13 3 2 11 9 5 10 1 7 12 14 8 4 0 15', 45),
+    ('4 6 12 0 14 2 9 13 11 8 3 15 7 10 1 5', 57),
+    ('8 10 9 11 14 1 7 15 13 4 0 12 6 2 5 3', 56),
+    ('5 2 14 0 7 8 6 3 11 12 13 15 4 10 9 1', 51),
+    ('7 8 3 2 10 12 4 6 11 13 5 15 0 1 9 14', 47),
+    ('11 6 14 12 3 5 1 15 8 0 10 13 9 7 4 2', 61),
+    ('7 1 2 4 8 3 6 11 10 15 0 5 14 12 13 9', 50),
+    ('7 3 1 13 12 10 5 2 8 0 6 11 14 15 4 9', 51),
+    ('6 0 5 15 1 14 4 9 2 13 8 10 11 12 7 3', 53),
+    ('15 1 3 12 4 0 6 5 2 8 14 9 13 10 7 11', 52),
+    ('5 7 0 11 12 1 9 10 15 6 2 3 8 4 13 14', 44),
+    ('12 15 11 10 4 5 14 0 13 7 1 2 9 8 3 6', 56),
+    ('6 14 10 5 15 8 7 1 3 4 2 0 12 9 11 13', 49),
+    ('14 13 4 11 15 8 6 9 0 7 3 1 2 10 12 5', 56),
+    ('14 4 0 10 6 5 1 3 9 2 13 15 12 7 8 11', 48),
+    ('15 10 8 3 0 6 9 5 1 14 13 11 7 2 12 4', 57),
+    ('0 13 2 4 12 14 6 9 15 1 10 3 11 5 8 7', 54),
+    ('3 14 13 6 4 15 8 9 5 12 10 0 2 7 1 11', 53),
+    ('0 1 9 7 11 13 5 3 14 12 4 2 8 6 10 15', 42),
+    ('11 0 15 8 13 12 3 5 10 1 4 6 14 9 7 2', 57),
+    ('13 0 9 12 11 6 3 5 15 8 1 10 4 14 2 7', 53),
+    ('14 10 2 1 13 9 8 11 7 3 6 12 15 5 4 0', 62),
+    ('12 3 9 1 4 5 10 2 6 11 15 0 14 7 13 8', 49),
+    ('15 8 10 7 0 12 14 1 5 9 6 3 13 11 4 2', 55),
+    ('4 7 13 10 1 2 9 6 12 8 14 5 3 0 11 15', 44),
+    ('6 0 5 10 11 12 9 2 1 7 4 3 14 8 13 15', 45),
+    ('9 5 11 10 13 0 2 1 8 6 14 12 4 7 3 15', 52),
+    ('15 2 12 11 14 13 9 5 1 3 8 7 0 10 6 4', 65),
+    ('11 1 7 4 10 13 3 8 9 14 0 15 6 5 2 12', 54),
+    ('5 4 7 1 11 12 14 15 10 13 8 6 2 0 9 3', 50),
+    ('9 7 5 2 14 15 12 10 11 3 6 1 8 13 0 4', 57),
+    ('3 2 7 9 0 15 12 4 6 11 5 14 8 13 10 1', 57),
+    ('13 9 14 6 12 8 1 2 3 4 0 7 5 10 11 15', 46),
+    ('5 7 11 8 0 14 9 13 10 12 3 15 6 1 4 2', 53),
+    ('4 3 6 13 7 15 9 0 10 5 8 11 2 12 1 14', 50),
+    ('1 7 15 14 2 6 4 9 12 11 13 3 0 8 5 10', 49),
+    ('9 14 5 7 8 15 1 2 10 4 13 6 12 0 11 3', 44),
+    ('0 11 3 12 5 2 1 9 8 10 14 15 7 4 13 6', 54),
+    ('7 15 4 0 10 9 2 5 12 11 13 6 1 3 14 8', 57),
+    ('11 4 0 8 6 10 5 13 12 7 14 3 1 2 9 15', 54),
+)
+BENCHMARK_SIZE = len(KORF_100)
+
+class Deadline(object):
+    """
+    An object of this class stands in for a cancel Event in solver.solve(),
+    and counts as set once the given number of seconds have passed.
+    """
+    def __init__(self, seconds):
+        self.expires = time.monotonic() + seconds
+
+    def is_set(self):
+        return time.monotonic() >= self.expires
+
+def parse(line, rows=None, columns=None, korf=False):
+    """
+    Turns a line of text into a (cells, rows, columns) tuple, or returns None
+    for blank lines and # comments. Tiles are numbered the way the game
+    shows them, 1 and up in row order, with 0 for the empty cell, which
+    belongs in the lower-right corner.
+    Parameters:
+        line (str): the puzzle, as numbers separated by spaces or commas.
+        rows (int): the number of rows. Square boards are assumed by default.
+        columns (int): the number of columns.
+        korf (bool): whether the line uses the notation of Korf's 1985
+            benchmark, with an optional instance number first and the empty
+            cell's home in the upper-left corner. Turning the board around
+            by 180 degrees makes it the same puzzle in this game's notation.
+    """
+    line = line.split('#')[0].replace(',', ' ').split()
+    if not line:
+        return None
+    numbers = [int(number) for number in line]
+    if korf and len(numbers) == 17:
+        numbers = numbers[1:] # drop the instance number
+    size = len(numbers)
+    if rows is None and columns is None:
+        rows = columns = math.isqrt(size)
+    elif rows is None:
+        rows = size // columns
+    elif columns is None:
+        columns = size // rows
+    if rows*columns != size or sorted(numbers) != list(range(size)):
+        raise ValueError('not a {}x{} puzzle: {}'.format(rows, columns, ' '.join(line)))
+    if korf:
+        return [size-1-tile for tile in reversed(numbers)], rows, columns
+    return [tile-1 if tile else size-1 for tile in numbers], rows, columns
+
+def read_puzzles(source, rows=None, columns=None, korf=False):
+    """
+    Parses each line of a file into a (cells, rows, columns) tuple, skipping
+    blank lines and comments. Bad lines are reported on stderr and skipped.
+    """
+    for number, line in enumerate(source, 1):
+        try:
+            puzzle = parse(line, rows, columns, korf)
+        except ValueError as e:
+            print('line {}: {}'.format(number, e), file=sys.stderr)
+            continue
+        if puzzle:
+            yield puzzle
+
+def benchmark_puzzles(count=BENCHMARK_SIZE):
+    """
+    Returns the first count of Korf's 100 puzzles, as (cells, rows, columns)
+    tuples in this game's notation.
+    """
+    return [parse(puzzle, korf=True) for puzzle, length in KORF_100[:count]]
+
+_heuristics = {} # each worker's loaded heuristics, by board size
+_pdb_folder = None
+
+def _start_worker(pdb_folder):
+    """
+    Runs once in each worker process.
+    """
+    global _pdb_folder
+    _pdb_folder = pdb_folder
+
+def _heuristic(rows, columns):
+    """
+    Returns this worker's pattern database heuristic for the given board
+    size, or None to use the solver's default. The databases are
+    memory-mapped, so every worker shares the same pages.
+    """
+    if _pdb_folder is None:
+        return None
+    if (rows, columns) not in _heuristics:
+        from patterndb import load_heuristic
+        try:
+            _heuristics[(rows, columns)] = load_heuristic(rows, columns, _pdb_folder)
+        except (OSError, ValueError):
+            _heuristics[(rows, columns)] = None
+    return _heuristics[(rows, columns)]
+
+def solve_chunk(chunk, timeout):
+    """
+    Solves a list of (index, cells, rows, columns) tuples in a worker and
+    returns a result dictionary for each one.
+    """
+    results = []
+    for index, cells, rows, columns in chunk:
+        result = {'index': index, 'rows': rows, 'columns': columns}
+        started = time.perf_counter()
+        try:
+            solution = solve(cells, rows, columns, _heuristic(rows, columns),
+                             cancel=Deadline(timeout) if timeout else None)
+        except SearchAborted:
+            result.update(status='timeout', seconds=time.perf_counter()-started)
+        except ValueError as e:
+            result.update(status='error', error=str(e))
+        else:
+            result.update(status='solved', length=len(solution.moves),
+                          moves=solution.moves, nodes=solution.nodes,
+                          seconds=solution.seconds, rate=solution.rate)
+        results.append(result)
+    return results
+
+def solve_all(puzzles, workers=None, timeout=None, chunk_size=1, pdb_folder=None):
+    """
+    Solves puzzles across a pool of processes, yielding each result as soon
+    as it's ready, so results come out in the order they finish. Puzzles are
+    handed out a small chunk at a time with only a couple of chunks queued
+    per worker, so a worker that finishes early takes the next chunk instead
+    of waiting behind a slow one, and long inputs are never read all at once.
+    Parameters:
+        puzzles (iterable): (cells, rows, columns) tuples.
+        workers (int): how many processes to use. Defaults to one per CPU.
+        timeout (float): seconds to spend on each puzzle before giving up.
+        chunk_size (int): how many puzzles to send to a worker at a time.
+        pdb_folder (str): a folder of pattern databases to use when they
+            exist for a board's size.
+    """
+    workers = workers or os.cpu_count() or 1
+    limit = 2*workers # chunks in flight at once
+    with ProcessPoolExecutor(workers, initializer=_start_worker, initargs=(pdb_folder,)) as pool:
+        pending = set()
+        chunk = []
+        for index, (cells, rows, columns) in enumerate(puzzles):
+            chunk.append((index, cells, rows, columns))
+            if len(chunk) < chunk_size:
+                continue
+            pending.add(pool.submit(solve_chunk, chunk, timeout))
+            chunk = []
+            while len(pending) >= limit: # wait for room before reading more
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield from future.result()
+        if chunk:
+            pending.add(pool.submit(solve_chunk, chunk, timeout))
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield from future.result()
+
+def run(puzzles, args, optimal=None):
+    """
+    Solves the puzzles with the command line's settings, printing each
+    result and then a summary. Returns how many solutions weren't as short
+    as the known optimal lengths, if there are any.
+    """
+    started = time.perf_counter()
+    counts = {'solved': 0, 'timeout': 0, 'error': 0}
+    nodes = 0
+    wrong = 0
+    for result in solve_all(puzzles, args.workers, args.timeout, args.chunk_size, args.pdb):
+        counts[result['status']] += 1
+        nodes += result.get('nodes', 0)
+        if optimal and result['status'] == 'solved':
+            result['optimal'] = optimal[result['index']]
+            if result['length'] != result['optimal']:
+                wrong += 1
+        print(json.dumps(result), flush=True)
+    elapsed = time.perf_counter() - started
+    total = sum(counts.values())
+    print('{} puzzles ({solved} solved, {timeout} timed out, {error} errors) in {:.2f}s: '
+          '{:.2f} puzzles/s, {:.0f} nodes/s'.format(total, elapsed, total/elapsed if elapsed else 0,
+                                                   nodes/elapsed if elapsed else 0, **counts),
+          file=sys.stderr)
+    if wrong:
+        print('{} solutions were longer or shorter than optimal'.format(wrong), file=sys.stderr)
+    return wrong
+
+def main():
+    parser = argparse.ArgumentParser(description='Solve sliding puzzles in bulk. Results are '
+                                     'written as JSON lines, with a summary on stderr.')
+    parser.add_argument('file', nargs='?', help='puzzles, one per line (default: stdin)')
+    parser.add_argument('--benchmark', type=int, nargs='?', const=BENCHMARK_SIZE, metavar='COUNT',
+                        help="solve the first COUNT (default: all {}) of Korf's 15-puzzles and "
+                        "check each is optimal. The hardest need --pdb.".format(BENCHMARK_SIZE))
+    parser.add_argument('--korf', action='store_true',
+                        help="read Korf's notation, with the empty cell's home in the upper left")
+    parser.add_argument('--rows', type=int)
+    parser.add_argument('--columns', type=int)
+    parser.add_argument('--workers', type=int, help='processes to use (default: one per CPU)')
+    parser.add_argument('--timeout', type=float, help='seconds allowed per puzzle')
+    parser.add_argument('--chunk-size', type=int, default=1, help='puzzles per work unit')
+    parser.add_argument('--pdb', help='folder of pattern databases built with patterndb.py')
+    args = parser.parse_args()
+
+    if args.benchmark:
+        wrong = run(benchmark_puzzles(args.benchmark), args, [length for puzzle, length in KORF_100])
+    elif args.file:
+        with open(args.file) as source:
+            wrong = run(read_puzzles(source, args.rows, args.columns, args.korf), args)
+    else:
+        wrong = run(read_puzzles(sys.stdin, args.rows, args.columns, args.korf), args)
+    sys.exit(1 if wrong else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,476 @@
+#-------------------------------------------------------------------------------
+# Name:        Sliding Puzzle benchmarks
+# Purpose:     Timings for the parts of the game that don't need a display,
+#              saved as JSON and compared against a stored baseline.
+#-------------------------------------------------------------------------------
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import PIL
+import tempfile
+import subprocess
+from PIL import Image, ImageChops, ImageFilter, ImageStat
+import reduction
+from board import Board
+from loader import FrameLoader, scaled_size
+from renderer import BoardImage
+from solvability import random_cells, count_inversions
+from tileframes import tile_boxes
+
+# how much slower than the baseline a result can be before it's a regression
+TOLERANCE = 0.25
+
+def legacy_inversions(cells):
+    """
+    The nested-loop inversion count that draw_board() used to run, kept here
+    for comparison.
+    """
+    inversions = 0
+    for tile in range(len(cells)):
+        for subsequent in range(tile, len(cells)):
+            if cells[subsequent] < cells[tile]:
+                inversions += 1
+    return inversions
+
+def bench_generation(sizes=(3, 5, 10, 20, 50, 100, 200, 500), legacy_limit=50):
+    """
+    Times generating a solvable random board for square boards of each size.
+    The old nested loop is only timed up to legacy_limit, past which it
+    takes minutes.
+    Returns a list of (side, seconds, legacy seconds or None) tuples.
+    """
+    rng = random.Random(0)
+    results = []
+    for side in sizes:
+        start = time.perf_counter()
+        cells = random_cells(side, side, rng)
+        elapsed = time.perf_counter() - start
+        legacy = None
+        if side <= legacy_limit:
+            start = time.perf_counter()
+            legacy_inversions(cells[:-1])
+            legacy = time.perf_counter() - start
+        results.append((side, elapsed, legacy))
+    return results
+
+def bench_inversions(sizes=(10, 100, 500)):
+    """
+    Times the Fenwick-tree inversion count on shuffled boards of each size.
+    Returns a list of (side, seconds) tuples.
+    """
+    rng = random.Random(0)
+    results = []
+    for side in sizes:
+        cells = list(range(side*side))
+        rng.shuffle(cells)
+        start = time.perf_counter()
+        count_inversions(cells)
+        results.append((side, time.perf_counter() - start))
+    return results
+
+def best(function, repeat=3):
+    """
+    Returns the fastest of repeat runs of function(), in seconds, since
+    slower runs only measure whatever else the machine was doing.
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def bench_moves(sizes=(3, 10, 100, 500), moves=100000):
+    """
+    Times random legal moves through the game logic on square boards of
+    each size, the way clicks and arrow keys reach Board.move().
+    Returns a list of (side, seconds per move) tuples.
+    """
+    results = []
+    for side in sizes:
+        rng = random.Random(0)
+        game = Board(side, side, random_cells(side, side, rng))
+        offsets = [(1, 0), (-1, 0), (0, 1), (0, -1)]
+        choices = [rng.choice(offsets) for _ in range(moves)]
+        def run():
+            for dx, dy in choices:
+                position = game.neighbor(dx, dy)
+                if position is not None:
+                    game.move(position)
+        results.append((side, best(run)/moves))
+    return results
+
+def bench_reduction(sizes=(5, 10, 20, 50, 100)):
+    """
+    Returns (size, moves, seconds, compressed moves, compress seconds) for
+    the reduction solver on a random board of each size. compress() is
+    timed on its own, since solve() leaves it off.
+    """
+    results = []
+    rng = random.Random(0)
+    for side in sizes:
+        cells = random_cells(side, side, rng)
+        start = time.perf_counter()
+        moves = reduction.solve(cells, side, side)
+        solved = time.perf_counter() - start
+        start = time.perf_counter()
+        compressed = reduction.compress(moves, cells.index(side*side - 1), side)
+        results.append((side, len(moves), solved, len(compressed), time.perf_counter() - start))
+    return results
+
+def synthetic_frames(width, height, count):
+    """
+    Returns a list of distinct RGB frames to stand in for a decoded image.
+    """
+    return [Image.effect_noise((width, height), 64+i).convert('RGB') for i in range(count)]
+
+def synthetic_animation(path, width, height, count, sprite=0.1):
+    """
+    Saves a GIF like most animations: a still background with a small
+    sprite, sprite of the width across, moving over it.
+    """
+    background = Image.radial_gradient('L').resize((width, height)).convert('RGB')
+    size = max(1, int(width*sprite))
+    frames = []
+    for i in range(count):
+        frame = background.copy()
+        x = (width - size)*i//max(1, count-1)
+        frame.paste((255, 0, 0), (x, height//2 - size//2, x + size, height//2 + size//2))
+        frames.append(frame)
+    frames[0].save(path, save_all=True, append_images=frames[1:], duration=50, loop=0)
+
+def bench_slicing(images=((640, 480, 1), (2000, 1500, 1), (400, 300, 30), (600, 600, 60)),
+                  grids=(3, 10, 30), max_height=600):
+    """
+    Times loading and slicing synthetic stills (JPEGs) and animations
+    (GIFs) of each (width, height, frames) for square boards of each size:
+    decoding and resizing with tile keys in the loader, then cropping every
+    tile of every frame the way TileFrames does before making PhotoImages.
+    Returns a list of (name, side, load seconds, crop seconds) tuples.
+    """
+    folder = tempfile.mkdtemp()
+    results = []
+    for width, height, count in images:
+        if count == 1:
+            name = '{}x{}.jpg'.format(width, height)
+            path = os.path.join(folder, name)
+            synthetic_photo(path, width, height)
+        else:
+            name = '{}x{}x{}.gif'.format(width, height, count)
+            path = os.path.join(folder, name)
+            synthetic_animation(path, width, height, count)
+        for side in grids:
+            start = time.perf_counter()
+            frames = loader_frames(path, max_height, (side, side))
+            load = time.perf_counter() - start
+            boxes = tile_boxes(frames[0][0].size[0], frames[0][0].size[1], side, side)
+            start = time.perf_counter()
+            for frame, keys in frames:
+                for box in boxes:
+                    frame.crop(box).load()
+            results.append((name, side, load, time.perf_counter() - start))
+        os.remove(path)
+    os.rmdir(folder)
+    return results
+
+def bench_animation(sizes=(3, 10, 30, 60), pixels=600, count=30):
+    """
+    Times one animation frame of a GIF with a small moving sprite on square
+    boards of each size, without a display: working out which tiles changed,
+    then compositing the board either whole or only the changed cells.
+    Returns a list of (side, tiles changed per frame, whole-board seconds,
+    changed-cells seconds) tuples, each per frame.
+    """
+    folder = tempfile.mkdtemp()
+    path = os.path.join(folder, 'sprite.gif')
+    synthetic_animation(path, pixels, pixels, count)
+    results = []
+    for side in sizes:
+        frames = loader_frames(path, pixels, (side, side))
+        images = [frame for frame, keys in frames]
+        keys = [keys for frame, keys in frames]
+        step = pixels // side
+        game = Board(side, side, random_cells(side, side, random.Random(0)))
+        board = BoardImage(game, images, step, step)
+        changes = []
+        def whole():
+            for frame in range(count):
+                board.frame = frame
+                board.paint_all()
+        def cells():
+            for frame in range(count):
+                old, new = keys[frame-1], keys[frame]
+                changed = {unit_id for unit_id, key in enumerate(new) if key != old[unit_id]}
+                changed.discard(game.blank_id)
+                changes.append(len(changed))
+                board.frame = frame
+                for position, tile in enumerate(game.cells):
+                    if tile in changed:
+                        board.paint(position)
+        whole, cells = best(whole)/count, best(cells)/count
+        results.append((side, sum(changes[:count])/count, whole, cells))
+    os.remove(path)
+    os.rmdir(folder)
+    return results
+
+def bench_render(sizes=(3, 10, 30, 60), pixels=600, frames=10):
+    """
+    Times one animation frame of square boards of each size, drawn both ways:
+    composited into a single image and pushed with one paste(), and as one
+    itemconfig() per tile. Showing them needs a display, so without one only
+    the compositing itself is timed.
+    Returns a list of (side, composite seconds, paste seconds or None,
+    itemconfig seconds or None) tuples, each per frame.
+    """
+    try:
+        from tkinter import Tk, Canvas, NW
+        from PIL import ImageTk
+        root = Tk()
+    except Exception: # no display
+        root = None
+    images = synthetic_frames(pixels, pixels, frames)
+    results = []
+    for side in sizes:
+        step = pixels // side
+        game = Board(side, side, random_cells(side, side, random.Random(0)))
+        board = BoardImage(game, images, step, step)
+        start = time.perf_counter()
+        for frame in range(frames):
+            board.frame = frame
+            board.paint_all()
+        composite = (time.perf_counter() - start)/frames
+        paste = items = None
+        if root is not None:
+            photo = ImageTk.PhotoImage(board.surface)
+            start = time.perf_counter()
+            for frame in range(frames):
+                photo.paste(board.surface)
+                root.update_idletasks()
+            paste = (time.perf_counter() - start)/frames
+            canvas = Canvas(root, width=pixels, height=pixels)
+            tiles = [[ImageTk.PhotoImage(image.crop(board.box(tile))) for tile in range(game.size)]
+                     for image in images]
+            ids = [canvas.create_image(*board.box(position)[:2], anchor=NW, image=tiles[0][tile])
+                   for position, tile in enumerate(game.cells)]
+            start = time.perf_counter()
+            for frame in range(frames):
+                for position, tile in enumerate(game.cells):
+                    canvas.itemconfig(ids[position], image=tiles[frame][tile])
+                root.update_idletasks()
+            items = (time.perf_counter() - start)/frames
+            canvas.destroy()
+        results.append((side, composite, paste, items))
+    if root is not None:
+        root.destroy()
+    return results
+
+def synthetic_photo(path, width=7200, height=5400, quality=90):
+    """
+    Saves a JPEG the size of a 40-megapixel camera photo, with smooth
+    gradients and some detail so it compresses like one.
+    """
+    small = Image.merge('RGB', [Image.linear_gradient('L').resize((width//8, height//8)),
+                                Image.radial_gradient('L').resize((width//8, height//8)),
+                                Image.effect_noise((width//8, height//8), 48).filter(ImageFilter.GaussianBlur(2))])
+    small.resize((width, height), Image.BICUBIC).save(path, quality=quality)
+
+def legacy_decode(path, max_height):
+    """
+    Fully decodes an image and resizes it with LANCZOS, the way draw_board()
+    used to.
+    """
+    image = Image.open(path)
+    return image.resize(scaled_size(image.size, max_height), resample=Image.LANCZOS)
+
+def loader_frames(path, max_height, grid=None):
+    """
+    Loads an image through FrameLoader, the way the game does, and returns
+    its list of (frame, tile keys) tuples.
+    """
+    loader = FrameLoader(lambda: (None, None, lambda: Image.open(path), None), max_height, grid=grid)
+    loader.wait()
+    frames = loader.poll()
+    if loader.error:
+        raise loader.error
+    return frames
+
+def loader_decode(path, max_height):
+    """
+    Decodes an image through FrameLoader, the way the game does now.
+    """
+    return loader_frames(path, max_height)[0][0]
+
+def peak_memory():
+    """
+    Returns this process's peak resident memory in KiB. Linux's ru_maxrss
+    carries over from the parent process, so VmHWM is used where it exists.
+    """
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def decode_once(path, max_height, fast):
+    """
+    Decodes one image one way, for bench_decode() to run in a fresh process.
+    Prints the seconds taken and the peak memory, in KiB, used by the decode
+    on top of what the process started with.
+    """
+    before = peak_memory()
+    start = time.perf_counter()
+    image = (loader_decode if fast else legacy_decode)(path, max_height)
+    elapsed = time.perf_counter() - start
+    peak = peak_memory()
+    image.save(path + ('.fast.png' if fast else '.full.png'))
+    print(json.dumps({'seconds': elapsed, 'peak_kib': peak - before}))
+
+def bench_decode(paths=None, max_height=600, count=3):
+    """
+    Times decoding and resizing large stills to max_height, both fully and
+    with the loader's reduced-scale decoding, each in its own process so
+    peak memory can be measured. Without paths, count synthetic 40-megapixel
+    JPEGs are made. Output quality is compared as the mean absolute
+    difference between the two results, out of 255.
+    Returns a list of (name, megapixels, full seconds, full peak KiB, fast
+    seconds, fast peak KiB, mean difference) tuples.
+    """
+    folder = tempfile.mkdtemp()
+    if not paths:
+        paths = []
+        for i in range(count):
+            path = os.path.join(folder, 'photo{}.jpg'.format(i))
+            synthetic_photo(path)
+            paths.append(path)
+    here = os.path.dirname(os.path.abspath(__file__))
+    results = []
+    for path in paths:
+        copy = os.path.join(folder, os.path.basename(path)) # outputs go in the temp folder
+        if copy != path:
+            with open(path, 'rb') as source, open(copy, 'wb') as target:
+                target.write(source.read())
+        runs = []
+        for fast in (False, True):
+            output = subprocess.run([sys.executable, '-c',
+                'import benchmarks; benchmarks.decode_once({!r}, {}, {})'.format(copy, max_height, fast)],
+                cwd=here, capture_output=True, text=True, check=True).stdout
+            runs.append(json.loads(output))
+        full, fast = Image.open(copy + '.full.png'), Image.open(copy + '.fast.png')
+        difference = sum(ImageStat.Stat(ImageChops.difference(full.convert('RGB'), fast.convert('RGB'))).mean)/3
+        with Image.open(copy) as image:
+            megapixels = image.size[0]*image.size[1]/1e6
+        results.append((os.path.basename(path), megapixels, runs[0]['seconds'], runs[0]['peak_kib'],
+                        runs[1]['seconds'], runs[1]['peak_kib'], difference))
+        for name in (copy, copy + '.full.png', copy + '.fast.png'):
+            os.remove(name)
+    os.rmdir(folder)
+    return results
+
+def run(sections, corpus=None):
+    """
+    Runs the named sections, printing each result as it comes, and returns
+    a str:float dictionary of every result, named section/case. Each one is
+    in seconds, so lower is always better.
+    """
+    results = {}
+    def report(name, seconds, note=''):
+        results[name] = seconds
+        print('  {:<36} {:>11.4g}s {}'.format(name, seconds, note), flush=True)
+    if 'generation' in sections:
+        print('Board generation (shuffle + solvability fix-up, legacy inversion loop):')
+        for side, elapsed, legacy in bench_generation():
+            report('generation/{0}x{0}'.format(side), elapsed)
+            if legacy is not None:
+                report('generation/{0}x{0}/legacy'.format(side), legacy)
+        for side, elapsed in bench_inversions():
+            report('inversions/{0}x{0}'.format(side), elapsed)
+    if 'moves' in sections:
+        print('Moves through Board.move(), per move:')
+        for side, elapsed in bench_moves():
+            report('moves/{0}x{0}'.format(side), elapsed)
+    if 'reduction' in sections:
+        print('Reduction solver, whole path, then compress() on its own:')
+        for side, moves, elapsed, compressed, compressing in bench_reduction():
+            report('reduction/{0}x{0}'.format(side), elapsed, '({} moves)'.format(moves))
+            report('reduction/{0}x{0}/compress'.format(side), compressing,
+                   '({} moves, {:.3f}% fewer)'.format(compressed, (moves - compressed)*100/moves))
+    if 'slicing' in sections:
+        print('Loading (decode, resize, tile keys) and cropping every tile of every frame:')
+        for name, side, load, crop in bench_slicing():
+            report('slicing/{0}/{1}x{1}/load'.format(name, side), load)
+            report('slicing/{0}/{1}x{1}/crop'.format(name, side), crop)
+    if 'animation' in sections:
+        print('Animation frame of a moving sprite (whole board vs. changed cells only):')
+        for side, changed, whole, cells in bench_animation():
+            report('animation/{0}x{0}/whole'.format(side), whole)
+            report('animation/{0}x{0}/changed'.format(side), cells, '({:.1f} tiles)'.format(changed))
+    if 'render' in sections:
+        print('Animation frame (composite + paste vs. itemconfig per tile, with a display):')
+        for side, composite, paste, items in bench_render():
+            report('render/{0}x{0}/composite'.format(side), composite)
+            if paste is not None:
+                report('render/{0}x{0}/paste'.format(side), paste)
+                report('render/{0}x{0}/itemconfig'.format(side), items)
+    if 'decode' in sections:
+        paths = corpus and [os.path.join(corpus, name) for name in sorted(os.listdir(corpus))
+                            if name.lower().endswith(('.jpg', '.jpeg', '.png', '.webp', '.tif', '.tiff'))]
+        print('Decode + resize to 600px (full vs. reduced-scale), with peak memory:')
+        for name, megapixels, full, full_peak, fast, fast_peak, difference in bench_decode(paths):
+            report('decode/{}/full'.format(name), full, '{:6.1f}MiB'.format(full_peak/1024))
+            report('decode/{}/reduced'.format(name), fast,
+                   '{:6.1f}MiB  mean diff {:.2f}'.format(fast_peak/1024, difference))
+    return results
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    """
+    Prints every result that's also in the baseline, flagging the ones that
+    got more than tolerance slower. Returns the list of regressed names.
+    """
+    regressions = []
+    print('Compared with the baseline:')
+    for name, seconds in results.items():
+        if name not in baseline:
+            continue
+        ratio = seconds/baseline[name] if baseline[name] else 1.0
+        regressed = ratio > 1 + tolerance
+        if regressed:
+            regressions.append(name)
+        print('  {:<36} {:>11.4g}s {:>11.4g}s {:6.2f}x {}'.format(
+            name, baseline[name], seconds, ratio, 'REGRESSION' if regressed else ''))
+    return regressions
+
+SECTIONS = ('generation', 'moves', 'reduction', 'slicing', 'animation', 'render', 'decode')
+
+def main():
+    parser = argparse.ArgumentParser(description='Time the game without a display. '
+                                     'Exits with status 1 if anything regressed against the baseline.')
+    parser.add_argument('sections', nargs='*', choices=SECTIONS, metavar='section',
+                        help='any of {} (default: all)'.format(', '.join(SECTIONS)))
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--baseline', help='compare against results saved with --output')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE,
+                        help='fraction slower than the baseline that counts as a regression')
+    parser.add_argument('--corpus', help='folder of large stills for the decode section '
+                        '(default: synthetic 40-megapixel JPEGs)')
+    args = parser.parse_args()
+    results = run(args.sections or SECTIONS, args.corpus)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump({'python': platform.python_version(), 'pillow': PIL.__version__,
+                       'machine': platform.machine(), 'results': results}, file, indent=2, sort_keys=True)
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)['results']
+        if compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
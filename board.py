@@ -0,0 +1,119 @@
+#-------------------------------------------------------------------------------
+# Name:        Sliding Puzzle board
+# Purpose:     The game's rules and state, with no knowledge of how (or
+#              whether) the game is displayed.
+#-------------------------------------------------------------------------------
+from array import array
+
+class Board(object):
+    """
+    An object of this class represents the state of a sliding puzzle. Positions
+    are numbered the same way as Tile IDs: 0 for the top-left cell, 1 for the
+    one to the right of that, and so on, going row by row. The board is solved
+    when every tile's ID matches its position.
+    Attributes:
+        blank (int): the position of the empty cell.
+        blank_id (int): the ID of the tile that's left out to make the empty
+            cell. This is always the last (lower-right) tile.
+        cells (array): the ID of the tile at each position.
+        columns (int): the number of columns.
+        misplaced (int): how many tiles (not counting the empty cell) are not
+            at the position that matches their ID. 0 means the game is won.
+        rows (int): the number of rows.
+        size (int): the number of cells, including the empty one.
+    """
+    def __init__(self, rows, columns, cells=None):
+        self.rows = rows
+        self.columns = columns
+        self.size = rows*columns
+        self.blank_id = self.size - 1
+        # 2 bytes per cell covers boards up to 256x256; bigger needs 4
+        self.cells = array('H' if self.size <= 0x10000 else 'L')
+        self.load(range(self.size) if cells is None else cells)
+
+    def load(self, cells):
+        """
+        Replaces the board's layout.
+        Parameter:
+            cells (iterable): the ID of the tile at each position.
+        """
+        self.cells[:] = array(self.cells.typecode, cells)
+        if len(self.cells) != self.size:
+            raise ValueError('expected {} cells, got {}'.format(self.size, len(self.cells)))
+        self.blank = self.cells.index(self.blank_id) # find the empty cell
+        # count the tiles that are out of place, ignoring the empty cell
+        self.misplaced = sum(1 for position, tile in enumerate(self.cells)
+                             if tile != position and tile != self.blank_id)
+
+    def copy(self):
+        """
+        Returns an independent Board with the same layout.
+        """
+        return Board(self.rows, self.columns, self.cells)
+
+    @property
+    def solved(self):
+        """
+        Whether every tile is in its home position.
+        """
+        return not self.misplaced
+
+    def position(self, x, y):
+        """
+        Returns the position of the cell in column x and row y.
+        """
+        return y*self.columns + x
+
+    def coords(self, position):
+        """
+        Returns an (x,y) tuple for the given position.
+        """
+        y, x = divmod(position, self.columns)
+        return x, y
+
+    def neighbor(self, dx, dy):
+        """
+        Returns the position of the cell at the given offset from the empty
+        cell, or None if that's off the board.
+        """
+        x, y = self.coords(self.blank)
+        x += dx
+        y += dy
+        if 0 <= x < self.columns and 0 <= y < self.rows:
+            return y*self.columns + x
+        return None
+
+    def is_movable(self, position):
+        """
+        Whether the tile at the given position can slide into the empty cell.
+        """
+        if not 0 <= position < self.size: # it has to be on the board
+            return False
+        diff = position - self.blank
+        if diff == self.columns or diff == -self.columns: # directly above/below
+            return True
+        # directly left/right, as long as it didn't wrap around from another row
+        return (diff == 1 or diff == -1) and \
+            position//self.columns == self.blank//self.columns
+
+    def move(self, position):
+        """
+        Slides the tile at the given position into the empty cell.
+        Parameter:
+            position (int): the position of the tile to move.
+        Returns:
+            int: the ID of the tile that moved, or None if the move was illegal.
+        """
+        if not self.is_movable(position):
+            return None
+        cells = self.cells
+        blank = self.blank
+        tile = cells[position]
+        if tile == position: # it's leaving home
+            self.misplaced += 1
+        elif tile == blank: # it's arriving home
+            self.misplaced -= 1
+        cells[blank] = tile
+        cells[position] = self.blank_id
+        self.blank = position
+        return tile
@@ -0,0 +1,158 @@
+#-------------------------------------------------------------------------------
+# Name:        Sliding Puzzle catalog
+# Purpose:     Index a folder tree of images once, so picking a random image
+#              is instant and never lands on something that isn't one.
+#-------------------------------------------------------------------------------
+import os
+import json
+import random
+import hashlib
+import warnings
+from PIL import Image
+from fetch import cache_folder
+
+# entry fields, in the order they're saved
+PATH, MTIME, FORMAT, WIDTH, HEIGHT, FRAMES = range(6)
+
+class Catalog(object):
+    """
+    An object of this class is an index of every image in a folder tree. Each
+    file is probed once, reading only as much as PIL needs for its format,
+    size and whether it's animated, and the results are saved. Rescanning
+    only probes files whose modification time changed. Files that aren't
+    images are remembered too, so they aren't probed again.
+    Attributes:
+        entries (dict): a path:list dictionary, with each path relative to
+            the root and each list holding the file's mtime, format (None if
+            it's not an image), width, height, and frame count, which is 2
+            for any animation, since counting every frame means reading them.
+        folders (dict): a path:mtime dictionary of the folders found by the
+            last scan, for stale().
+        index_path (str): where the catalog is saved.
+        root (str): the folder being indexed.
+    """
+    def __init__(self, root, index_path=None):
+        self.root = os.path.abspath(root)
+        self.index_path = index_path or os.path.join(cache_folder('catalogs'),
+            hashlib.sha1(self.root.encode('utf-8', 'surrogateescape')).hexdigest() + '.json')
+        self.entries = {}
+        self.folders = {}
+        self._choices = {} # filter: list of matching paths
+        try:
+            with open(self.index_path) as f:
+                saved = json.load(f)
+        except (OSError, ValueError): # no catalog yet, or a broken one
+            pass
+        else:
+            if saved.get('root') == self.root:
+                self.entries = {entry[PATH]: entry for entry in saved['entries']}
+
+    def scan(self):
+        """
+        Brings the catalog up to date with the folder tree, and saves it if
+        anything changed.
+        Returns:
+            int: how many files were added, changed, or removed.
+        """
+        found = set()
+        changes = 0
+        self.folders = {}
+        for path, mtime in self._walk(self.root):
+            found.add(path)
+            entry = self.entries.get(path)
+            if entry is None or entry[MTIME] != mtime:
+                self.entries[path] = self._probe(path, mtime)
+                changes += 1
+        for path in set(self.entries) - found: # deleted since the last scan
+            del self.entries[path]
+            changes += 1
+        if changes:
+            self._choices.clear()
+            self.save()
+        return changes
+
+    def stale(self):
+        """
+        Returns whether files may have been added, removed or renamed since
+        the last scan, going by the modification times of its folders.
+        """
+        for folder, mtime in self.folders.items():
+            try:
+                if os.stat(folder).st_mtime != mtime:
+                    return True
+            except OSError: # the folder was removed
+                return True
+        return False
+
+    def _walk(self, folder):
+        """
+        Yields a (relative path, mtime) tuple for each file under the given
+        folder, skipping hidden files and folders.
+        """
+        try:
+            # before listing it, so anything added meanwhile makes it stale
+            self.folders[folder] = os.stat(folder).st_mtime
+            items = list(os.scandir(folder))
+        except OSError:
+            return
+        for item in items:
+            if item.name.startswith('.'):
+                continue
+            try:
+                if item.is_dir():
+                    yield from self._walk(item.path)
+                elif item.is_file():
+                    yield os.path.relpath(item.path, self.root), item.stat().st_mtime
+            except OSError: # it vanished or can't be read
+                continue
+
+    def _probe(self, path, mtime):
+        """
+        Returns a new entry for a file, reading only its headers.
+        """
+        try:
+            with warnings.catch_warnings(): # such as decompression bomb warnings
+                warnings.simplefilter('ignore')
+                with Image.open(os.path.join(self.root, path)) as image:
+                    width, height = image.size
+                    # n_frames would seek through every frame of a GIF
+                    frames = 2 if getattr(image, 'is_animated', False) else 1
+                    return [path, mtime, image.format, width, height, frames]
+        except Exception: # anything PIL can't open isn't an image
+            return [path, mtime, None, 0, 0, 0]
+
+    def save(self):
+        """
+        Writes the catalog to disk.
+        """
+        temp = self.index_path + '.part'
+        with open(temp, 'w') as f:
+            json.dump({'root': self.root, 'entries': list(self.entries.values())}, f)
+        os.replace(temp, self.index_path)
+
+    def images(self, animated=None, min_height=None):
+        """
+        Returns a list of the relative paths of images matching the filters.
+        The lists are kept until the next scan that changes something.
+        Parameters:
+            animated (bool): True for animations only, False for stills only,
+                or None for both.
+            min_height (int): the shortest image allowed, in pixels.
+        """
+        key = (animated, min_height)
+        if key not in self._choices:
+            self._choices[key] = [entry[PATH] for entry in self.entries.values()
+                                  if entry[FORMAT] is not None
+                                  and (animated is None or (entry[FRAMES] > 1) == animated)
+                                  and (min_height is None or entry[HEIGHT] >= min_height)]
+        return self._choices[key]
+
+    def choose(self, rng=None, animated=None, min_height=None):
+        """
+        Returns the full path of a random image matching the filters, or None
+        if there aren't any. See images() for the filters.
+        """
+        choices = self.images(animated, min_height)
+        if not choices:
+            return None
+        return os.path.join(self.root, (rng or random).choice(choices))
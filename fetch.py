@@ -0,0 +1,198 @@
+#-------------------------------------------------------------------------------
+# Name:        Sliding Puzzle downloads
+# Purpose:     Download images with timeouts and a size limit, and keep them
+#              in an on-disk cache so restarting a puzzle doesn't download
+#              the same image again.
+#-------------------------------------------------------------------------------
+import os
+import re
+import json
+import time
+import hashlib
+import tempfile
+import threading
+import urllib.error
+import urllib.request
+
+# how long a download counts as fresh when the server doesn't say, in seconds
+DEFAULT_MAX_AGE = 60*60
+CHUNK_SIZE = 64*1024
+
+def cache_folder(*parts):
+    """
+    Returns the path of a folder (created if need be) inside the game's cache
+    folder, which is $SLIDINGPUZZLE_CACHE, or .cache/slidingpuzzle in the
+    user's home folder.
+    """
+    root = os.environ.get('SLIDINGPUZZLE_CACHE') or \
+        os.path.join(os.path.expanduser('~'), '.cache', 'slidingpuzzle')
+    path = os.path.join(root, *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+class FetchError(Exception):
+    """
+    Raised when a download fails or is too big.
+    """
+
+class ImageCache(object):
+    """
+    An object of this class downloads files into an on-disk cache. Each file
+    is stored under the sha256 of its contents, so a URL that moves or two
+    URLs for the same image share one copy. An index remembers each URL's
+    file, its ETag and Last-Modified headers for revalidation, and when it
+    stops being fresh. While a download is fresh, fetching it again doesn't
+    touch the network at all. The least recently used files are deleted once
+    they add up to more than the budget.
+    Attributes:
+        budget (int): the most bytes of files to keep.
+        folder (str): where the index and files are kept.
+        max_age (int): seconds a download stays fresh if the server doesn't
+            send a Cache-Control max-age.
+    """
+    def __init__(self, folder=None, budget=512*1024*1024, max_age=DEFAULT_MAX_AGE):
+        self.folder = folder or cache_folder('downloads')
+        self.budget = budget
+        self.max_age = max_age
+        self._objects = os.path.join(self.folder, 'objects')
+        os.makedirs(self._objects, exist_ok=True)
+        self._index_path = os.path.join(self.folder, 'index.json')
+        self._lock = threading.Lock()
+        try:
+            with open(self._index_path) as f:
+                self._index = json.load(f)
+        except (OSError, ValueError): # no index yet, or a broken one
+            self._index = {}
+
+    def path(self, digest):
+        """
+        Returns where the file with the given sha256 is kept.
+        """
+        return os.path.join(self._objects, digest)
+
+    def fetch(self, url, timeout=10, max_bytes=64*1024*1024):
+        """
+        Returns the path of a cached copy of the given URL, downloading it
+        only if there's no fresh copy. A stale copy is revalidated with the
+        server, which can answer 304 Not Modified instead of sending it again.
+        Parameters:
+            url (str): what to download.
+            timeout (float): seconds to wait for the server at each step.
+            max_bytes (int): the biggest download allowed.
+        """
+        with self._lock:
+            entry = self._index.get(url)
+            if entry and not os.path.exists(self.path(entry['digest'])):
+                entry = None # someone deleted the file
+            if entry and time.time() < entry['expires']:
+                entry['used'] = time.time()
+                self._save()
+                return self.path(entry['digest'])
+        headers = {}
+        if entry: # ask the server whether our copy is still good
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+        try:
+            response = urllib.request.urlopen(urllib.request.Request(url, headers=headers),
+                                              timeout=timeout)
+        except urllib.error.HTTPError as e:
+            if e.code == 304 and entry: # it is
+                with self._lock:
+                    entry.update(expires=time.time() + self._max_age(e.headers), used=time.time())
+                    self._save()
+                return self.path(entry['digest'])
+            raise FetchError('{}: {}'.format(url, e))
+        except (OSError, ValueError) as e:
+            raise FetchError('{}: {}'.format(url, e))
+        with response:
+            length = response.headers.get('Content-Length')
+            if length and length.isdigit() and int(length) > max_bytes:
+                raise FetchError('{} is {} bytes, over the {} byte limit'.format(url, length, max_bytes))
+            digest = self._store(response, max_bytes, url)
+            with self._lock:
+                self._index[url] = {'digest': digest,
+                                    'etag': response.headers.get('ETag'),
+                                    'last_modified': response.headers.get('Last-Modified'),
+                                    'expires': time.time() + self._max_age(response.headers),
+                                    'used': time.time()}
+                self._evict()
+                self._save()
+        return self.path(digest)
+
+    def _store(self, response, max_bytes, url):
+        """
+        Streams a response into the cache a chunk at a time, hashing as it
+        goes, and returns its sha256.
+        """
+        sha = hashlib.sha256()
+        size = 0
+        handle, temp = tempfile.mkstemp(dir=self._objects, suffix='.part')
+        try:
+            with os.fdopen(handle, 'wb') as f:
+                while True:
+                    try:
+                        chunk = response.read(CHUNK_SIZE)
+                    except OSError as e:
+                        raise FetchError('{}: {}'.format(url, e))
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if size > max_bytes:
+                        raise FetchError('{} is over the {} byte limit'.format(url, max_bytes))
+                    sha.update(chunk)
+                    f.write(chunk)
+            digest = sha.hexdigest()
+            os.replace(temp, self.path(digest)) # identical content just overwrites itself
+        except BaseException:
+            os.remove(temp)
+            raise
+        return digest
+
+    def _max_age(self, headers):
+        """
+        Returns how many seconds a response stays fresh, from its
+        Cache-Control header if it has one.
+        """
+        control = headers.get('Cache-Control', '') if headers else ''
+        if 'no-cache' in control or 'no-store' in control:
+            return 0
+        match = re.search(r'max-age=(\d+)', control)
+        return int(match.group(1)) if match else self.max_age
+
+    def _evict(self):
+        """
+        Deletes the least recently used files until the rest fit the budget.
+        Must be called with the lock held.
+        """
+        used = {} # digest: the last time any URL for it was used
+        for entry in self._index.values():
+            used[entry['digest']] = max(used.get(entry['digest'], 0), entry['used'])
+        sizes = {}
+        for digest in used:
+            try:
+                sizes[digest] = os.path.getsize(self.path(digest))
+            except OSError:
+                sizes[digest] = 0
+        total = sum(sizes.values())
+        newest = max(used, key=used.get, default=None)
+        for digest in sorted(used, key=used.get): # oldest first
+            if total <= self.budget or digest == newest: # always keep the newest
+                break
+            try:
+                os.remove(self.path(digest))
+            except OSError:
+                pass
+            total -= sizes[digest]
+            for url in [url for url, entry in self._index.items() if entry['digest'] == digest]:
+                del self._index[url]
+
+    def _save(self):
+        """
+        Writes the index to disk. Must be called with the lock held.
+        """
+        temp = self._index_path + '.part'
+        with open(temp, 'w') as f:
+            json.dump(self._index, f)
+        os.replace(temp, self._index_path)
@@ -0,0 +1,191 @@
+#-------------------------------------------------------------------------------
+# Name:        Sliding Puzzle hints
+# Purpose:     Find the best next move in a worker thread, so the window keeps
+#              responding while it searches, and keep the rest of the path for
+#              as long as the player follows it.
+#-------------------------------------------------------------------------------
+import os
+import queue
+import threading
+import time
+import reduction
+import statespace
+from fetch import cache_folder
+from patterndb import PatternDatabase, PatternHeuristic, filename, partition
+from solver import SearchAborted, solve
+
+# boards without a state space or pattern databases stop searching after this
+# many nodes, about 15 seconds, and take a quick path that isn't the shortest
+NODE_LIMIT = 2000000
+# boards without pattern databases and with more cells than this go straight
+# to the reduction solver, since IDA* would only run into the node limit
+SEARCH_CELLS = 25
+
+class Hinter(object):
+    """
+    An object of this class finds optimal moves for one board size in a
+    worker thread. The Tk thread calls ask() with the current layout, then
+    poll() with after() until the path arrives. Every move on the board is
+    passed to moved(): a move that follows the path just shortens it, so
+    the next hint is instant, and any other move cancels the search and
+    forgets the path.
+    Boards with a state space (3x3 and smaller) look every move up. Bigger
+    ones are searched with IDA*, using pattern databases from the cache
+    folder if they've been built, or Manhattan distance with a node limit,
+    after which they settle for the reduction solver's longer path. Boards
+    of more than SEARCH_CELLS cells without databases skip the search.
+    Attributes:
+        columns (int): the number of columns.
+        error (Exception): why the last search failed, if it did.
+        latencies (list): seconds from each ask() to its path reaching poll().
+        path (list): the remaining moves, as positions for Board.move(), or
+            None if there isn't one yet.
+        rows (int): the number of rows.
+    """
+    def __init__(self, rows, columns, pdb_folder=None, state_folder=None):
+        """
+        Parameters:
+            rows (int): the number of rows.
+            columns (int): the number of columns.
+            pdb_folder (str): where to look for pattern databases.
+            state_folder (str): where to look for, or build, state spaces.
+        """
+        self.rows = rows
+        self.columns = columns
+        self.pdb_folder = pdb_folder
+        self.state_folder = state_folder
+        self.path = None
+        self.error = None
+        self.latencies = []
+        self._asked = None # when the pending ask() happened
+        self._generation = 0 # which layout the current search is for
+        self._cancel = threading.Event()
+        self._searching = False
+        self._queue = queue.Queue()
+        self._solver = None
+        self._solver_lock = threading.Lock()
+
+    @property
+    def searching(self):
+        return self._searching
+
+    def ask(self, cells):
+        """
+        Starts looking for the best move from the given layout, unless the
+        path from the last search still applies or a search is running.
+        """
+        if self._asked is None:
+            self._asked = time.perf_counter()
+        if self.path is not None or self._searching:
+            return
+        self.error = None
+        self._searching = True
+        threading.Thread(target=self._search, daemon=True,
+                         args=(list(cells), self._cancel, self._generation)).start()
+
+    def poll(self):
+        """
+        Returns the remaining path once it's known, or None while it's still
+        being searched for or if the search failed. Only ever called from
+        the Tk thread.
+        """
+        while True:
+            try:
+                generation, moves, error = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if generation != self._generation: # the board moved on since
+                continue
+            self._searching = False
+            self.path, self.error = moves, error
+        if self._asked is not None and (self.path is not None or self.error):
+            if self.path is not None:
+                self.latencies.append(time.perf_counter() - self._asked)
+            self._asked = None
+        return self.path
+
+    def moved(self, position):
+        """
+        Tells the hinter that the tile at the given position has moved.
+        """
+        if self.path and self.path[0] == position:
+            del self.path[0] # still on course, and still optimal
+        else:
+            self.cancel()
+
+    def cancel(self):
+        """
+        Stops any search and forgets the path.
+        """
+        self.path = None
+        self._asked = None
+        self._searching = False
+        self._cancel.set()
+        self._cancel = threading.Event()
+        self._generation += 1
+
+    def stats(self):
+        """
+        Returns a dictionary of how many hints were given and how long they
+        took from ask() to poll(), in milliseconds.
+        """
+        times = sorted(self.latencies)
+        if not times:
+            return {'hints': 0}
+        return {'hints': len(times), 'mean_ms': sum(times)*1000/len(times),
+                'p50_ms': times[len(times)//2]*1000, 'max_ms': times[-1]*1000}
+
+    def _search(self, cells, cancel, generation):
+        """
+        Finds the path, in the worker thread.
+        """
+        moves = error = None
+        try:
+            moves = self._get_solver()(cells, cancel)
+        except SearchAborted as e:
+            if cancel.is_set(): # nobody's waiting for it any more
+                return
+            error = e
+        except Exception as e: # report anything at all to the Tk thread
+            error = e
+        self._queue.put((generation, moves, error))
+
+    def _get_solver(self):
+        """
+        Returns a function that takes a layout and a cancel Event and returns
+        its moves, loading or building what it needs the first time.
+        """
+        with self._solver_lock:
+            if self._solver is None:
+                self._solver = self._make_solver()
+            return self._solver
+
+    def _make_solver(self):
+        rows, columns = self.rows, self.columns
+        if (rows, columns) in statespace.SHAPES or (columns, rows) in statespace.SHAPES:
+            folder = self.state_folder or cache_folder('statespace')
+            path = os.path.join(folder, statespace.filename(rows, columns))
+            if not os.path.exists(path): # a few seconds at most, then it's kept
+                table, depth = statespace.build(rows, columns)
+                statespace.save(path + '.tmp', rows, columns, table, depth)
+                os.replace(path + '.tmp', path)
+            space = statespace.StateSpace(path)
+            return lambda cells, cancel: space.solution(cells)
+        folder = self.pdb_folder or cache_folder('patterndb')
+        try:
+            databases = [PatternDatabase(os.path.join(folder, filename(rows, columns, pattern)))
+                         for pattern in partition(rows, columns)]
+        except (OSError, ValueError): # not built, so fall back on Manhattan distance
+            if rows*columns > SEARCH_CELLS: # or on a quick path, for big boards
+                return lambda cells, cancel: reduction.solve(cells, rows, columns, cancel=cancel)
+            def manhattan(cells, cancel):
+                try:
+                    return solve(cells, rows, columns, cancel=cancel, max_nodes=NODE_LIMIT).moves
+                except SearchAborted:
+                    if cancel.is_set():
+                        raise
+                    return reduction.solve(cells, rows, columns, cancel=cancel)
+            return manhattan
+        # a cancelled search can still be running, so each gets its own heuristic
+        return lambda cells, cancel: solve(cells, rows, columns, PatternHeuristic(databases),
+                                           cancel).moves
@@ -0,0 +1,275 @@
+#-------------------------------------------------------------------------------
+# Name:        Sliding Puzzle loader
+# Purpose:     Decode and resize images in a worker thread, so the window
+#              never freezes while a big animation loads.
+#-------------------------------------------------------------------------------
+import queue
+import threading
+from collections import OrderedDict
+from PIL import Image, ImageSequence
+from profiling import NULL_PROFILER
+from tileframes import tile_boxes, tile_keys
+
+# how often the game checks for newly loaded frames, in milliseconds
+POLL_INTERVAL = 20
+# how much bigger than the target size an image is still decoded or reduced
+# to before the final resize, like Image.thumbnail() does, so that cheap
+# scaling never shows in the result
+REDUCING_GAP = 2.0
+
+def scaled_size(size, max_height):
+    """
+    Returns the size an image of the given size is shown at: as it is, or
+    shrunk to max_height with its aspect ratio kept.
+    """
+    width, height = size
+    if height > max_height:
+        return (int(width*max_height/height), max_height)
+    return size
+
+class DecodedCache(object):
+    """
+    An object of this class keeps decoded, resized frame lists in memory,
+    keyed by (source, max height), so restarting with different rows or
+    columns doesn't decode the same image again. The least recently used
+    lists are dropped once they pass the memory budget. Loaders in several
+    threads can share one; while one of them is decoding a source, the others
+    wait for it instead of decoding it again.
+    Attributes:
+        budget (int): the most bytes of frames to keep.
+        evictions (int): how many frame lists have been dropped.
+        hits (int): how many loads were served from the cache.
+        misses (int): how many loads had to decode.
+        used (int): the bytes of frames held now.
+    """
+    def __init__(self, budget):
+        self.budget = budget
+        self.used = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._items = OrderedDict() # key: (frames, bytes), oldest first
+        self._pending = {} # key: Event, for sources being decoded right now
+        self._lock = threading.Lock()
+
+    def claim(self, key):
+        """
+        Returns the cached frames for the given key. If there aren't any, the
+        caller is expected to decode them and then call put() or abandon(),
+        and None is returned. If another loader is already doing that, this
+        waits for it to finish first.
+        """
+        while True:
+            with self._lock:
+                if key in self._items:
+                    self.hits += 1
+                    self._items.move_to_end(key) # it's the newest now
+                    return self._items[key][0]
+                pending = self._pending.get(key)
+                if pending is None: # nobody's decoding it, so it's ours
+                    self.misses += 1
+                    self._pending[key] = threading.Event()
+                    return None
+            pending.wait() # then look again
+
+    def put(self, key, frames):
+        """
+        Stores the frames that were claimed for the given key.
+        """
+        size = sum(len(frame.getbands())*frame.size[0]*frame.size[1] for frame in frames)
+        with self._lock:
+            if size <= self.budget: # too big to keep isn't an error
+                self._items[key] = (frames, size)
+                self.used += size
+                while self.used > self.budget:
+                    self.used -= self._items.popitem(last=False)[1][1] # drop the oldest
+                    self.evictions += 1
+            self._pending.pop(key).set()
+
+    def abandon(self, key):
+        """
+        Gives up a claim without storing anything.
+        """
+        with self._lock:
+            self._pending.pop(key).set()
+
+    def stats(self):
+        """
+        Returns a dictionary of the hit and miss counts and memory use.
+        """
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                    'entries': len(self._items), 'bytes': self.used, 'budget': self.budget}
+
+class FrameLoader(object):
+    """
+    An object of this class loads one image's frames in a worker thread, in
+    order. The game calls poll() from the Tk thread with after() to collect
+    whatever's ready, so the board can be built from the first frame while
+    the rest are still loading. Given the board's grid, it also works out
+    tile_keys() for each frame, in the worker thread.
+    Attributes:
+        cache (DecodedCache): where finished frame lists are kept, or None.
+        description (str): text for the filename label, from find_image().
+        details (object): whatever else find_image() found out about the
+            source, passed to the Tk thread untouched.
+        done (bool): whether every frame has been collected.
+        error (Exception): whatever went wrong, if anything did.
+        grid (tuple): the board's (rows, columns), or None to skip tile keys.
+        max_height (int): the tallest a frame can be. Taller ones are resized.
+        prefetch (bool): whether this loader only fills the cache, in which
+            case poll() never returns anything.
+        profiler (Profiler): times each step of loading.
+    """
+    def __init__(self, find_image, max_height, cache=None, prefetch=False, grid=None,
+                 profiler=NULL_PROFILER):
+        """
+        Starts loading.
+        Parameters:
+            find_image (function): called in the worker thread, and returns a
+                (key, description, open function, details) tuple. The key
+                identifies the source in the cache, and the open function
+                returns an Image, and is only called if the cache doesn't
+                have it. The details become the details attribute.
+            max_height (int): the tallest a frame can be.
+            cache (DecodedCache): where to look for and keep frame lists.
+            prefetch (bool): whether to only fill the cache.
+            grid (tuple): the board's (rows, columns), for tile keys.
+            profiler (Profiler): times each step of loading.
+        """
+        self.max_height = max_height
+        self.grid = grid
+        self.profiler = profiler
+        self.cache = cache
+        self.prefetch = prefetch
+        self.description = None
+        self.details = None
+        self.done = False
+        self.error = None
+        self._boxes = None
+        self._queue = queue.Queue()
+        self._cancelled = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(find_image,), daemon=True)
+        self._thread.start()
+
+    def cancel(self):
+        """
+        Stops loading after the frame currently being worked on.
+        """
+        self._cancelled.set()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def wait(self, timeout=None):
+        """
+        Blocks until the worker thread has finished, for use without Tk.
+        Returns whether it has.
+        """
+        self._thread.join(timeout)
+        return not self._thread.is_alive()
+
+    def poll(self):
+        """
+        Returns a list of (frame, tile keys) tuples for the frames that have
+        finished since the last call. The keys are None without a grid.
+        This is only ever called from the Tk thread, so the attributes only
+        change there.
+        """
+        frames = []
+        while True:
+            try:
+                kind, value = self._queue.get_nowait()
+            except queue.Empty:
+                return frames
+            if kind == 'frame':
+                frames.append(value)
+            elif kind == 'found':
+                self.description, self.details = value
+            elif kind == 'error':
+                self.error = value
+                self.done = True
+            else: # 'done'
+                self.done = True
+
+    def _run(self, find_image):
+        """
+        Loads every frame, in the worker thread.
+        """
+        claimed = None
+        try:
+            with self.profiler.phase('find'):
+                key, description, open_image, details = find_image()
+            self._queue.put(('found', (description, details)))
+            if self.cache is not None:
+                frames = self.cache.claim((key, self.max_height))
+                if frames is not None: # already decoded
+                    if not self.prefetch:
+                        for frame in frames:
+                            if self.cancelled:
+                                return
+                            self._send(frame)
+                    self._queue.put(('done', None))
+                    return
+                claimed = (key, self.max_height)
+            with self.profiler.phase('open'):
+                image = open_image()
+            frames = self._decode(image)
+            if frames is None: # cancelled
+                return
+            if claimed:
+                self.cache.put(claimed, frames)
+                claimed = None
+        except Exception as e: # report anything at all to the Tk thread
+            self._queue.put(('error', e))
+        else:
+            self._queue.put(('done', None))
+        finally:
+            if claimed:
+                self.cache.abandon(claimed)
+
+    def _decode(self, image):
+        """
+        Copies and resizes each frame, sending each one to the Tk thread as
+        soon as it's ready. Returns the list of frames, or None if loading
+        was cancelled first.
+        """
+        frames = []
+        # base the size for every frame on the first, resized according
+        # to the entered max height if the image is too big
+        size = scaled_size(image.size, self.max_height)
+        if size != image.size and getattr(image, 'n_frames', 1) == 1:
+            # JPEGs can be decoded at 1/2, 1/4, or 1/8 scale for much less
+            # time and memory; this does nothing for other formats. A
+            # multi-frame JPEG (MPO) can't seek past a drafted frame, though
+            image.draft(image.mode, (int(size[0]*REDUCING_GAP), int(size[1]*REDUCING_GAP)))
+        for frame in ImageSequence.Iterator(image):
+            if self.cancelled:
+                return None
+            # the iterator reuses one image for every frame, so each
+            # has to be copied before moving on
+            with self.profiler.phase('decode'):
+                frame = frame.copy()
+            if frame.size != size:
+                # reduce() by whole steps first, then LANCZOS the rest of the way
+                with self.profiler.phase('resize'):
+                    frame = frame.resize(size, resample=Image.LANCZOS, reducing_gap=REDUCING_GAP)
+            self.profiler.count('frames')
+            self.profiler.count('frame bytes', len(frame.getbands())*size[0]*size[1])
+            frames.append(frame)
+            if not self.prefetch:
+                self._send(frame)
+        return frames
+
+    def _send(self, frame):
+        """
+        Passes a finished frame to the Tk thread, with its tile keys.
+        """
+        keys = None
+        if self.grid:
+            if self._boxes is None: # every frame is the same size
+                self._boxes = tile_boxes(frame.size[0], frame.size[1], *self.grid)
+            with self.profiler.phase('tile keys'):
+                keys = tile_keys(frame, self._boxes)
+        self._queue.put(('frame', (frame, keys)))
@@ -0,0 +1,352 @@
+#-------------------------------------------------------------------------------
+# Name:        Sliding Puzzle move log
+# Purpose:     Record every move in two bits, save and restore games in
+#              progress, and replay or check logged games without a window.
+#-------------------------------------------------------------------------------
+import sys
+import json
+import time
+import base64
+import random
+import argparse
+from bisect import bisect_right
+from array import array
+from solvability import random_cells
+
+VERSION = 1
+# which way the empty cell goes, as the two bits stored for each move
+UP, DOWN, LEFT, RIGHT = range(4)
+# moves between checkpoints of the whole layout, for seek()
+CHECKPOINT_INTERVAL = 1024
+# each byte's four moves, lowest bits first
+DECODE = [tuple((byte >> shift) & 3 for shift in (0, 2, 4, 6)) for byte in range(256)]
+
+_step_tables = {} # step_table() results, by board size
+
+def step_table(rows, columns):
+    """
+    Returns, for each position of the empty cell, a 4-tuple of where each
+    direction takes it, or -1 where that would leave the board. Tables are
+    kept, since every game of a size shares one.
+    """
+    if (rows, columns) not in _step_tables:
+        table = []
+        for blank in range(rows*columns):
+            y, x = divmod(blank, columns)
+            table.append((blank - columns if y > 0 else -1,
+                          blank + columns if y < rows - 1 else -1,
+                          blank - 1 if x > 0 else -1,
+                          blank + 1 if x < columns - 1 else -1))
+        _step_tables[(rows, columns)] = tuple(table)
+    return _step_tables[(rows, columns)]
+
+def direction(blank, position, columns):
+    """
+    Returns the direction the empty cell goes when the tile at position
+    slides into it, or None if they aren't next to each other.
+    """
+    difference = position - blank
+    if difference == -columns:
+        return UP
+    if difference == columns:
+        return DOWN
+    if difference == -1 and blank % columns:
+        return LEFT
+    if difference == 1 and position % columns:
+        return RIGHT
+    return None
+
+class MoveLog(object):
+    """
+    An object of this class records one game's moves, two bits each, from
+    a starting layout. It follows the game on its own copy of the layout,
+    so it can refuse illegal moves, and keeps a copy every
+    CHECKPOINT_INTERVAL moves so seek() never replays more than that.
+    Attributes:
+        blank (int): where the empty cell is after the last move.
+        cells (array): the layout after the last move.
+        checkpoint_counts (list): the move count of each checkpoint, for
+            bisecting.
+        checkpoints (list): (move count, layout) tuples, starting with the
+            starting layout at 0.
+        columns (int): the number of columns.
+        count (int): how many moves have been logged.
+        data (bytearray): the moves, four to a byte, lowest bits first.
+        rows (int): the number of rows.
+        start (array): the starting layout.
+    """
+    def __init__(self, rows, columns, cells, checkpoint_interval=CHECKPOINT_INTERVAL):
+        """
+        Parameters:
+            rows (int): the number of rows.
+            columns (int): the number of columns.
+            cells (sequence): the starting layout, as in Board.cells.
+            checkpoint_interval (int): how many moves between checkpoints.
+        """
+        self.rows = rows
+        self.columns = columns
+        typecode = 'H' if rows*columns <= 0x10000 else 'L'
+        self.start = array(typecode, cells)
+        if sorted(self.start) != list(range(rows*columns)):
+            raise ValueError('not a {}x{} layout'.format(rows, columns))
+        self.cells = array(typecode, self.start)
+        self.blank = self.cells.index(rows*columns - 1)
+        self.data = bytearray()
+        self.count = 0
+        self.checkpoint_interval = checkpoint_interval
+        self.checkpoints = [(0, array(typecode, self.start))]
+        self.checkpoint_counts = [0]
+        self._steps = step_table(rows, columns)
+
+    def __len__(self):
+        return self.count
+
+    def append(self, position):
+        """
+        Logs the tile at the given position sliding into the empty cell, the
+        same move as Board.move(position).
+        """
+        way = direction(self.blank, position, self.columns)
+        if way is None or not 0 <= position < len(self.cells):
+            raise ValueError('the tile at {} cannot move'.format(position))
+        self.add(way)
+
+    def add(self, way):
+        """
+        Logs the empty cell going the given direction.
+        """
+        following = self._steps[self.blank][way]
+        if following < 0:
+            raise ValueError('move {} goes off the board'.format(self.count + 1))
+        cells = self.cells
+        cells[self.blank] = cells[following]
+        cells[following] = len(cells) - 1
+        self.blank = following
+        shift = (self.count & 3) << 1
+        if not shift:
+            self.data.append(0)
+        self.data[-1] |= way << shift
+        self.count += 1
+        if self.count % self.checkpoint_interval == 0:
+            self.checkpoints.append((self.count, array(cells.typecode, cells)))
+            self.checkpoint_counts.append(self.count)
+
+    def directions(self, start=0, stop=None):
+        """
+        Yields the direction of each logged move from start up to stop.
+        """
+        stop = self.count if stop is None else min(stop, self.count)
+        data = self.data
+        for index in range(start, stop):
+            yield (data[index >> 2] >> ((index & 3) << 1)) & 3
+
+    def positions(self):
+        """
+        Yields each logged move as the position Board.move() takes.
+        """
+        steps = self._steps
+        blank = self.start.index(len(self.start) - 1)
+        for way in self.directions():
+            blank = steps[blank][way]
+            yield blank
+
+    def seek(self, index):
+        """
+        Returns the layout after the given number of moves, as a list,
+        replaying from the last checkpoint before it.
+        """
+        if not 0 <= index <= self.count:
+            raise IndexError('the log has {} moves'.format(self.count))
+        checkpoint = bisect_right(self.checkpoint_counts, index) - 1
+        done, cells = self.checkpoints[checkpoint]
+        cells = list(cells)
+        blank_id = len(cells) - 1
+        blank = cells.index(blank_id)
+        steps = self._steps
+        for way in self.directions(done, index):
+            following = steps[blank][way]
+            cells[blank] = cells[following]
+            blank = following
+        cells[blank] = blank_id
+        return cells
+
+    @property
+    def solved(self):
+        return all(tile == position for position, tile in enumerate(self.cells))
+
+    def to_bytes(self):
+        """
+        Returns the moves, packed, with any unused bits of the last byte 0.
+        """
+        return bytes(self.data)
+
+    @classmethod
+    def from_bytes(cls, rows, columns, cells, data, count):
+        """
+        Returns a MoveLog of count moves from packed data, replaying them to
+        check every one and to make the checkpoints.
+        """
+        log = cls(rows, columns, cells)
+        if len(data) < (count + 3)//4:
+            raise ValueError('{} moves need {} bytes, not {}'.format(count, (count + 3)//4, len(data)))
+        add = log.add
+        for index in range(count):
+            add((data[index >> 2] >> ((index & 3) << 1)) & 3)
+        return log
+
+def validate(rows, columns, cells, data, count):
+    """
+    Replays packed moves as fast as possible, for checking submitted games
+    in bulk. Nothing is copied or checkpointed.
+    Parameters:
+        rows (int): the number of rows.
+        columns (int): the number of columns.
+        cells (sequence): the starting layout.
+        data (bytes): the moves, as MoveLog.to_bytes() packs them.
+        count (int): how many moves there are.
+    Returns:
+        bool: whether every move was legal and the board ends up solved.
+    """
+    steps = step_table(rows, columns)
+    cells = list(cells)
+    blank_id = len(cells) - 1
+    blank = cells.index(blank_id)
+    whole, extra = divmod(count, 4)
+    if len(data) < whole + (1 if extra else 0):
+        return False
+    decode = DECODE
+    for byte in data[:whole]:
+        for way in decode[byte]:
+            following = steps[blank][way]
+            if following < 0:
+                return False
+            cells[blank] = cells[following]
+            blank = following
+    if extra:
+        for way in decode[data[whole]][:extra]:
+            following = steps[blank][way]
+            if following < 0:
+                return False
+            cells[blank] = cells[following]
+            blank = following
+    if blank != blank_id:
+        return False
+    cells[blank] = blank_id
+    return cells == list(range(len(cells)))
+
+def starting_cells(rows, columns, seed):
+    """
+    Returns the layout a game starts with for the given seed, the same way
+    SlidingPuzzle shuffles a new board.
+    """
+    return random_cells(rows, columns, random.Random(seed))
+
+def session_dict(image, log, seed):
+    """
+    Returns a game in progress as a dictionary, the way save_session()
+    writes it.
+    Parameters:
+        image (str): the image's file name or URL.
+        log (MoveLog): the game's moves so far.
+        seed (int): the seed its starting layout was shuffled with.
+    """
+    return {'version': VERSION, 'image': image, 'rows': log.rows, 'columns': log.columns,
+            'seed': seed, 'moves': log.count,
+            'log': base64.b64encode(log.to_bytes()).decode('ascii')}
+
+def save_session(path, image, log, seed):
+    """
+    Writes a game in progress to a JSON file, with the same parameters as
+    session_dict().
+    """
+    with open(path, 'w') as file:
+        json.dump(session_dict(image, log, seed), file)
+
+def load_session(path):
+    """
+    Reads a game saved by save_session(), replaying its moves to check them.
+    Returns:
+        tuple: the image's file name or URL, the seed, and the MoveLog.
+    """
+    with open(path) as file:
+        try:
+            session = json.load(file)
+            if session.get('version') != VERSION:
+                raise ValueError('{} is not a version {} session'.format(path, VERSION))
+            image, rows, columns, seed = session['image'], session['rows'], session['columns'], session['seed']
+            data = base64.b64decode(session['log'])
+            count = session['moves']
+            for name, value in (('rows', rows), ('columns', columns), ('seed', seed), ('moves', count)):
+                if not isinstance(value, int) or isinstance(value, bool):
+                    raise ValueError('{} is not a whole number'.format(name))
+            if rows < 1 or columns < 1 or count < 0:
+                raise ValueError('{}x{} with {} moves'.format(rows, columns, count))
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError('{} is not a session file: {}'.format(path, e))
+    log = MoveLog.from_bytes(rows, columns, starting_cells(rows, columns, seed), data, count)
+    return image, seed, log
+
+def bench(games=100000, rows=4, columns=4, length=200, seed=0):
+    """
+    Makes games that end solved, by walking the empty cell from the goal
+    and logging the walk backwards, then times validate() on all of them.
+    """
+    rng = random.Random(seed)
+    steps = step_table(rows, columns)
+    reverse = (DOWN, UP, RIGHT, LEFT)
+    logs = []
+    for i in range(games):
+        cells = list(range(rows*columns))
+        blank = len(cells) - 1
+        walk = []
+        for j in range(length):
+            way = rng.randrange(4)
+            following = steps[blank][way]
+            if following < 0:
+                continue
+            cells[blank], cells[following] = cells[following], cells[blank]
+            blank = following
+            walk.append(reverse[way])
+        log = MoveLog(rows, columns, cells)
+        for way in reversed(walk):
+            log.add(way)
+        logs.append((cells, log.to_bytes(), log.count))
+    moves = sum(count for cells, data, count in logs)
+    start = time.perf_counter()
+    valid = sum(validate(rows, columns, cells, data, count) for cells, data, count in logs)
+    elapsed = time.perf_counter() - start
+    print('{} {}x{} games, {} moves, {} valid, in {:.2f}s: {:.0f} games/min, {:.2f}M moves/s, '
+          '{:.1f} bytes/game'.format(games, rows, columns, moves, valid, elapsed, games/elapsed*60,
+                                    moves/elapsed/1e6, sum(len(data) for cells, data, count in logs)/games))
+
+def main():
+    parser = argparse.ArgumentParser(description='Check saved games, or time the checking.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    checker = commands.add_parser('check', help='replay session files and say whether each was won legally')
+    checker.add_argument('files', nargs='+')
+    checker.add_argument('--seek', type=int, help='also print the layout after this many moves')
+    timer = commands.add_parser('bench', help='validate random solved games')
+    timer.add_argument('--games', type=int, default=100000)
+    timer.add_argument('--rows', type=int, default=4)
+    timer.add_argument('--columns', type=int, default=4)
+    timer.add_argument('--length', type=int, default=200, help='moves tried per game')
+    args = parser.parse_args()
+
+    if args.command == 'bench':
+        bench(args.games, args.rows, args.columns, args.length)
+        return
+    failed = False
+    for path in args.files:
+        try:
+            image, seed, log = load_session(path)
+        except (OSError, ValueError) as e:
+            print(path, e)
+            failed = True
+            continue
+        print(path, '{} moves, {}'.format(log.count, 'solved' if log.solved else 'not solved'))
+        if args.seek is not None:
+            print(' '.join(str(tile) for tile in log.seek(min(args.seek, log.count))))
+    sys.exit(failed)
+
+if __name__ == '__main__':
+    main()
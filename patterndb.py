@@ -0,0 +1,323 @@
+#-------------------------------------------------------------------------------
+# Name:        Sliding Puzzle pattern databases
+# Purpose:     Build, save, and load additive pattern databases, which give the
+#              solver much better estimates than Manhattan distance.
+#-------------------------------------------------------------------------------
+import os
+import sys
+import mmap
+import struct
+import hashlib
+import argparse
+from solver import neighbor_table
+
+MAGIC = b'SPDB'
+VERSION = 1
+# magic, version, rows, columns, pattern size, then a sha256 of the table
+HEADER = struct.Struct('<4sHBBB32s')
+UNSEEN = 0xFF
+
+# disjoint tile groups that keep each pattern in a compact block of the board
+DEFAULT_PARTITIONS = {
+    (3, 3): ((0, 1, 3, 4), (2, 5, 6, 7)),
+    (4, 4): ((0, 1, 4, 5, 8, 12), (2, 3, 6, 7, 10, 11), (9, 13, 14)),
+    (5, 5): ((0, 1, 5, 6, 10, 11), (2, 3, 4, 7, 8, 9),
+             (15, 16, 17, 20, 21, 22), (12, 13, 14, 18, 19, 23)),
+}
+
+def table_size(cells, tiles):
+    """
+    Returns the number of ways to place the given number of tiles on the
+    given number of cells, which is how many entries a pattern needs.
+    """
+    size = 1
+    for i in range(tiles):
+        size *= cells - i
+    return size
+
+def rank(positions, cells):
+    """
+    Ranks a partial permutation: each tile's position, renumbered to skip
+    the cells taken by the tiles before it, is a digit in a mixed-radix
+    number. Every placement gets a distinct rank below table_size().
+    Parameters:
+        positions (sequence): the position of each tile in the pattern.
+        cells (int): the number of cells on the board.
+    """
+    result = 0
+    for i, position in enumerate(positions):
+        digit = position
+        for j in range(i):
+            if positions[j] < position:
+                digit -= 1
+        result = result*(cells-i) + digit
+    return result
+
+def unrank(number, tiles, cells):
+    """
+    The inverse of rank(): returns a list with the position of each tile.
+    """
+    digits = [0]*tiles
+    for i in range(tiles-1, -1, -1):
+        number, digits[i] = divmod(number, cells-i)
+    positions = []
+    for digit in digits:
+        # find the digit-th cell that isn't already taken
+        position = 0
+        while True:
+            if position not in positions:
+                if not digit:
+                    break
+                digit -= 1
+            position += 1
+        positions.append(position)
+    return positions
+
+def build(rows, columns, pattern, progress=None):
+    """
+    Builds a pattern database with a retrograde breadth-first search from the
+    solved board. Only the pattern's tiles and the empty cell are tracked,
+    and only moves of the pattern's tiles are counted, so databases for
+    disjoint patterns can be added together without overestimating. Moving
+    the empty cell through other tiles is free, so each distance level is
+    flooded with free moves before the next one begins.
+    Parameters:
+        rows (int): the number of rows.
+        columns (int): the number of columns.
+        pattern (sequence): the IDs of the tiles in this pattern.
+        progress (function): called with (distance, entries filled) after
+            each level, if given.
+    Returns:
+        bytearray: the fewest moves of pattern tiles needed to solve each
+            placement of them, indexed by rank().
+    """
+    cells = rows*columns
+    tiles = len(pattern)
+    neighbors = neighbor_table(rows, columns)
+    entries = table_size(cells, tiles)
+    table = bytearray([UNSEEN])*entries
+    seen = bytearray((entries*cells + 7)//8) # one bit per (placement, blank)
+    frontier = [rank(pattern, cells)*cells + cells-1] # the solved board
+    distance = 0
+    filled = 0
+    while frontier:
+        following = [] # states one more pattern move away
+        stack = []
+        for state in frontier:
+            if seen[state >> 3] & (1 << (state & 7)):
+                continue
+            seen[state >> 3] |= 1 << (state & 7)
+            stack.append(state)
+            while stack: # flood this level with free moves of the empty cell
+                state = stack.pop()
+                number, blank = divmod(state, cells)
+                if table[number] == UNSEEN:
+                    table[number] = distance
+                    filled += 1
+                positions = unrank(number, tiles, cells)
+                for position in neighbors[blank]:
+                    if position in positions: # a pattern tile slides over
+                        moved = positions[:]
+                        moved[positions.index(position)] = blank
+                        following.append(rank(moved, cells)*cells + position)
+                    else: # another tile slides over, for free
+                        free = number*cells + position
+                        if not seen[free >> 3] & (1 << (free & 7)):
+                            seen[free >> 3] |= 1 << (free & 7)
+                            stack.append(free)
+        if progress:
+            progress(distance, filled)
+        frontier = following
+        distance += 1
+    return table
+
+def filename(rows, columns, pattern):
+    """
+    Returns the standard file name for a pattern database.
+    """
+    return '{}x{}-{}.pdb'.format(rows, columns, '-'.join(str(tile) for tile in pattern))
+
+def save(path, rows, columns, pattern, table):
+    """
+    Writes a pattern database to disk with a header and checksum.
+    """
+    digest = hashlib.sha256(table).digest()
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, rows, columns, len(pattern), digest))
+        f.write(bytes(pattern))
+        f.write(table)
+
+class PatternDatabase(object):
+    """
+    An object of this class is a pattern database loaded from disk. The table
+    is memory-mapped rather than read, so loading is nearly instant and
+    every process using the same file shares one copy in memory.
+    Attributes:
+        columns (int): the number of columns.
+        digest (bytes): the sha256 of the table, from the file's header.
+        pattern (tuple): the IDs of the tiles in this pattern.
+        rows (int): the number of rows.
+        table (memoryview): the distance for each rank() of the pattern.
+    """
+    def __init__(self, path, verify=False):
+        """
+        Maps the given file.
+        Parameters:
+            path (str): the file to load.
+            verify (bool): whether to check the table against its checksum,
+                which means reading the whole thing.
+        """
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, version, self.rows, self.columns, tiles, self.digest = \
+                HEADER.unpack_from(self._map)
+        except struct.error:
+            raise ValueError('{} is too short to be a pattern database'.format(path))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('{} is not a version {} pattern database'.format(path, VERSION))
+        start = HEADER.size + tiles
+        self.pattern = tuple(self._map[HEADER.size:start])
+        self.table = memoryview(self._map)[start:]
+        if len(self.table) != table_size(self.rows*self.columns, tiles):
+            raise ValueError('{} has the wrong table size'.format(path))
+        if verify and not self.verify():
+            raise ValueError('{} failed its checksum'.format(path))
+
+    def verify(self):
+        """
+        Whether the table matches the checksum in the header.
+        """
+        return hashlib.sha256(self.table).digest() == self.digest
+
+    def lookup(self, positions):
+        """
+        Returns the distance for the given positions of the pattern's tiles.
+        """
+        return self.table[rank(positions, self.rows*self.columns)]
+
+class PatternHeuristic(object):
+    """
+    An object of this class adds up disjoint pattern databases into one
+    estimate, with the same estimate() and moved() methods as
+    ManhattanHeuristic so it can be passed to solver.solve().
+    Attributes:
+        databases (list): the PatternDatabase for each pattern.
+        owner (list): for each tile ID, the index of the database its pattern
+            is in, or -1 for the empty cell.
+        values (list): the current value from each database.
+        where (list): the current position of each tile.
+    """
+    def __init__(self, databases):
+        self.databases = list(databases)
+        first = self.databases[0]
+        size = first.rows*first.columns
+        self.size = size
+        self.owner = [-1]*size
+        for index, database in enumerate(self.databases):
+            if (database.rows, database.columns) != (first.rows, first.columns):
+                raise ValueError('pattern databases are for different board sizes')
+            for tile in database.pattern:
+                if self.owner[tile] != -1:
+                    raise ValueError('tile {} is in more than one pattern'.format(tile+1))
+                self.owner[tile] = index
+        if -1 in self.owner[:-1]:
+            raise ValueError('the patterns do not cover every tile')
+        self.values = [0]*len(self.databases)
+        self.where = [0]*size
+
+    def _value(self, index):
+        """
+        Looks up the given database using the current tile positions.
+        """
+        database = self.databases[index]
+        where = self.where
+        return database.table[rank([where[tile] for tile in database.pattern], self.size)]
+
+    def estimate(self, cells):
+        """
+        Computes the estimate from scratch.
+        """
+        for position, tile in enumerate(cells):
+            self.where[tile] = position
+        for index in range(len(self.databases)):
+            self.values[index] = self._value(index)
+        return sum(self.values)
+
+    def moved(self, cells, tile, source, target, value):
+        """
+        Returns the new estimate after a tile has slid from source to target.
+        Only the moved tile's own pattern needs to be looked up again.
+        """
+        self.where[tile] = target
+        index = self.owner[tile]
+        new = self._value(index)
+        value += new - self.values[index]
+        self.values[index] = new
+        return value
+
+def load_heuristic(rows, columns, directory, verify=False):
+    """
+    Loads the default partition's pattern databases for the given board size
+    from a folder, as a PatternHeuristic.
+    """
+    return PatternHeuristic(PatternDatabase(os.path.join(directory, filename(rows, columns, pattern)), verify)
+                            for pattern in partition(rows, columns))
+
+def partition(rows, columns, sizes=None):
+    """
+    Splits the tiles into disjoint patterns. Without sizes, it uses the
+    default for the board if there is one, and otherwise groups of up to 5
+    tiles. Given sizes such as (6, 6, 3), it takes that many tiles at a time
+    in row order.
+    """
+    tiles = rows*columns - 1
+    if sizes is None:
+        if (rows, columns) in DEFAULT_PARTITIONS:
+            return DEFAULT_PARTITIONS[(rows, columns)]
+        sizes = [5]*(tiles//5) + ([tiles % 5] if tiles % 5 else [])
+    if sum(sizes) != tiles:
+        raise ValueError('the pattern sizes must add up to {}'.format(tiles))
+    patterns = []
+    start = 0
+    for size in sizes:
+        patterns.append(tuple(range(start, start+size)))
+        start += size
+    return tuple(patterns)
+
+def main():
+    parser = argparse.ArgumentParser(description='Build or check sliding puzzle pattern databases.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    builder = commands.add_parser('build', help='build the databases for a board size')
+    builder.add_argument('--rows', type=int, default=4)
+    builder.add_argument('--columns', type=int, default=4)
+    builder.add_argument('--partition', help='pattern sizes such as 6-6-3, taken in row order '
+                         '(default: a blocky partition for 3x3, 4x4, and 5x5)')
+    builder.add_argument('--output', default='.', help='folder for the .pdb files')
+    checker = commands.add_parser('check', help='verify the checksums of .pdb files')
+    checker.add_argument('files', nargs='+')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        sizes = [int(size) for size in args.partition.split('-')] if args.partition else None
+        os.makedirs(args.output, exist_ok=True)
+        for pattern in partition(args.rows, args.columns, sizes):
+            path = os.path.join(args.output, filename(args.rows, args.columns, pattern))
+            print('building', path)
+            table = build(args.rows, args.columns, pattern,
+                          lambda distance, filled: print('  distance {}: {} entries'.format(distance, filled)))
+            save(path, args.rows, args.columns, pattern, table)
+    else:
+        failed = False
+        for path in args.files:
+            try:
+                PatternDatabase(path, verify=True)
+            except ValueError as e:
+                print(e)
+                failed = True
+            else:
+                print(path, 'OK')
+        sys.exit(failed)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,184 @@
+#-------------------------------------------------------------------------------
+# Name:        Sliding Puzzle profiling
+# Purpose:     Time the named phases of loading and playing a board, and count
+#              what they handled, at almost no cost when switched off.
+#-------------------------------------------------------------------------------
+import json
+import threading
+import time
+from collections import deque
+
+# how many of each phase's most recent timings are kept for percentiles
+SAMPLES = 1000
+
+class Phase(object):
+    """
+    An object of this class times one run of a phase as a context manager,
+    and adds the result to its Profiler when it ends.
+    """
+    __slots__ = ('profiler', 'name', 'start')
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.record(self.name, time.perf_counter() - self.start)
+        return False
+
+class Profiler(object):
+    """
+    An object of this class collects timings for named phases, like 'decode'
+    or 'move', and named counters, like 'frames' or 'bytes'. Phases can be
+    timed from any thread.
+    Attributes:
+        counters (dictionary): a str:int dictionary of each counter's total.
+        enabled (bool): always True, so callers can skip expensive setup
+            for a NullProfiler.
+        phases (dictionary): a str:list dictionary, with each list being the
+            phase's run count, total seconds, and longest run in seconds.
+        samples (dictionary): a str:deque dictionary, with each phase's most
+            recent SAMPLES timings in seconds.
+    """
+    enabled = True
+
+    def __init__(self):
+        self.phases = {}
+        self.counters = {}
+        self.samples = {}
+        self._lock = threading.Lock()
+
+    def phase(self, name):
+        """
+        Returns a context manager that times its block as a run of the
+        named phase.
+        """
+        return Phase(self, name)
+
+    def record(self, name, seconds):
+        """
+        Adds one run of the named phase that took the given seconds.
+        """
+        with self._lock:
+            totals = self.phases.get(name)
+            if totals is None:
+                totals = self.phases[name] = [0, 0.0, 0.0]
+                self.samples[name] = deque(maxlen=SAMPLES)
+            totals[0] += 1
+            totals[1] += seconds
+            if seconds > totals[2]:
+                totals[2] = seconds
+            self.samples[name].append(seconds)
+
+    def count(self, name, amount=1):
+        """
+        Adds the given amount to the named counter.
+        """
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def reset(self):
+        """
+        Forgets everything collected so far.
+        """
+        with self._lock:
+            self.phases.clear()
+            self.counters.clear()
+            self.samples.clear()
+
+    def report(self):
+        """
+        Returns a dictionary of every phase's count, total, mean, median,
+        99th percentile and longest run, in milliseconds, and every counter.
+        """
+        with self._lock:
+            phases = {}
+            for name, (count, total, longest) in self.phases.items():
+                recent = sorted(self.samples[name])
+                phases[name] = {'count': count,
+                                'total_ms': total*1000,
+                                'mean_ms': total*1000/count,
+                                'p50_ms': recent[len(recent)//2]*1000,
+                                'p99_ms': recent[min(len(recent)-1, len(recent)*99//100)]*1000,
+                                'max_ms': longest*1000}
+            return {'phases': phases, 'counters': dict(self.counters)}
+
+    def to_json(self, indent=2, extra=None):
+        """
+        Returns report() as a JSON string, with any extra dictionary's items
+        added alongside the phases and counters.
+        """
+        report = self.report()
+        report.update(extra or {})
+        return json.dumps(report, indent=indent, sort_keys=True)
+
+    def export(self, path, extra=None):
+        """
+        Writes to_json() to the given file.
+        """
+        with open(path, 'w') as file:
+            file.write(self.to_json(extra=extra))
+
+    def summary(self):
+        """
+        Returns a few lines of text for the on-screen overlay.
+        """
+        report = self.report()
+        lines = ['{:<12} {:>5} x {:8.2f}ms  p99 {:8.2f}ms'.format(
+                     name, phase['count'], phase['mean_ms'], phase['p99_ms'])
+                 for name, phase in sorted(report['phases'].items())]
+        lines.extend('{:<12} {:>12}'.format(name, count)
+                     for name, count in sorted(report['counters'].items()))
+        return '\n'.join(lines)
+
+class NullPhase(object):
+    """
+    A context manager that does nothing, shared by every NullProfiler phase.
+    """
+    __slots__ = ()
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+NULL_PHASE = NullPhase()
+
+class NullProfiler(object):
+    """
+    An object of this class has the same methods as a Profiler, but none of
+    them do anything, so profiling can be left in place when it's off.
+    """
+    enabled = False
+
+    def phase(self, name):
+        return NULL_PHASE
+
+    def record(self, name, seconds):
+        pass
+
+    def count(self, name, amount=1):
+        pass
+
+    def reset(self):
+        pass
+
+    def report(self):
+        return {'phases': {}, 'counters': {}}
+
+    def to_json(self, indent=2, extra=None):
+        report = self.report()
+        report.update(extra or {})
+        return json.dumps(report, indent=indent)
+
+    def export(self, path, extra=None):
+        with open(path, 'w') as file:
+            file.write(self.to_json(extra=extra))
+
+    def summary(self):
+        return ''
+
+NULL_PROFILER = NullProfiler()
@@ -0,0 +1,632 @@
+#-------------------------------------------------------------------------------
+# Name:        Sliding Puzzle reduction solver
+# Purpose:     Solve boards of any size in polynomial time by placing one row
+#              or column at a time, and optionally shorten the result.
+#-------------------------------------------------------------------------------
+import sys
+import time
+import random
+import itertools
+from operator import eq
+from collections import deque
+from solvability import is_solvable
+import solver
+
+# the cells around a tile, in order round it, as (x, y) offsets
+RING = ((-1, -1), (0, -1), (1, -1), (1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0))
+RING_INDEX = {offset: i for i, offset in enumerate(RING)}
+
+def solve(cells, rows, columns, compress=False, cancel=None):
+    """
+    Solves a board of any size, though not in the fewest moves. The unsolved
+    part of the board is always a rectangle in the lower right: its top row
+    or left column, whichever side is longer, is placed one tile at a time,
+    and the rectangle shrinks until it's 3x3, which IDA* solves in a few
+    milliseconds. The last two tiles of each line can't be placed one at a
+    time, so they're finished with a small search of the cells around them,
+    which is remembered for the next line with the same shape.
+    Parameters:
+        cells (sequence): the ID of the tile at each position, with the
+            highest ID marking the empty cell, as in Board.cells.
+        rows (int): the number of rows.
+        columns (int): the number of columns.
+        compress (bool): whether to shorten the moves with compress(). It
+            takes nearly as long as solving and saves very few moves, so
+            it's off unless asked for.
+        cancel (Event): stops solving with solver.SearchAborted, between
+            lines, once it's set.
+    Returns:
+        list: the position of each tile to move, as Board.move() takes it.
+    """
+    return Reducer(cells, rows, columns, cancel).solve(compress)
+
+class Reducer(object):
+    """
+    An object of this class works through one board for solve().
+    Attributes:
+        blank (int): the position of the empty cell.
+        cancel (Event): stops solving once it's set, or None.
+        cells (list): the ID of the tile at each position.
+        columns (int): the number of columns.
+        ids (list): every position in order, sliced for routes, since that's
+            quicker than making new ints.
+        left (int): the first column of the unsolved rectangle.
+        locked (bytearray): 1 for each position whose tile mustn't move.
+        moves (list): the position of each tile moved so far.
+        rows (int): the number of rows.
+        start (int): where the empty cell started.
+        top (int): the first row of the unsolved rectangle.
+        where (list): the position of each tile.
+    """
+    # the finishing searches, by window shape and starting layout, shared
+    # by every board so each one only runs once
+    macros = {}
+
+    def __init__(self, cells, rows, columns, cancel=None):
+        self.rows = rows
+        self.columns = columns
+        self.cancel = cancel
+        self.cells = list(cells)
+        self.ids = list(range(len(self.cells)))
+        self.where = [0]*len(self.cells)
+        for position, tile in enumerate(self.cells):
+            self.where[tile] = position
+        self.blank_id = len(self.cells) - 1
+        self.blank = self.start = self.where[self.blank_id]
+        self.locked = bytearray(len(self.cells))
+        self.moves = []
+        self.top = 0
+        self.left = 0
+
+    def solve(self, compress_moves=False):
+        """
+        Returns the moves that solve the board, as solve() does.
+        """
+        if not is_solvable(self.cells, self.rows, self.columns):
+            raise ValueError('this layout cannot be solved')
+        while self.rows - self.top > 3 or self.columns - self.left > 3:
+            if self.cancel is not None and self.cancel.is_set():
+                raise solver.SearchAborted('cancelled')
+            if self.rows - self.top >= self.columns - self.left:
+                self.place_row()
+            else:
+                self.place_column()
+        self.finish_corner()
+        if compress_moves:
+            return compress(self.moves, self.start, self.columns)
+        return self.moves
+
+    def slide(self, position):
+        """
+        Moves the tile at the given position into the empty cell next to it.
+        """
+        self.slide_along((position,))
+
+    def slide_along(self, route):
+        """
+        Moves the empty cell along a route of neighboring positions, sliding
+        each tile on the way into it.
+        """
+        cells, where = self.cells, self.where
+        blank = self.blank
+        for position in route:
+            tile = cells[position]
+            cells[blank] = tile
+            where[tile] = blank
+            blank = position
+        cells[blank] = self.blank_id
+        where[self.blank_id] = blank
+        self.blank = blank
+        self.moves.extend(route)
+
+    def walk(self, target, avoid=-1):
+        """
+        Moves the empty cell to the target without moving any locked tile or
+        the tile at avoid: round the cells next to avoid if it starts and
+        ends there, or along one of the two L-shaped routes if either is
+        clear, or by way of a cell next to avoid, or else along the shortest
+        route around.
+        """
+        if self.blank == target:
+            return
+        route = None
+        if avoid >= 0:
+            route = self.ring_route(self.blank, target, avoid)
+        if route is None:
+            route = self.l_route(self.blank, target, avoid)
+        if route is None and avoid >= 0: # it's in the way, so go to its side first
+            ay, ax = divmod(avoid, self.columns)
+            for dx, dy in RING:
+                x, y = ax + dx, ay + dy
+                if not (0 <= x < self.columns and 0 <= y < self.rows):
+                    continue
+                first = self.l_route(self.blank, y*self.columns + x, avoid)
+                rest = None if first is None else self.ring_route(y*self.columns + x, target, avoid)
+                if rest is not None:
+                    route = first + rest
+                    break
+        self.slide_along(route if route is not None else self.route(target, avoid))
+
+    def l_route(self, start, target, avoid):
+        """
+        Returns the empty cell's route from start to target along a straight
+        line or one of the two L shapes, or None if locked tiles or the tile
+        at avoid block them all.
+        """
+        columns = self.columns
+        locked = self.locked
+        by, bx = divmod(start, columns)
+        ty, tx = divmod(target, columns)
+        step_x = 1 if tx > bx else -1
+        step_y = columns if ty > by else -columns
+        across, down = abs(tx - bx), abs(ty - by)
+        if not across or not down: # a straight line
+            step = step_x if across else step_y
+            routes = ((line(start + step, step, across + down),),)
+        else:
+            routes = ((line(start + step_x, step_x, across), line(by*columns + tx + step_y, step_y, down)),
+                      (line(start + step_y, step_y, down), line(ty*columns + bx + step_x, step_x, across)))
+        for route in routes:
+            if not any(1 in locked[part] or avoid in self.ids[part] for part in route):
+                return [position for part in route for position in self.ids[part]]
+        return None
+
+    def ring_route(self, start, target, avoid):
+        """
+        Returns the shorter clear route for the empty cell from start to
+        target round the eight cells next to avoid, or None if either isn't
+        one of them or both ways round are blocked.
+        """
+        columns = self.columns
+        ay, ax = divmod(avoid, columns)
+        sy, sx = divmod(start, columns)
+        ty, tx = divmod(target, columns)
+        first = RING_INDEX.get((sx - ax, sy - ay))
+        last = RING_INDEX.get((tx - ax, ty - ay))
+        if first is None or last is None:
+            return None
+        forward = (last - first) % 8
+        ways = ((1, forward), (-1, 8 - forward))
+        for way, length in ways if forward <= 4 else ways[::-1]: # the shorter way first
+            route = []
+            for i in range(1, length + 1):
+                dx, dy = RING[(first + way*i) % 8]
+                x, y = ax + dx, ay + dy
+                if not (0 <= x < columns and 0 <= y < self.rows) or self.locked[y*columns + x]:
+                    break
+                route.append(y*columns + x)
+            else:
+                return route
+        return None
+
+    def route(self, target, avoid):
+        """
+        Returns the shortest route for the empty cell to the target through
+        the unlocked cells, not counting where it starts.
+        """
+        columns, size = self.columns, len(self.cells)
+        previous = {self.blank: None}
+        queue = deque([self.blank])
+        while queue:
+            position = queue.popleft()
+            if position == target:
+                break
+            x = position % columns
+            for neighbor, ok in ((position - columns, position >= columns),
+                                 (position + columns, position + columns < size),
+                                 (position - 1, x > 0), (position + 1, x < columns - 1)):
+                if ok and neighbor not in previous and not self.locked[neighbor] and neighbor != avoid:
+                    previous[neighbor] = position
+                    queue.append(neighbor)
+        else:
+            raise ValueError('the empty cell is walled in')
+        route = []
+        while target != self.blank:
+            route.append(target)
+            target = previous[target]
+        return route[::-1]
+
+    def repeated(self, position, step, offsets, count, trim):
+        """
+        Returns the moves of a macro played count times, each repeat
+        starting step further on than the last, less the last trim moves.
+        Parameters:
+            position (int): where the first repeat starts.
+            step (int): how far each repeat moves on from the last.
+            offsets (tuple): each move of the macro, relative to its start.
+            count (int): how many times to repeat it.
+            trim (int): how many moves to leave off the end.
+        """
+        width = len(offsets)
+        route = [0]*(width*count - trim)
+        for i, offset in enumerate(offsets): # fill in every repeat's ith move at once
+            repeats = count if i < width - trim else count - 1
+            route[i::width] = self.ids[line(position + offset, step, repeats)]
+        return route
+
+    def relocate(self, *parts):
+        """
+        Brings where up to date for the tiles in the given slices of cells.
+        """
+        cells, where, ids = self.cells, self.where, self.ids
+        for part in parts:
+            for position, tile in zip(ids[part], cells[part]):
+                where[tile] = position
+        self.blank = where[self.blank_id]
+
+    def run(self, position, step, side, count):
+        """
+        Moves the tile at position count steps in a straight line, with the
+        empty cell starting just ahead of it and going round it on the given
+        side after each step, five moves a step. Every tile the empty cell
+        passes is moved back one step along the path or the lane beside it,
+        so they're all moved at once.
+        """
+        if count == 1:
+            self.slide(position)
+            return
+        cells = self.cells
+        path = line(position, step, count + 1)
+        lane = line(position + side, step, count + 1)
+        on, beside = cells[path], cells[lane]
+        cells[path] = [beside[0]] + beside[2:count] + [self.blank_id, on[0]]
+        cells[lane] = [beside[1]] + on[2:count] + [beside[count], on[count]]
+        self.relocate(path, lane)
+        self.moves.extend(self.repeated(position, step, (0, side, side + step, side + 2*step, 2*step),
+                                        count, 4))
+
+    def stairs(self, position, step_1, step_2, count):
+        """
+        Moves the tile at position count times one way and then the other,
+        with the empty cell starting just ahead of it the first way and
+        cutting each corner in two moves, three moves a step. The tiles the
+        empty cell passes each move one cell back along a diagonal, so
+        they're all moved at once.
+        """
+        cells = self.cells
+        step = step_1 + step_2
+        path = line(position, step, count + 1) # where the tile starts and each pair ends
+        corners = line(position + step_2, step, count)
+        inside = line(position + step_1, step, count) # where it is between steps
+        outside = line(position + 2*step_1, step, count - 1)
+        on, by, within, without = cells[path], cells[corners], cells[inside], cells[outside]
+        cells[path] = by + [on[0]]
+        cells[corners] = on[1:]
+        cells[inside] = without + [self.blank_id]
+        cells[outside] = within[1:]
+        self.relocate(path, corners, inside, outside)
+        self.moves.extend(self.repeated(position, step,
+                                        (0, step_2, step, step_1, 2*step_1, 2*step_1 + step_2), count, 2))
+
+    def clear_run(self, position, step, side, count, lane_ok):
+        """
+        Returns how many of count steps the tile at position can go in a
+        straight line for run(), with the empty cell going round it on the
+        given side, which is on the board if lane_ok.
+        """
+        locked = self.locked
+        steps = locked[line(position + step, step, count)].find(1)
+        if steps < 0:
+            steps = count
+        if steps < 2: # one step doesn't need the lane
+            return steps
+        if not lane_ok:
+            return 1
+        lane = locked[line(position + side, step, steps + 1)].find(1)
+        return steps if lane < 0 else max(1, lane - 1)
+
+    def clear_stairs(self, position, step_1, step_2, count):
+        """
+        Returns how many of count pairs of steps the tile at position can
+        take for stairs(). Every cell they use is between the tile and its
+        target, so only locked tiles can get in the way.
+        """
+        locked = self.locked
+        step = step_1 + step_2
+        pairs = count
+        for start, length, extra in ((position + step_1, count, 0), (position + step_2, count, 0),
+                                     (position + step, count, 0), (position + 2*step_1, count - 1, 1)):
+            blocked = locked[line(start, step, length)].find(1)
+            if 0 <= blocked < pairs - extra:
+                pairs = blocked + extra
+        return pairs
+
+    def move_tile(self, tile, target, across_first):
+        """
+        Moves a tile to the target with runs of fixed moves, so the empty
+        cell only needs a route worked out between runs. A diagonal stretch
+        goes by stairs() and a straight one by run(), with the empty cell
+        going round the tile on the side away from the placed tiles if
+        that's clear. Runs stop short where a locked tile is in the way.
+        Parameters:
+            tile (int): the ID of the tile to move.
+            target (int): where to put it.
+            across_first (bool): whether the tile goes along its row first,
+                in stairs and straight runs, which keeps it clear of the
+                line being placed.
+        """
+        columns = self.columns
+        ty, tx = divmod(target, columns)
+        position = self.where[tile]
+        while position != target:
+            y, x = divmod(position, columns)
+            across = (1 if tx > x else -1) if tx != x else 0
+            down = (columns if ty > y else -columns) if ty != y else 0
+            ways = [way for way in ((across, down) if across_first else (down, across)) if way]
+            if len(ways) == 2:
+                count = min(abs(tx - x), abs(ty - y))
+                for first, second in (ways, ways[::-1]):
+                    pairs = self.clear_stairs(position, first, second, count)
+                    if pairs:
+                        self.walk(position + first, position)
+                        self.stairs(position, first, second, pairs)
+                        position += pairs*(first + second)
+                        break
+                else:
+                    position = self.move_straight(position, x, y, tx, ty, ways)
+            else:
+                position = self.move_straight(position, x, y, tx, ty, ways)
+
+    def move_straight(self, position, x, y, tx, ty, ways):
+        """
+        Moves the tile at (x, y) straight toward (tx, ty), the first of the
+        given ways it can go, for as far as run() can take it, and returns
+        where it ends up.
+        """
+        columns, rows = self.columns, self.rows
+        for way in ways:
+            if abs(way) == 1:
+                count = abs(tx - x)
+                sides = ((columns, y + 1 < rows), (-columns, y > 0))
+            else:
+                count = abs(ty - y)
+                sides = ((1, x + 1 < columns), (-1, x > 0))
+            for side, lane_ok in sides:
+                steps = self.clear_run(position, way, side, count, lane_ok)
+                if steps:
+                    self.walk(position + way, position)
+                    self.run(position, way, side, steps)
+                    return position + steps*way
+        raise ValueError('the tile at {} is walled in'.format(position))
+
+    def place_row(self):
+        """
+        Places the top row of the unsolved rectangle.
+        """
+        columns, top = self.columns, self.top
+        start = top*columns
+        for x in range(self.left, columns - 2):
+            self.move_tile(start + x, start + x, True)
+            self.locked[start + x] = 1
+        first, second = start + columns - 2, start + columns - 1
+        box = [y*columns + x for y in range(top, min(top + 3, self.rows))
+               for x in range(max(self.left, columns - 3), columns)]
+        self.finish_pair(first, second, [position for position in box if not self.locked[position]])
+        self.top += 1
+
+    def place_column(self):
+        """
+        Places the left column of the unsolved rectangle.
+        """
+        columns, left = self.columns, self.left
+        for y in range(self.top, self.rows - 2):
+            self.move_tile(y*columns + left, y*columns + left, False)
+            self.locked[y*columns + left] = 1
+        first, second = (self.rows - 2)*columns + left, (self.rows - 1)*columns + left
+        box = [y*columns + x for y in range(max(self.top, self.rows - 3), self.rows)
+               for x in range(left, min(left + 3, columns))]
+        self.finish_pair(first, second, [position for position in box if not self.locked[position]])
+        self.left += 1
+
+    def finish_pair(self, first, second, window):
+        """
+        Places the last two tiles of a line, whose homes are first and
+        second. The first tile goes home, and the second two cells past the
+        end of the line, since with the first tile home it could only reach
+        its own home from the side the empty cell would need. Then the empty
+        cell is brought into the window too, and a search of the window
+        finishes the pair.
+        """
+        columns = self.columns
+        across_first = first//columns == second//columns # a row
+        self.move_tile(first, first, across_first)
+        if self.where[second] != second and self.blank == second and \
+           self.where[second] == second + (columns if across_first else 1):
+            # the empty cell's in the corner, walled in by the two tiles,
+            # but the second tile is right next to it
+            self.slide(self.where[second])
+        if self.where[second] == second:
+            self.locked[first] = self.locked[second] = 1
+            return
+        self.locked[first] = 1
+        self.move_tile(second, second + (2*columns if across_first else 2), across_first)
+        self.locked[self.where[second]] = 1
+        if self.blank not in window:
+            self.walk(min((position for position in window if not self.locked[position]),
+                          key=lambda position: abs(position//columns - self.blank//columns) +
+                                               abs(position % columns - self.blank % columns)))
+        self.locked[self.where[second]] = self.locked[first] = 0
+        self.finish(window, [first, second])
+        self.locked[first] = self.locked[second] = 1
+
+    def finish_corner(self):
+        """
+        Solves the last rectangle, at most 3x3, optimally with IDA*.
+        """
+        columns = self.columns
+        height, width = self.rows - self.top, self.columns - self.left
+        window = [y*columns + x for y in range(self.top, self.rows)
+                  for x in range(self.left, columns)]
+        # renumber the tiles as if the rectangle were a board of its own
+        local = {position: i for i, position in enumerate(window)}
+        solution = solver.solve([local[self.cells[position]] for position in window], height, width)
+        for i in solution.moves:
+            self.slide(window[i])
+
+    def finish(self, window, tiles):
+        """
+        Puts the given tiles home, moving only within the window, with a
+        breadth-first search in which every other tile is alike. The search
+        for each window shape and layout is remembered as a macro.
+        """
+        columns = self.columns
+        origin = min(window)
+        oy, ox = divmod(origin, columns)
+        relative = tuple((position//columns - oy, position % columns - ox) for position in window)
+        index = {position: i for i, position in enumerate(window)}
+        start = tuple(index[self.where[tile]] for tile in tiles) + (index[self.blank],)
+        goal = tuple(index[tile] for tile in tiles)
+        key = (relative, start, goal)
+        if key not in self.macros:
+            self.macros[key] = search_window(relative, start, goal)
+        for i in self.macros[key]:
+            self.slide(window[i])
+
+def line(start, step, count):
+    """
+    Returns a slice of count positions step apart from start, either way.
+    """
+    if not count: # start might be off the board
+        return slice(0, 0)
+    stop = start + count*step
+    return slice(start, stop if stop >= 0 else None, step)
+
+def search_window(relative, start, goal):
+    """
+    Returns the shortest series of window indexes for the empty cell to move
+    through so that the tracked tiles reach the goal.
+    Parameters:
+        relative (tuple): the (row, column) of each cell in the window.
+        start (tuple): the window index of each tracked tile, then of the
+            empty cell.
+        goal (tuple): where each tracked tile should end up.
+    """
+    lookup = {cell: i for i, cell in enumerate(relative)}
+    neighbors = [[lookup[(y + dy, x + dx)] for dy, dx in ((-1, 0), (1, 0), (0, -1), (0, 1))
+                  if (y + dy, x + dx) in lookup] for y, x in relative]
+    previous = {start: None}
+    queue = deque([start])
+    while queue:
+        state = queue.popleft()
+        if state[:-1] == goal:
+            break
+        blank = state[-1]
+        for neighbor in neighbors[blank]:
+            following = tuple(blank if i == neighbor else i for i in state[:-1]) + (neighbor,)
+            if following not in previous:
+                previous[following] = state
+                queue.append(following)
+    else:
+        raise ValueError('the window cannot be finished')
+    path = []
+    while previous[state] is not None:
+        path.append(state[-1])
+        state = previous[state]
+    return path[::-1]
+
+def compress(moves, blank, columns):
+    """
+    Shortens a list of moves without changing where it leaves the board:
+    a move straight back cancels the one before it, and the empty cell
+    circling one 2x2 square k times in a row becomes k mod 12 moves, or
+    12 - k the other way if that's fewer, since 12 turns of a square put
+    every tile back. Repeats until nothing changes. Both are rare in
+    macro-built paths, so the places they might start are found first and
+    everything between them is copied as it is.
+    Parameters:
+        moves (list): the position of each tile moved, which is also where
+            the empty cell goes.
+        blank (int): where the empty cell started.
+        columns (int): the number of columns.
+    """
+    while True:
+        # cancel back-and-forth pairs, where a move goes where the empty
+        # cell was two moves ago, starting with a dummy that never matches
+        backs = bytes(map(eq, moves, itertools.chain((blank, blank), moves)))
+        path = [blank, blank]
+        push, pop = path.append, path.pop
+        settled = 2 # pushes since the last pop; from two on, path[-2] is moves[i - 2]
+        i, count = 0, len(moves)
+        while i < count:
+            if settled >= 2: # nothing can cancel before the next back
+                stop = backs.find(1, i)
+                if stop < 0:
+                    stop = count
+                path.extend(moves[i:stop])
+                i = stop
+                if i == count:
+                    break
+            position = moves[i]
+            if path[-2] == position:
+                pop()
+                settled = 0
+            else:
+                push(position)
+                settled += 1
+            i += 1
+        del path[0]
+        # then turns around a square: enough of them to shorten start where
+        # the empty cell is back where it was four moves before, four times
+        # running
+        last = len(path) - 1
+        again = bytes(map(eq, path, itertools.islice(path, 4, None)))
+        shortened = [path[0]]
+        append = shortened.append
+        i = 0
+        while i < last:
+            stop = again.find(b'\x01\x01\x01\x01', i)
+            if stop < 0:
+                stop = last
+            if stop > i: # the usual case
+                shortened.extend(path[i + 1:stop + 1])
+                i = stop
+                continue
+            end = i
+            while end + 4 <= last and path[end + 4] == path[end] and \
+                  len(set(path[end:end + 4])) == 4:
+                end += 1
+            turns = end - i + 3 if end > i else 0 # moves in the run
+            if turns >= 7:
+                cycle = path[i:i + 4]
+                turns %= 12
+                if turns > 6: # go round the other way
+                    cycle = [cycle[0]] + cycle[:0:-1]
+                    turns = 12 - turns
+                shortened.extend(cycle[(k + 1) % 4] for k in range(turns))
+                i = end + 3 # where the run ended, which is where this ends too
+            else:
+                append(path[i + 1])
+                i += 1
+        shortened = shortened[1:]
+        if len(shortened) == len(moves):
+            return shortened
+        moves = shortened
+
+def bench(sizes=(5, 10, 20, 50, 100), seed=0):
+    """
+    Solves a random board of each size, printing the solution's length
+    before and after compress() and how long each took.
+    """
+    from solvability import random_cells
+    from board import Board
+    print('size       raw moves  compressed     solve  compress')
+    for side in sizes:
+        cells = random_cells(side, side, random.Random(seed))
+        start = time.perf_counter()
+        reducer = Reducer(cells, side, side)
+        raw = reducer.solve(False)
+        solved = time.perf_counter() - start
+        start = time.perf_counter()
+        moves = compress(raw, cells.index(side*side - 1), side)
+        compressed = time.perf_counter() - start
+        board = Board(side, side, cells)
+        for position in moves:
+            if board.move(position) is None:
+                raise AssertionError('illegal move')
+        if not board.solved:
+            raise AssertionError('not solved')
+        print('{0:>3}x{0:<3} {1:>11} {2:>11} {3:8.3f}s {4:8.3f}s'.format(
+            side, len(raw), len(moves), solved, compressed), flush=True)
+
+if __name__ == '__main__':
+    bench([int(arg) for arg in sys.argv[1:]] or (5, 10, 20, 50, 100))
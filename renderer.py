@@ -0,0 +1,202 @@
+#-------------------------------------------------------------------------------
+# Name:        Sliding Puzzle renderer
+# Purpose:     Draw the whole board as a single image, instead of three
+#              canvas items per tile.
+#-------------------------------------------------------------------------------
+from tkinter import NW
+from PIL import Image, ImageDraw, ImageFont, ImageTk
+
+def label_font(size=14):
+    """
+    Returns a font for the tile numbers: Arial like the canvas labels if
+    it's installed, or PIL's own font otherwise.
+    """
+    try:
+        return ImageFont.truetype('arial.ttf', size)
+    except OSError:
+        try:
+            return ImageFont.load_default(size)
+        except TypeError: # older versions of PIL only have one size
+            return ImageFont.load_default()
+
+class BoardImage(object):
+    """
+    An object of this class composites the board into one PIL image: each
+    cell gets its tile's crop of the current frame, with the tile's number
+    baked in. A whole frame is drawn with a single mesh transform that maps
+    every tile's box in the image to its cell on the board, and the numbers
+    are kept in their own layer that only changes when tiles move. It has no
+    knowledge of Tk, so it also works headless.
+    Attributes:
+        bg (tuple): the RGB color of the empty cell.
+        complete (bool): whether the game is won, so the spare tile is drawn
+            in the empty cell.
+        frame (int): the index of the frame being shown.
+        frames (list): the image's frames, shared with the game.
+        game (Board): the layout being drawn.
+        label_layer (Image): every tile's number, at its current cell.
+        label_mask (Image): where label_layer has numbers.
+        labels (dictionary): an int:Image dictionary, with each tile's number
+            label, made the first time it's drawn.
+        mesh (list): for each cell, its box and the corners of the box in
+            the image it shows, as Image.transform() expects.
+        show_image (bool): whether tiles show the image.
+        show_text (bool): whether tiles show their numbers.
+        surface (Image): the composited board.
+        x_step (int): the width of each tile, in pixels.
+        y_step (int): the height of each tile, in pixels.
+    """
+    def __init__(self, game, frames, x_step, y_step, bg=(255, 255, 255),
+                 show_image=True, show_text=True):
+        self.game = game
+        self.frames = frames
+        self.x_step = x_step
+        self.y_step = y_step
+        self.bg = bg
+        self.show_image = show_image
+        self.show_text = show_text
+        self.complete = False
+        self.frame = 0
+        self.labels = {}
+        self._font = None
+        size = (x_step*game.columns, y_step*game.rows)
+        self.surface = Image.new('RGB', size, bg)
+        self.label_layer = Image.new('RGB', size)
+        self.label_mask = Image.new('L', size)
+        self.mesh = [None]*game.size
+        for position in range(game.size):
+            self.place(position)
+
+    def box(self, position):
+        """
+        Returns the (left, upper, right, lower) box of a cell, which is also
+        where the tile whose ID matches that position comes from in the image.
+        """
+        y, x = divmod(position, self.game.columns)
+        return (x*self.x_step, y*self.y_step, (x+1)*self.x_step, (y+1)*self.y_step)
+
+    def label(self, tile):
+        """
+        Returns the number label for a tile: black on white, like the
+        canvas labels.
+        """
+        if tile not in self.labels:
+            if self._font is None:
+                self._font = label_font()
+            text = ' %d' % (tile+1)
+            left, top, right, bottom = self._font.getbbox(text)
+            image = Image.new('RGB', (min(right, self.x_step), min(bottom, self.y_step)), 'white')
+            ImageDraw.Draw(image).text((0, 0), text, fill='black', font=self._font)
+            self.labels[tile] = image
+        return self.labels[tile]
+
+    def place(self, position):
+        """
+        Updates the mesh and the number layer for the tile now at the given
+        position.
+        """
+        tile = self.game.cells[position]
+        box = self.box(position)
+        left, upper, right, lower = self.box(tile)
+        # the source quad's corners go counter-clockwise from the upper left
+        self.mesh[position] = (box, (left, upper, left, lower, right, lower, right, upper))
+        self.label_mask.paste(0, box)
+        if tile != self.game.blank_id:
+            label = self.label(tile)
+            self.label_layer.paste(label, box[:2])
+            self.label_mask.paste(255, box[:2] + (box[0]+label.size[0], box[1]+label.size[1]))
+
+    def paint(self, position):
+        """
+        Draws one cell onto the surface, after the tile there has changed.
+        """
+        self.place(position)
+        tile = self.game.cells[position]
+        box = self.box(position)
+        empty = tile == self.game.blank_id and not self.complete
+        if empty or not self.show_image:
+            self.surface.paste(self.bg, box)
+        else:
+            self.surface.paste(self.frames[self.frame].crop(self.box(tile)), box[:2])
+        if self.show_text and tile != self.game.blank_id:
+            self.surface.paste(self.label(tile), box[:2])
+
+    def paint_all(self):
+        """
+        Draws every cell onto the surface.
+        """
+        if self.show_image:
+            self.surface.paste(self.frames[self.frame].transform(
+                self.surface.size, Image.MESH, self.mesh, Image.NEAREST))
+            if not self.complete:
+                self.surface.paste(self.bg, self.box(self.game.blank))
+        else:
+            self.surface.paste(self.bg, (0, 0) + self.surface.size)
+        if self.show_text:
+            self.surface.paste(self.label_layer, (0, 0), self.label_mask)
+
+class CompositeRenderer(BoardImage):
+    """
+    An object of this class shows a BoardImage on a Canvas as a single
+    PhotoImage. Animation frames are pushed with one paste() each, or only
+    the cells that changed, and a move only repaints its two cells.
+    Attributes:
+        canvas (Canvas): the board's Canvas.
+        item (int): the canvas image item showing the board.
+        photo (PhotoImage): the board, as Tk sees it.
+    """
+    def __init__(self, canvas, game, frames, x_step, y_step, bgcolor=None,
+                 show_image=True, show_text=True):
+        BoardImage.__init__(self, game, frames, x_step, y_step, self.rgb(canvas, bgcolor),
+                            show_image, show_text)
+        self.canvas = canvas
+        self.photo = ImageTk.PhotoImage('RGB', self.surface.size)
+        self.item = canvas.create_image(0, 0, anchor=NW, image=self.photo)
+        self.redraw()
+
+    @staticmethod
+    def rgb(canvas, color):
+        """
+        Turns a Tk color (or None for the canvas's own) into an RGB tuple.
+        """
+        return tuple(c >> 8 for c in canvas.winfo_rgb(color or canvas.cget('bg')))
+
+    def redraw(self):
+        """
+        Repaints the whole board.
+        """
+        self.paint_all()
+        self.photo.paste(self.surface)
+
+    def show_frame(self, frame, changed=None):
+        """
+        Shows the given animation frame. If the IDs of the tiles that look
+        different from the last frame are given, and there are few of them,
+        only their cells are repainted.
+        """
+        self.frame = frame
+        if changed is None or len(changed) > self.game.size//4:
+            self.redraw()
+        elif self.show_image:
+            changed = set(changed)
+            if not self.complete: # the empty cell doesn't show its tile
+                changed.discard(self.game.blank_id)
+            self.repaint(*[position for position, tile in enumerate(self.game.cells) if tile in changed])
+
+    def set_bg(self, color):
+        """
+        Changes the empty cell's color.
+        """
+        self.bg = self.rgb(self.canvas, color)
+        self.redraw()
+
+    def repaint(self, *positions):
+        """
+        Repaints only the given cells, copying each one into the PhotoImage
+        on its own instead of pasting the whole board.
+        """
+        for position in positions:
+            self.paint(position)
+            box = self.box(position)
+            cell = ImageTk.PhotoImage(self.surface.crop(box))
+            self.canvas.tk.call(str(self.photo), 'copy', str(cell), '-to', box[0], box[1])
@@ -0,0 +1,105 @@
+#-------------------------------------------------------------------------------
+# Name:        Sliding Puzzle animation scheduler
+# Purpose:     Decide which animation frame to show and when, keeping to the
+#              frames' own timing even when drawing runs late.
+#-------------------------------------------------------------------------------
+import time
+
+# browsers show GIF frames with a delay this short or shorter at DEFAULT_DURATION
+MIN_DURATION = 10
+DEFAULT_DURATION = 100
+
+def frame_duration(frame):
+    """
+    Returns how long a frame should be shown, in milliseconds, from its own
+    metadata, the way browsers treat it.
+    """
+    duration = frame.info.get('duration') or 0
+    return duration if duration > MIN_DURATION else DEFAULT_DURATION
+
+class AnimationClock(object):
+    """
+    An object of this class schedules an animation against a monotonic clock.
+    Every frame has a deadline, and each deadline follows on from the last
+    one rather than from whenever the frame was actually drawn, so time
+    spent drawing doesn't add up into drift. When the game falls far enough
+    behind that a frame's whole turn has already passed, that frame is
+    skipped instead.
+    Attributes:
+        deadline (float): when the frame being shown should be replaced.
+        dropped (int): how many frames have been skipped.
+        frames (list): the animation's frames. It can grow while it plays.
+        index (int): the frame being shown.
+        interval (int): milliseconds per frame for every frame, or None to
+            use each frame's own duration.
+        late (dictionary): an int:int dictionary, counting how many frames
+            were drawn up to that many milliseconds late (0, 1, 2, 4, 8...).
+        shown (int): how many frames have been drawn.
+    """
+    def __init__(self, frames, interval=None, clock=time.monotonic):
+        self.frames = frames
+        self.interval = interval
+        self.clock = clock
+        self.index = 0
+        self.deadline = 0.0
+        self.shown = 0
+        self.dropped = 0
+        self.late = {}
+        self._durations = [] # each frame's duration, in seconds, once looked up
+
+    def duration(self, index):
+        """
+        Returns how long the given frame should be shown, in seconds.
+        """
+        if self.interval:
+            return self.interval/1000
+        while len(self._durations) <= index: # the frames list may have grown
+            self._durations.append(frame_duration(self.frames[len(self._durations)])/1000)
+        return self._durations[index]
+
+    def start(self):
+        """
+        Starts the clock with the first frame on screen.
+        Returns:
+            int: milliseconds until tick() should be called.
+        """
+        self.index = 0
+        self.deadline = self.clock() + self.duration(0)
+        return round(self.duration(0)*1000)
+
+    def tick(self):
+        """
+        Moves on to the next frame that's due, skipping any whose turn has
+        already passed.
+        Returns:
+            tuple: the index of the frame to show, and milliseconds until
+                tick() should be called again.
+        """
+        now = self.clock()
+        count = len(self.frames)
+        lateness = max(0, round((now - self.deadline)*1000))
+        bucket = 0 if lateness == 0 else 1 << (lateness-1).bit_length()
+        self.late[bucket] = self.late.get(bucket, 0) + 1
+        index = (self.index + 1) % count
+        due = self.deadline # when this frame should have gone up
+        skipped = 0
+        while now >= due + self.duration(index):
+            if skipped == count: # a whole loop behind, e.g. after a freeze,
+                due = now # so just start again from here
+                break
+            due += self.duration(index)
+            index = (index + 1) % count
+            skipped += 1
+        self.dropped += skipped
+        self.shown += 1
+        self.index = index
+        self.deadline = due + self.duration(index)
+        return index, max(1, round((self.deadline - now)*1000))
+
+    def stats(self):
+        """
+        Returns a dictionary of frames shown and dropped, and the lateness
+        histogram.
+        """
+        return {'shown': self.shown, 'dropped': self.dropped,
+                'late_ms': dict(sorted(self.late.items()))}
@@ -0,0 +1,375 @@
+#-------------------------------------------------------------------------------
+# Name:        Sliding Puzzle scrambles
+# Purpose:     Stream solvable puzzles of a chosen difficulty, reproducibly and
+#              across a pool of processes, as text, compact binary or NumPy.
+#-------------------------------------------------------------------------------
+import os
+import sys
+import time
+import struct
+import random
+import argparse
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from solver import ManhattanHeuristic, neighbor_table, solve
+from solvability import random_cells
+
+try:
+    import numpy
+except ImportError: # only needed for NumPy output
+    numpy = None
+
+MAGIC = b'SPSC'
+VERSION = 1
+# magic, version, rows, columns, bytes per cell; then each puzzle is its
+# cells followed by its difficulty as a uint16, all little-endian
+HEADER = struct.Struct('<4sHHHB')
+MEASURES = ('manhattan', 'optimal')
+# how many tries a puzzle gets to land in the band before it's given up on
+MAX_ATTEMPTS = 10000
+CHUNK_SIZE = 1000
+
+def walk_table(rows, columns):
+    """
+    Returns, for each position of the empty cell, a dictionary from where
+    it just was to the positions it can go next without going straight
+    back. Where it starts, it can go anywhere.
+    """
+    table = []
+    for blank, neighbors in enumerate(neighbor_table(rows, columns)):
+        options = {previous: tuple(position for position in neighbors if position != previous)
+                   for previous in neighbors}
+        options[blank] = tuple(neighbors)
+        table.append(options)
+    return table
+
+def random_walk(rows, columns, length, rng, table=None):
+    """
+    Returns the layout reached by moving the empty cell a number of times
+    from the solved board, never straight back to where it just was.
+    Parameters:
+        rows (int): the number of rows.
+        columns (int): the number of columns.
+        length (int): how many moves to make.
+        rng (Random): the random number generator to use.
+        table (list): walk_table(rows, columns), if it's at hand.
+    """
+    table = table or walk_table(rows, columns)
+    cells = list(range(rows*columns))
+    blank_id = blank = previous = rows*columns - 1
+    random = rng.random
+    for i in range(length):
+        options = table[blank][previous]
+        position = options[int(random()*len(options))]
+        cells[blank] = cells[position]
+        previous, blank = blank, position
+    cells[blank] = blank_id
+    return cells
+
+def mixing_length(rows, columns):
+    """
+    Returns a walk length after which the layout is close enough to
+    uniformly random: a few times the cells times the longer side.
+    """
+    return 4*rows*columns*max(rows, columns)
+
+def make_measure(rows, columns, measure='manhattan', pdb_folder=None):
+    """
+    Returns a function that takes a layout and returns its difficulty:
+    'manhattan' is Manhattan distance plus linear conflicts, which is quick
+    on any board, and 'optimal' is the fewest moves that solve it, found
+    with IDA*, and only practical up to 4x4 or so. Both are never more than
+    the length of a walk that made the layout.
+    Parameters:
+        rows (int): the number of rows.
+        columns (int): the number of columns.
+        measure (str): 'manhattan' or 'optimal'.
+        pdb_folder (str): a folder of pattern databases for 'optimal' to
+            use when they exist for the board's size.
+    """
+    if measure == 'manhattan':
+        return ManhattanHeuristic(rows, columns).estimate
+    if measure != 'optimal':
+        raise ValueError('unknown measure: {}'.format(measure))
+    heuristic = None
+    if pdb_folder:
+        from patterndb import load_heuristic
+        try:
+            heuristic = load_heuristic(rows, columns, pdb_folder)
+        except (OSError, ValueError): # not built, so use Manhattan distance
+            pass
+    return lambda cells: len(solve(cells, rows, columns, heuristic).moves)
+
+class Scrambler(object):
+    """
+    An object of this class makes puzzles of one size and difficulty. With
+    a walk length, each puzzle is a random walk of exactly that length, and
+    its difficulty is the length. With a band, each puzzle's measured
+    difficulty is between the band's ends: it's made with a random walk,
+    whose length goes up when the puzzles come out too easy and down when
+    they come out too hard, so it settles wherever the band is most likely.
+    A walk can't make a puzzle harder than its length, so the walk starts
+    at the top of the band. Past mixing_length() a walk is as good as a
+    uniformly random layout, so that's used instead, and only a band
+    harder than most random layouts needs many tries.
+    Attributes:
+        band (tuple): the lowest and highest difficulty allowed, or None.
+        columns (int): the number of columns.
+        length (int): the current walk length.
+        measure (function): takes a layout and returns its difficulty.
+        rows (int): the number of rows.
+    """
+    def __init__(self, rows, columns, walk=None, band=None, measure='manhattan', pdb_folder=None):
+        """
+        Parameters:
+            rows (int): the number of rows.
+            columns (int): the number of columns.
+            walk (int): the walk length, or None to use a band.
+            band (tuple): the lowest and highest difficulty allowed, or None
+                for uniformly random puzzles if there's no walk length either.
+            measure (str): how a band measures difficulty, as make_measure()
+                takes it.
+            pdb_folder (str): pattern databases for the 'optimal' measure.
+        """
+        if rows < 2 or columns < 2:
+            raise ValueError('boards need at least two rows and two columns')
+        if band and band[0] > band[1]:
+            raise ValueError('the band {}-{} is empty'.format(*band))
+        self.rows = rows
+        self.columns = columns
+        self.band = band
+        self.length = walk if walk is not None else (band[1] if band else None)
+        self.fixed = walk is not None
+        self.longest = mixing_length(rows, columns)
+        self.measure = make_measure(rows, columns, measure, pdb_folder) if band else None
+        self._table = walk_table(rows, columns)
+
+    def scramble(self, rng):
+        """
+        Returns a (cells, difficulty) tuple for a new puzzle. Uniformly random
+        puzzles have a difficulty of 0, since none was asked for.
+        """
+        rows, columns = self.rows, self.columns
+        if self.length is None:
+            return random_cells(rows, columns, rng), 0
+        if self.fixed:
+            return random_walk(rows, columns, self.length, rng, self._table), self.length
+        low, high = self.band
+        for attempt in range(MAX_ATTEMPTS):
+            if self.length < self.longest:
+                cells = random_walk(rows, columns, self.length, rng, self._table)
+            else:
+                cells = random_cells(rows, columns, rng)
+            difficulty = self.measure(cells)
+            if difficulty < low:
+                self.length = min(self.longest, self.length + max(1, self.length//8))
+            elif difficulty > high:
+                self.length = max(low, self.length - max(1, self.length//8))
+            else:
+                return cells, difficulty
+        raise ValueError('no {}x{} puzzle in the band {}-{} after {} tries'.format(
+            rows, columns, low, high, MAX_ATTEMPTS))
+
+def cell_bytes(rows, columns):
+    """
+    Returns how many bytes each cell takes in the binary format.
+    """
+    return 1 if rows*columns <= 0x100 else 2
+
+def record_format(rows, columns):
+    """
+    Returns the Struct for one puzzle in the binary format.
+    """
+    return struct.Struct('<{}{}H'.format(rows*columns, 'B' if cell_bytes(rows, columns) == 1 else 'H'))
+
+def pack(puzzles, rows, columns):
+    """
+    Returns the binary records for a list of (cells, difficulty) tuples.
+    """
+    record = record_format(rows, columns)
+    return b''.join(record.pack(*cells, min(difficulty, 0xFFFF)) for cells, difficulty in puzzles)
+
+def unpack(data, rows, columns):
+    """
+    Yields a (cells, difficulty) tuple for each binary record in data.
+    """
+    for values in record_format(rows, columns).iter_unpack(data):
+        yield list(values[:-1]), values[-1]
+
+def generate_chunk(rows, columns, count, seed, walk=None, band=None, measure='manhattan',
+                   pdb_folder=None):
+    """
+    Makes count puzzles with Random(seed), in a worker, and returns their
+    binary records.
+    """
+    scrambler = Scrambler(rows, columns, walk, band, measure, pdb_folder)
+    rng = random.Random(seed)
+    return pack([scrambler.scramble(rng) for i in range(count)], rows, columns)
+
+def generate(rows, columns, count, seed=None, walk=None, band=None, measure='manhattan',
+             workers=1, chunk_size=CHUNK_SIZE, pdb_folder=None):
+    """
+    Yields the binary records of count puzzles, a chunk at a time. Each
+    chunk has its own seed, made from the main seed and the chunk's number,
+    and the chunks come out in order, so the same seed always gives the same
+    puzzles, however many workers there are. Only a couple of chunks are
+    queued per worker, so any count can be streamed.
+    Parameters:
+        rows (int): the number of rows.
+        columns (int): the number of columns.
+        count (int): how many puzzles to make.
+        seed (int): the main seed.
+        walk, band, measure: the difficulty, as Scrambler takes it.
+        workers (int): how many processes to use, or 1 to stay in this one.
+        chunk_size (int): how many puzzles each chunk has.
+        pdb_folder (str): pattern databases for the 'optimal' measure.
+    """
+    seed = seed or 0
+    chunks = [(index, min(chunk_size, count - start))
+              for index, start in enumerate(range(0, count, chunk_size))]
+    settings = (walk, band, measure, pdb_folder)
+    if workers == 1:
+        for index, size in chunks:
+            yield generate_chunk(rows, columns, size, seed << 32 | index, *settings)
+        return
+    with ProcessPoolExecutor(workers) as pool:
+        limit = 2*workers # chunks in flight at once
+        pending = {}
+        done = {}
+        following = 0 # the next chunk to yield
+        for index, size in chunks:
+            pending[pool.submit(generate_chunk, rows, columns, size, seed << 32 | index,
+                                *settings)] = index
+            while len(pending) >= limit:
+                finished, unfinished = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    done[pending.pop(future)] = future.result()
+                while following in done:
+                    yield done.pop(following)
+                    following += 1
+        for future in list(pending):
+            done[pending.pop(future)] = future.result()
+        while following in done:
+            yield done.pop(following)
+            following += 1
+
+def scrambles(rows, columns, count, seed=None, walk=None, band=None, measure='manhattan',
+              workers=1, chunk_size=CHUNK_SIZE, pdb_folder=None):
+    """
+    Yields a (cells, difficulty) tuple for each of count puzzles, taking
+    the same arguments as generate().
+    """
+    for chunk in generate(rows, columns, count, seed, walk, band, measure,
+                          workers, chunk_size, pdb_folder):
+        yield from unpack(chunk, rows, columns)
+
+def write_header(file, rows, columns):
+    file.write(HEADER.pack(MAGIC, VERSION, rows, columns, cell_bytes(rows, columns)))
+
+def read(file):
+    """
+    Reads a binary file of puzzles.
+    Parameter:
+        file (file): open in binary mode.
+    Returns:
+        tuple: the rows, the columns, and an iterator of (cells, difficulty)
+            tuples.
+    """
+    try:
+        magic, version, rows, columns, width = HEADER.unpack(file.read(HEADER.size))
+    except struct.error:
+        raise ValueError('too short to be a scramble file')
+    if magic != MAGIC or version != VERSION:
+        raise ValueError('not a version {} scramble file'.format(VERSION))
+    record = record_format(rows, columns).size
+    def records():
+        while True:
+            data = file.read(record*CHUNK_SIZE)
+            if not data:
+                return
+            yield from unpack(data, rows, columns)
+    return rows, columns, records()
+
+def load_numpy(path):
+    """
+    Maps a binary file of puzzles as NumPy arrays without copying it.
+    Returns:
+        tuple: an array of cells with one row per puzzle, and an array of
+            their difficulties.
+    """
+    if numpy is None:
+        raise ImportError('NumPy is needed to load puzzles as arrays')
+    with open(path, 'rb') as file:
+        magic, version, rows, columns, width = HEADER.unpack(file.read(HEADER.size))
+    if magic != MAGIC or version != VERSION:
+        raise ValueError('{} is not a version {} scramble file'.format(path, VERSION))
+    records = numpy.memmap(path, mode='r', offset=HEADER.size,
+                           dtype=[('cells', '<u{}'.format(width), (rows*columns,)),
+                                  ('difficulty', '<u2')])
+    return records['cells'], records['difficulty']
+
+def text_line(cells):
+    """
+    Returns a layout the way batch.py reads it: tiles numbered from 1 as
+    the game shows them, with 0 for the empty cell.
+    """
+    blank_id = len(cells) - 1
+    return ' '.join(str(0 if tile == blank_id else tile + 1) for tile in cells)
+
+def main():
+    parser = argparse.ArgumentParser(description='Make solvable puzzles in bulk, at a chosen '
+                                     'difficulty. The same seed always makes the same puzzles.')
+    parser.add_argument('count', type=int, help='how many puzzles to make')
+    parser.add_argument('--rows', type=int, default=4)
+    parser.add_argument('--columns', type=int, default=4)
+    difficulty = parser.add_mutually_exclusive_group()
+    difficulty.add_argument('--walk', type=int,
+                            help='random-walk length, without moving straight back')
+    difficulty.add_argument('--band', type=int, nargs=2, metavar=('LOW', 'HIGH'),
+                            help='the range of difficulty allowed, by --measure')
+    parser.add_argument('--measure', choices=MEASURES, default='manhattan',
+                        help='how --band measures difficulty (optimal is only practical '
+                        'up to 4x4)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=1,
+                        help='processes to use (0 for one per CPU)')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='puzzles per work unit')
+    parser.add_argument('--pdb', help='folder of pattern databases for --measure optimal')
+    parser.add_argument('--format', choices=('text', 'binary', 'numpy'), default='text',
+                        help="text lines for batch.py, this module's binary format, or a "
+                        "NumPy .npz with 'cells' and 'difficulty' arrays")
+    parser.add_argument('--output', help='file to write (default: stdout, for text)')
+    args = parser.parse_args()
+    if args.format != 'text' and not args.output:
+        parser.error('--format {} needs --output'.format(args.format))
+    if args.format == 'numpy' and numpy is None:
+        parser.error('--format numpy needs NumPy installed')
+
+    rows, columns = args.rows, args.columns
+    chunks = generate(rows, columns, args.count, args.seed, args.walk,
+                      tuple(args.band) if args.band else None, args.measure,
+                      args.workers or os.cpu_count() or 1, args.chunk_size, args.pdb)
+    started = time.perf_counter()
+    if args.format == 'text':
+        output = open(args.output, 'w') if args.output else sys.stdout
+        for chunk in chunks:
+            output.writelines('{}  # {}\n'.format(text_line(cells), difficulty)
+                              for cells, difficulty in unpack(chunk, rows, columns))
+        if args.output:
+            output.close()
+    elif args.format == 'binary':
+        with open(args.output, 'wb') as output:
+            write_header(output, rows, columns)
+            for chunk in chunks:
+                output.write(chunk)
+    else:
+        data = b''.join(chunks)
+        dtype = [('cells', '<u{}'.format(cell_bytes(rows, columns)), (rows*columns,)),
+                 ('difficulty', '<u2')]
+        records = numpy.frombuffer(data, dtype=dtype)
+        numpy.savez(args.output, cells=records['cells'], difficulty=records['difficulty'])
+    elapsed = time.perf_counter() - started
+    print('{} {}x{} puzzles in {:.2f}s: {:.0f} puzzles/s'.format(
+        args.count, rows, columns, elapsed, args.count/elapsed if elapsed else 0), file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
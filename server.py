@@ -0,0 +1,536 @@
+#-------------------------------------------------------------------------------
+# Name:        Sliding Puzzle server
+# Purpose:     Host many games at once for remote players over a line-delimited
+#              JSON protocol, and load-test it with many simulated players.
+#-------------------------------------------------------------------------------
+import os
+import io
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import base64
+from collections import OrderedDict
+from PIL import Image
+from board import Board
+from fetch import ImageCache
+from loader import scaled_size, REDUCING_GAP
+from scramble import walk_table
+from movelog import MoveLog, session_dict, starting_cells
+from tileframes import tile_boxes
+
+PORT = 8765
+# sessions nobody has sent a message about for this many seconds are dropped
+IDLE_TIMEOUT = 15*60
+# how often to look for idle sessions, in seconds
+EVICT_INTERVAL = 30
+# how many sliced images to keep for new sessions to share
+SLICE_CACHE_SIZE = 32
+# boards bigger than this on either side are refused
+MAX_SIDE = 64
+# the heights, in pixels, sliced images can be asked for
+MIN_HEIGHT = 16
+MAX_HEIGHT = 4096
+# the most moves one message can carry
+MAX_BATCH = 1024
+# the longest line a client can send, in bytes
+MAX_LINE = 1024*1024
+
+class Session(object):
+    """
+    An object of this class is one player's game. It's kept small, since a
+    server holds thousands: the Board and MoveLog hold the layout and the
+    moves at two bits each, and the sliced image is shared through the
+    SliceCache.
+    Attributes:
+        board (Board): the game's rules and layout.
+        image (str): the image the game was started with, or None.
+        key (tuple): the session's SliceCache key, or None.
+        last_active (float): the event loop time of its last message.
+        log (MoveLog): every move so far.
+        seed (int): the seed its starting layout was shuffled with.
+    """
+    __slots__ = ('board', 'log', 'seed', 'image', 'key', 'last_active')
+    def __init__(self, rows, columns, seed, image, key, now):
+        cells = starting_cells(rows, columns, seed)
+        self.board = Board(rows, columns, cells)
+        self.log = MoveLog(rows, columns, cells)
+        self.seed = seed
+        self.image = image
+        self.key = key
+        self.last_active = now
+
+class SliceCache(object):
+    """
+    An object of this class slices each (image, rows, columns, max height)
+    once, in a worker thread, and shares the tiles with every session that
+    asks for them. Each tile is kept as PNG data ready to send. Sessions
+    asking for an image that's still being sliced wait for the same slicing
+    instead of starting another. The least recently used images are dropped
+    once there are more than the given number, though sessions that already
+    have their tiles keep them.
+    Attributes:
+        hits (int): how many requests found their tiles already sliced.
+        misses (int): how many requests had to slice an image.
+        size (int): the most images to keep.
+    """
+    def __init__(self, open_image, size=SLICE_CACHE_SIZE):
+        """
+        Parameters:
+            open_image (function): takes an image name and returns an open
+                Image, in a worker thread.
+            size (int): the most images to keep.
+        """
+        self.open_image = open_image
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._slices = OrderedDict() # key: Future of the slice dictionary
+
+    async def get(self, key):
+        """
+        Returns a dictionary of the image's size and its tiles, in ID order
+        as base64 PNG data, for a key of (image, rows, columns, max height).
+        """
+        future = self._slices.get(key)
+        if future is not None:
+            self.hits += 1
+            self._slices.move_to_end(key)
+        else:
+            self.misses += 1
+            loop = asyncio.get_running_loop()
+            future = self._slices[key] = loop.run_in_executor(None, self._slice, key)
+            while len(self._slices) > self.size:
+                self._slices.popitem(last=False)
+        try:
+            return await asyncio.shield(future)
+        except Exception:
+            if self._slices.get(key) is future: # try again next time
+                del self._slices[key]
+            raise
+
+    def _slice(self, key):
+        """
+        Decodes, resizes and slices an image, in a worker thread.
+        """
+        name, rows, columns, max_height = key
+        with self.open_image(name) as image:
+            size = scaled_size(image.size, max_height)
+            if size != image.size:
+                image.draft('RGB', (int(size[0]*REDUCING_GAP), int(size[1]*REDUCING_GAP)))
+            frame = image.convert('RGB')
+            if frame.size != size:
+                frame = frame.resize(size, resample=Image.LANCZOS, reducing_gap=REDUCING_GAP)
+        tiles = []
+        for box in tile_boxes(size[0], size[1], rows, columns):
+            data = io.BytesIO()
+            frame.crop(box).save(data, 'PNG')
+            tiles.append(base64.b64encode(data.getvalue()).decode('ascii'))
+        return {'width': size[0], 'height': size[1], 'tiles': tiles}
+
+class GameServer(object):
+    """
+    An object of this class hosts any number of sessions for any number of
+    connections. Each line a client sends is a JSON object with an 'op', an
+    optional 'id' that's echoed back, and usually a 'session'. Each gets one
+    line back, in order, with either the result or an 'error'. Sessions
+    outlive connections, so a player can reconnect and carry on, until
+    they've been idle for idle_timeout seconds.
+    Operations:
+        new: starts a game. Optional 'rows' and 'columns' (default 4), 'seed',
+            'image' (a file in the image folder, or a URL if those are
+            allowed) and 'max_height'. Returns the 'session', 'seed' and 'cells'.
+        move: plays 'moves', a list of positions as Board.move() takes them,
+            in order, stopping at the first illegal one. Returns how many
+            'moved', the 'blank', whether it's 'solved', and the position
+            it 'rejected' if one was illegal.
+        state: returns the 'cells', the number of 'moves' and 'solved'.
+        tiles: returns the image's 'width', 'height' and 'tiles'.
+        save: returns the game the way movelog.save_session() writes it.
+        close: ends the game.
+        stats: returns how many sessions and connections there are, and
+            how the slice cache is doing.
+    Attributes:
+        connections (int): how many clients are connected.
+        idle_timeout (float): seconds a session can go without a message.
+        sessions (dict): every Session, by ID.
+        slices (SliceCache): the shared sliced images.
+    """
+    def __init__(self, image_folder=None, allow_urls=False, idle_timeout=IDLE_TIMEOUT,
+                 max_height=600):
+        """
+        Parameters:
+            image_folder (str): the only folder images can be read from, or
+                None for no local images.
+            allow_urls (bool): whether images can be downloaded from URLs.
+            idle_timeout (float): seconds before an idle session is dropped.
+            max_height (int): the default max height for sliced images.
+        """
+        self.image_folder = image_folder and os.path.realpath(image_folder)
+        self.allow_urls = allow_urls
+        self.idle_timeout = idle_timeout
+        self.max_height = max_height
+        self.sessions = {}
+        self.connections = 0
+        self.evicted = 0
+        self.slices = SliceCache(self.open_image)
+        self._downloads = ImageCache() if allow_urls else None
+        self._next_id = 0
+        self._operations = {'new': self.new, 'move': self.move, 'state': self.state,
+                            'tiles': self.tiles, 'save': self.save, 'close': self.close,
+                            'stats': self.stats}
+
+    def check_image(self, name):
+        """
+        Raises ValueError unless this server will open the named image.
+        """
+        if name.startswith(('http://', 'https://')):
+            if not self.allow_urls:
+                raise ValueError('this server does not download images')
+            return
+        if self.image_folder is None:
+            raise ValueError('this server has no images')
+        path = os.path.realpath(os.path.join(self.image_folder, name))
+        if os.path.commonpath((path, self.image_folder)) != self.image_folder:
+            raise ValueError('images must be in the image folder')
+        if not os.path.isfile(path):
+            raise ValueError('no such image: {}'.format(name))
+
+    def open_image(self, name):
+        """
+        Opens an image that check_image() allowed, in a worker thread.
+        """
+        if name.startswith(('http://', 'https://')):
+            return Image.open(self._downloads.fetch(name))
+        return Image.open(os.path.join(self.image_folder, name))
+
+    def new(self, message, now):
+        rows = message.get('rows', 4)
+        columns = message.get('columns', 4)
+        if not (isinstance(rows, int) and isinstance(columns, int) and
+                2 <= rows <= MAX_SIDE and 2 <= columns <= MAX_SIDE):
+            raise ValueError('rows and columns must be from 2 to {}'.format(MAX_SIDE))
+        seed = message.get('seed')
+        if seed is None:
+            seed = random.randrange(1 << 32)
+        elif not isinstance(seed, int):
+            raise ValueError('the seed must be an int')
+        max_height = message.get('max_height', self.max_height)
+        if not (isinstance(max_height, int) and MIN_HEIGHT <= max_height <= MAX_HEIGHT):
+            raise ValueError('max_height must be from {} to {}'.format(MIN_HEIGHT, MAX_HEIGHT))
+        image = message.get('image')
+        key = None
+        if image is not None:
+            self.check_image(image)
+            key = (image, rows, columns, max_height)
+        self._next_id += 1
+        session_id = '{:x}'.format(self._next_id)
+        session = self.sessions[session_id] = Session(rows, columns, seed, image, key, now)
+        return {'session': session_id, 'seed': seed, 'cells': session.board.cells.tolist()}
+
+    def session(self, message, now):
+        """
+        Returns the message's Session, noting that it's still in use.
+        """
+        try:
+            session = self.sessions[message['session']]
+        except (KeyError, TypeError):
+            raise ValueError('no such session')
+        session.last_active = now
+        return session
+
+    def move(self, message, now):
+        session = self.session(message, now)
+        moves = message.get('moves', ())
+        if not isinstance(moves, list) or len(moves) > MAX_BATCH:
+            raise ValueError('moves must be a list of at most {} positions'.format(MAX_BATCH))
+        board, log = session.board, session.log
+        moved = 0
+        for position in moves:
+            if not isinstance(position, int) or board.move(position) is None:
+                return {'moved': moved, 'blank': board.blank, 'solved': board.solved,
+                        'rejected': position}
+            log.append(position)
+            moved += 1
+        return {'moved': moved, 'blank': board.blank, 'solved': board.solved}
+
+    def state(self, message, now):
+        session = self.session(message, now)
+        return {'cells': session.board.cells.tolist(), 'moves': session.log.count,
+                'solved': session.board.solved}
+
+    async def tiles(self, message, now):
+        session = self.session(message, now)
+        if session.key is None:
+            raise ValueError('this session has no image')
+        return await self.slices.get(session.key)
+
+    def save(self, message, now):
+        session = self.session(message, now)
+        return session_dict(session.image, session.log, session.seed)
+
+    def close(self, message, now):
+        self.session(message, now)
+        del self.sessions[message['session']]
+        return {}
+
+    def stats(self, message, now):
+        return {'sessions': len(self.sessions), 'connections': self.connections,
+                'evicted': self.evicted, 'slices': len(self.slices._slices),
+                'slice_hits': self.slices.hits, 'slice_misses': self.slices.misses}
+
+    async def handle(self, line):
+        """
+        Returns the reply to one line from a client.
+        """
+        reply = {}
+        try:
+            message = json.loads(line)
+            if not isinstance(message, dict):
+                raise ValueError('messages must be JSON objects')
+            if 'id' in message:
+                reply['id'] = message['id']
+            operation = self._operations.get(message.get('op'))
+            if operation is None:
+                raise ValueError('unknown op: {}'.format(message.get('op')))
+            result = operation(message, asyncio.get_running_loop().time())
+            if asyncio.iscoroutine(result):
+                result = await result
+            reply.update(result)
+        except Exception as e: # tell the client, and carry on
+            reply['error'] = str(e) or type(e).__name__
+        return reply
+
+    async def serve_client(self, reader, writer):
+        """
+        Answers one connection's lines in order until it closes.
+        """
+        self.connections += 1
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (ValueError, asyncio.LimitOverrunError): # too long to be a message
+                    break
+                except ConnectionError:
+                    break
+                if not line:
+                    break
+                writer.write(json.dumps(await self.handle(line)).encode() + b'\n')
+                if writer.transport.get_write_buffer_size() > 64*1024:
+                    await writer.drain() # don't buffer without limit for a slow reader
+        except asyncio.CancelledError: # the server is shutting down, so this is the end anyway
+            pass
+        finally:
+            self.connections -= 1
+            writer.close()
+
+    async def evict(self):
+        """
+        Drops idle sessions every EVICT_INTERVAL seconds, forever.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(min(EVICT_INTERVAL, self.idle_timeout))
+            oldest = loop.time() - self.idle_timeout
+            idle = [session_id for session_id, session in self.sessions.items()
+                    if session.last_active < oldest]
+            for session_id in idle:
+                del self.sessions[session_id]
+            self.evicted += len(idle)
+
+    async def run(self, host='127.0.0.1', port=PORT, ready=None):
+        """
+        Serves until cancelled.
+        Parameters:
+            host (str): the address to listen on.
+            port (int): the port to listen on, or 0 for any free one.
+            ready (function): called with the port once it's listening.
+        """
+        server = await asyncio.start_server(self.serve_client, host, port, limit=MAX_LINE)
+        evictor = asyncio.create_task(self.evict())
+        if ready:
+            ready(server.sockets[0].getsockname()[1])
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            evictor.cancel()
+
+class Client(object):
+    """
+    An object of this class is one connection to a GameServer, shared by
+    any number of coroutines: each request gets an ID, and the replies,
+    which come back in order, are handed to whichever coroutine sent it.
+    """
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self._waiting = {}
+        self._next_id = 0
+        self._listener = asyncio.create_task(self._listen())
+
+    @classmethod
+    async def connect(cls, host='127.0.0.1', port=PORT):
+        reader, writer = await asyncio.open_connection(host, port, limit=MAX_LINE)
+        return cls(reader, writer)
+
+    async def request(self, op, **message):
+        """
+        Sends a message and returns the reply, raising ValueError if it's
+        an error.
+        """
+        self._next_id += 1
+        message.update(op=op, id=self._next_id)
+        reply = self._waiting[self._next_id] = asyncio.get_running_loop().create_future()
+        self.writer.write(json.dumps(message).encode() + b'\n')
+        reply = await reply
+        if 'error' in reply:
+            raise ValueError(reply['error'])
+        return reply
+
+    async def _listen(self):
+        while True:
+            line = await self.reader.readline()
+            if not line:
+                for future in self._waiting.values():
+                    future.set_exception(ConnectionError('the server closed the connection'))
+                return
+            reply = json.loads(line)
+            future = self._waiting.pop(reply.get('id'), None)
+            if future: # replies to lines that weren't requests are dropped
+                future.set_result(reply)
+
+    async def close(self):
+        self._listener.cancel()
+        self.writer.close()
+
+async def play(client, rows, columns, options, batch, think, stop, latencies, rng, started):
+    """
+    Plays random legal moves in one session until stop is set, never
+    straight back, adding each request's round trip to latencies. Returns
+    how many moves it made.
+    Parameters:
+        client (Client): the connection to use.
+        rows (int): the number of rows.
+        columns (int): the number of columns.
+        options (list): walk_table(rows, columns).
+        batch (int): how many moves to send in each message.
+        think (float): the average pause between messages in seconds, or
+            0 to send the next as soon as the last is answered.
+        stop (Event): set when it's time to stop.
+        latencies (list): where to put the round trips, in seconds.
+        rng (Random): the random number generator to use.
+        started (list): where to add the session's ID once it exists.
+    """
+    reply = await client.request('new', rows=rows, columns=columns, seed=rng.randrange(1 << 32))
+    session = reply['session']
+    started.append(session)
+    blank = reply['cells'].index(rows*columns - 1)
+    moves = 0
+    while not stop.is_set():
+        path = []
+        previous = blank
+        for i in range(batch):
+            position = rng.choice(options[blank][previous])
+            path.append(position)
+            previous, blank = blank, position
+        sent = time.perf_counter()
+        reply = await client.request('move', session=session, moves=path)
+        latencies.append(time.perf_counter() - sent)
+        moves += reply['moved']
+        if think:
+            await asyncio.sleep(rng.expovariate(1/think))
+    return moves
+
+async def load_test(host='127.0.0.1', port=PORT, sessions=10000, connections=100, seconds=10.0,
+                    rows=4, columns=4, batch=4, think=0.0, seed=0):
+    """
+    Plays many sessions at once, spread over a number of connections, and
+    returns a dictionary of the moves per second and the round-trip
+    latency of each move message, in milliseconds. Without think time,
+    every session always has a message waiting, so the latency is mostly
+    time spent queued behind the other sessions' messages.
+    """
+    rng = random.Random(seed)
+    clients = [await Client.connect(host, port) for i in range(connections)]
+    stop = asyncio.Event()
+    latencies = []
+    ready = []
+    options = walk_table(rows, columns)
+    players = [asyncio.create_task(play(clients[i % connections], rows, columns, options, batch,
+                                        think, stop, latencies, random.Random(rng.random()),
+                                        ready))
+               for i in range(sessions)]
+    while len(ready) < sessions: # let every session start first
+        await asyncio.sleep(0.1)
+    await asyncio.sleep(max(think, 0.1)) # and settle into its pace
+    started = time.perf_counter()
+    latencies.clear()
+    await asyncio.sleep(seconds)
+    elapsed = time.perf_counter() - started
+    samples = sorted(latencies)
+    stop.set()
+    moves = sum(await asyncio.gather(*players))
+    for client in clients:
+        await client.close()
+    total = len(samples)*batch # moves made while timing
+    return {'sessions': sessions, 'connections': connections, 'batch': batch, 'think': think,
+            'seconds': elapsed, 'messages': len(samples), 'moves': moves,
+            'moves_per_second': total/elapsed,
+            'p50_ms': samples[len(samples)//2]*1000 if samples else None,
+            'p99_ms': samples[min(len(samples)-1, len(samples)*99//100)]*1000 if samples else None,
+            'max_ms': samples[-1]*1000 if samples else None}
+
+def main():
+    parser = argparse.ArgumentParser(description='Host sliding puzzles for remote players, or '
+                                     'load-test a server.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    server = commands.add_parser('serve', help='run a server')
+    server.add_argument('--host', default='127.0.0.1')
+    server.add_argument('--port', type=int, default=PORT)
+    server.add_argument('--images', help='folder that clients can choose images from')
+    server.add_argument('--allow-urls', action='store_true', help='let clients use image URLs')
+    server.add_argument('--idle-timeout', type=float, default=IDLE_TIMEOUT,
+                        help='seconds before an idle session is dropped')
+    tester = commands.add_parser('load', help='play many random sessions against a server')
+    tester.add_argument('--host', default='127.0.0.1')
+    tester.add_argument('--port', type=int, help='a running server (default: start one in this process)')
+    tester.add_argument('--sessions', type=int, default=10000)
+    tester.add_argument('--connections', type=int, default=100)
+    tester.add_argument('--seconds', type=float, default=10.0)
+    tester.add_argument('--rows', type=int, default=4)
+    tester.add_argument('--columns', type=int, default=4)
+    tester.add_argument('--batch', type=int, default=4, help='moves per message')
+    tester.add_argument('--think', type=float, default=0.0,
+                        help='average seconds each player waits between messages')
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        game_server = GameServer(args.images, args.allow_urls, args.idle_timeout)
+        try:
+            asyncio.run(game_server.run(args.host, args.port,
+                                        lambda port: print('listening on port', port, file=sys.stderr)))
+        except KeyboardInterrupt:
+            pass
+        return
+
+    async def test():
+        server_task = None
+        port = args.port
+        if port is None: # serve from this process, sharing its one thread
+            listening = asyncio.get_running_loop().create_future()
+            server_task = asyncio.create_task(GameServer().run(args.host, 0, listening.set_result))
+            port = await listening
+        try:
+            return await load_test(args.host, port, args.sessions, args.connections, args.seconds,
+                                   args.rows, args.columns, args.batch, args.think)
+        finally:
+            if server_task:
+                server_task.cancel()
+    print(json.dumps(asyncio.run(test()), indent=2))
+
+if __name__ == '__main__':
+    main()
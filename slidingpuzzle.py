@@ -10,11 +10,31 @@
 #-------------------------------------------------------------------------------
 from tkinter import *
 from random import *
-from PIL import Image, ImageTk, ImageSequence
-from tkinter import colorchooser
+from PIL import Image
+from tkinter import colorchooser, filedialog
 import os
-import urllib.request
-import io
+import time
+import threading
+from board import Board
+from solvability import random_cells
+from tileframes import FrameCache, TileFrames
+from loader import FrameLoader, DecodedCache, POLL_INTERVAL
+from fetch import ImageCache
+from renderer import CompositeRenderer
+from scheduler import AnimationClock
+from catalog import Catalog
+from profiling import Profiler, NULL_PROFILER
+from hints import Hinter
+from movelog import MoveLog, load_session, save_session
+
+# the default memory budget for cached tile frames, in bytes
+FRAME_BUDGET = 256*1024*1024
+# and for decoded images, ready to be sliced into tiles
+DECODED_BUDGET = 512*1024*1024
+# how often the profiling overlay is refreshed, in milliseconds
+OVERLAY_INTERVAL = 500
+# how many moves per second auto-solve plays by default
+SOLVE_RATE = 4
 
 class Tile(object):
     """
@@ -31,7 +51,8 @@ class Tile(object):
             metadata such as size.
         img (PhotoImage): the PhotoImage object for this tile, which can then
             be drawn on the canvas with create_image().
-        seq (list): all of this tile's PhotoImage objects (for animations)
+        seq (TileFrames): all of this tile's PhotoImage objects (for
+            animations), each created the first time it's used.
     """
     def __init__(self, unit_id, x_loc, y_loc, img, seq):
         self.unit_id = unit_id
@@ -49,30 +70,69 @@ class SlidingPuzzle(object):
         all_tiles (list): a list containing each Tile.
         bgcolor (str): a string representing the canvas bg color, or None.
         board (Canvas): the visible board, containing Tile images.
+        clock (AnimationClock): decides which animation frame to show when,
+            and keeps count of late and dropped frames.
         color_chooser (Button): a button to choose the bg color.
+        composite (bool): whether new boards are drawn as a single image
+            rather than as canvas items for each tile.
         columns_entry (Entry): a text box for entering the number of columns.
         columns_label (Label): a label prompting the user for a column entry.
+        decoded_cache (DecodedCache): recently decoded images, with counters
+            for how often restarts find their image already decoded.
         frame (Frame): a tkinter Frame that holds the visible game.
+        frame_cache (FrameCache): the most recently used tile frames, shared
+            by every Tile.
+        changes (list): for each frame after the first, the IDs of the tiles
+            that look different from the frame before.
+        frame_keys (list): for each loaded frame, a digest of each tile's
+            crop, shared by every Tile's TileFrames so that identical crops
+            share one PhotoImage.
+        frames (list): the image's frames that have loaded so far, shared by
+            every Tile's TileFrames.
+        game (Board): the layout of the tiles, which handles the game's rules.
         height_entry (Entry):  a text box for entering the max height in pixels.
+        hint_button (Button): a button to show the best next move.
+        hinter (Hinter): finds the best moves for the current board in the
+            background, or None before there's a board.
         height_label (Label): a label prompting the user for a max height entry.
+        image_cache (ImageCache): downloaded images, kept on disk.
         images (dictionary): a tuple:int dictionary, with each tuple being an
             (x,y) representation of a location on the board and each int being
             used to refer to images drawn by tkinter with create_image().
+        catalogs (dictionary): a str:Catalog dictionary, with the index of
+            each image folder used so far.
         img_folder (str): a string of the current image folder path, or None.
         img_toggle (Button): a button to show/hide the image.
         labels (dictionary): a tuple:int dictionary, with each tuple being an
             (x,y) representation of a location on the board and each int being
             used to refer to text labels drawn by tkinter with create_text().
         last_piece (int): the ID of the last (lower-right corner) image.
+        loader (FrameLoader): loads the current image in the background, or
+            None once it's finished.
+        max_height (int): the tallest the board can be, in pixels.
+        next_images (dictionary): a str:str dictionary, with the path of the
+            image loaded ahead of time for each folder.
+        prefetchers (dictionary): a str:FrameLoader dictionary, with the
+            loader filling the decoded cache with each folder's next image.
+        overlay (bool): whether the profiling overlay is shown.
         parent (Tk): a reference to the root Tk object.
         photo_columns (int): the number of columns in the current puzzle.
         photo_entry (Entry):  a text box for entering the photo's filename.
         photo_label (Label): a label prompting the user for a filename entry.
         photo_rows (int): the number of rows in the current puzzle.
+        profiler (Profiler): times loading, moves and animation frames, or
+            a NullProfiler that does nothing until the overlay is shown.
+        render_toggle (Button): a button to switch how boards are drawn.
+        renderer (CompositeRenderer): draws the board as a single image, or
+            None if it's drawn with canvas items.
         rows_entry (Entry): a text box for entering the number of rows.
         rows_label (Label): a label prompting the user for a row entry.
         show_image (bool): whether the image is displayed.
         show_text (bool): whether the numbering is displayed.
+        solve_button (Button): a button to start or stop auto-solve.
+        solve_entry (Entry): a text box for entering auto-solve's moves per
+            second.
+        solving (bool): whether auto-solve is playing.
         spare (Tile): the lower-right corner Tile, which is effectively removed
             from the puzzle until it's completed, at which point its image
             will be drawn.
@@ -81,15 +141,35 @@ class SlidingPuzzle(object):
             (x,y) representation of a location on the board and each int being
             used to refer to label bgs drawn by tkinter with create_rectangle().
         text_toggle (Button): a button to show/hide the numbering.
+        tiles (list): every Tile, including the spare, indexed by unit_id.
+        unique_keys (set): every distinct tile crop digest in the image.
         x_step (int): the length in pixels of each tile's x-axis.
         y_step (int): the length in pixels of each tile's y-axis.
     """
-    def __init__(self, parent):
+    def __init__(self, parent, frame_budget=FRAME_BUDGET, decoded_budget=DECODED_BUDGET,
+                 profiler=NULL_PROFILER):
         parent.title("Sliding Puzzle") # title for the window
         self.parent = parent
+        self.profiler = profiler
+        self.overlay = False
+        self.overlay_schedule = lambda: None
+        self.load_started = None
+        self.frame_cache = FrameCache(frame_budget)
+        self.image_cache = ImageCache()
+        self.decoded_cache = DecodedCache(decoded_budget)
+        self.next_images = {}
+        self.prefetchers = {}
         self.bgcolor = None
         self.img_folder = None
+        self.catalogs = {}
+        self.catalog_lock = threading.Lock()
         self.all_tiles = None
+        self.tiles = None
+        self.game = None
+        self.seed = None
+        self.log = None
+        self.source = None
+        self.restoring = None
         self.success = False
         self.last_piece = None
         # Here's the frame:
@@ -156,10 +236,47 @@ class SlidingPuzzle(object):
         self.key_toggle.grid(row=3, column=5, columnspan=1)
         self.key_axis = True
         
+        # Button for switching between canvas items and a single image
+        self.render_toggle = Button(self.frame, text='Canvas items', command=self.toggle_renderer)
+        self.render_toggle.grid(row=3, column=6, columnspan=1)
+        self.composite = False
+        self.renderer = None
+        
+        # Button for showing the next move
+        self.hint_button = Button(self.frame, text='Hint', command=self.hint)
+        self.hint_button.grid(row=4, column=0, columnspan=2)
+        
+        # Button for solving the puzzle
+        self.solve_button = Button(self.frame, text='Solve', command=self.toggle_solve)
+        self.solve_button.grid(row=4, column=2, columnspan=2)
+        self.solving = False
+        self.autoplaying = False
+        self.hinter = None
+        
+        # Label for entering the auto-solve speed
+        Label(self.frame, text = "Solve speed (moves/s): ").grid(row=4, column=4)
+        # Text box for entering the auto-solve speed
+        self.solve_entry = Entry(self.frame, width=3)
+        self.solve_entry.insert(0, str(SOLVE_RATE))
+        self.solve_entry.grid(row=4, column=5, padx=5)
+        
         self.animation_schedule = lambda: None
+        self.load_schedule = lambda: None
+        self.hint_schedule = lambda: None
+        self.solve_schedule = lambda: None
+        self.animating = False
+        self.clock = None
+        self.loader = None
+        self.frames = []
+        self.frame_keys = []
+        self.changes = []
+        self.unique_keys = set()
 
         self.parent.bind("<Return>", self.draw_board) # bind the Enter button
         self.parent.bind("<F1>", self.show_help)
+        self.parent.bind("<F2>", self.toggle_overlay)
+        self.parent.bind("<Control-s>", self.save_game)
+        self.parent.bind("<Control-o>", self.open_game)
     
     def show_help(self, event=None):
         '''
@@ -177,11 +294,18 @@ class SlidingPuzzle(object):
         '''with the keyboard's arrow keys. If they seem backwards, click the Invert Keys button.\n\t'''
         '''You can choose a different color for the empty background tile with the BG Color button. '''
         '''You can toggle the tile numbers with the Toggle Numbering button, '''
-        '''or show/hide the image itself with the Toggle Image button.\n\t'''
-        '''If your image is an animation (such as a GIF), it will animate at a default of 30 FPS. '''
-        '''You can choose a custom framerate between 1 and 120 FPS by entering it to the '''
+        '''or show/hide the image itself with the Toggle Image button. '''
+        '''The Canvas items button switches the next game to drawing the board as a single image, '''
+        '''which is faster for big animated boards.\n\t'''
+        '''If your image is an animation (such as a GIF), it will animate at the speed saved in the image. '''
+        '''You can choose a custom framerate between 1 and 120 FPS instead by entering it to the '''
         '''right of the filename entry box and either restarting (with Enter or right click) or '''
-        '''clicking the ">" button just to the right of the FPS entry box.''', width=300)
+        '''clicking the ">" button just to the right of the FPS entry box.\n\t'''
+        '''The Hint button outlines the best tile to move, and the Solve button finishes the puzzle for you '''
+        '''at the speed entered next to it. Moving a tile yourself stops it.\n\t'''
+        '''Ctrl+S saves the game in progress and Ctrl+O picks up a saved one where it left off, '''
+        '''with the same image and layout.\n\t'''
+        '''F2 shows how long loading, moving and animating are taking.''', width=300)
         m.pack()
 
     def toggle_keys(self):
@@ -214,6 +338,8 @@ class SlidingPuzzle(object):
         if temp: # if a choice was made,
             self.board.config(bg=temp) # use it
             self.bgcolor = temp # and save it
+            if self.renderer: # the single image has to be redrawn with it
+                self.renderer.set_bg(temp)
             
     def toggle_text(self):
         '''
@@ -229,6 +355,9 @@ class SlidingPuzzle(object):
             self.board.itemconfig(t, state=newstate) # and set them to the new state
         for b in self.text_bgs.values(): # go through all the label bgs
             self.board.itemconfig(b, state=newstate) # and set them to the new state
+        if self.renderer: # the numbers are part of the single image
+            self.renderer.show_text = self.show_text
+            self.renderer.redraw()
     
     def toggle_image(self):
         '''
@@ -244,11 +373,16 @@ class SlidingPuzzle(object):
             self.board.itemconfig(t, state=newstate) # and set it to the new state
         if self.success: # if the board is complete,
             self.board.itemconfig(self.last_piece, state=newstate) # change the last tile too
+        if self.renderer: # the image is the single image
+            self.renderer.show_image = self.show_image
+            self.renderer.redraw()
     
     def draw_board(self, event):
         """
         Creates the game, wiping any previous conditions.
         """
+        if event is not None: # a new game, not a saved one being restored
+            self.restoring = None
         try: # try to wipe the board
             self.board.destroy()
         except AttributeError:
@@ -286,111 +420,240 @@ class SlidingPuzzle(object):
             self.height_entry.insert(0, "10") # set it to 10
             max_height = 10 # and set height to 10
 
-        if filename.startswith('http'): # if it's a URL
-            try: # try to download and open it
-                orig = Image.open(io.BytesIO(urllib.request.urlopen(filename).read()))
-            except: # if it fails,
-                self.photo_label.config(text="Not found. ") # say so
+        # stop loading and animating the last image, if there was one
+        self.stop_loading()
+        # and start loading this one in the background. The board is built
+        # by poll_loader() as soon as the first frame is ready.
+        self.max_height = max_height
+        self.profiler.count('boards')
+        self.load_started = time.perf_counter()
+        self.loader = FrameLoader(lambda: self.find_image(filename), max_height, self.decoded_cache,
+                                  grid=(self.photo_rows, self.photo_columns), profiler=self.profiler)
+        self.frames = []
+        self.frame_keys = []
+        self.changes = []
+        self.unique_keys = set()
+        self.poll_loader()
+
+    def find_image(self, filename):
+        """
+        Works out which image to load for the given filename, URL, or folder.
+        This runs in the loader's worker thread, so it mustn't touch any widgets.
+        Parameter:
+            filename (str): what the user entered.
+        Returns:
+            tuple: a key for the image in the decoded cache, the text for the
+                filename label, a function that opens the Image, and the
+                image's folder (or None) and source for poll_loader().
+        """
+        if filename.startswith('http'): # if it's a URL, download and open it,
+            # or open the copy from last time
+            with self.catalog_lock:
+                self.cancel_prefetches()
+            path = self.fetch(filename)
+            # the download is stored by its sha256, so a changed image gets a new key
+            return ('url', os.path.basename(path)), "Filename: ", lambda: Image.open(path), \
+                (None, filename)
+        try: # try to open the image in the given filename
+            Image.open(filename).close()
+        except OSError: # if that fails, it might be a folder
+            newname = os.path.dirname(filename) # get a path
+            if not newname or not os.path.isdir(newname): # a bare name that isn't there
+                raise FileNotFoundError('{} not found'.format(filename))
+            with self.catalog_lock: # only one thread scans at a time
+                # this folder's next image is the one to keep decoding
+                self.cancel_prefetches(keep=newname)
+                self.prefetchers.pop(newname, None)
+                if newname not in self.catalogs: # if it's new this session,
+                    catalog = Catalog(newname) # load its catalog from last time
+                    catalog.scan() # and catch up on any changes
+                    self.catalogs[newname] = catalog
+                elif self.catalogs[newname].stale(): # or if files came or went
+                    self.catalogs[newname].scan()
+                    if not os.path.isfile(self.next_images.get(newname, newname)):
+                        self.next_images.pop(newname, None) # the one loaded ahead is gone
+                # use the image that was loaded ahead of time, if there is one
+                path = self.next_images.pop(newname, None)
+            if path is None:
+                path = self.catalogs[newname].choose() # choose an image
+            if path is None:
+                raise FileNotFoundError('no images in {}'.format(newname))
+            # and load it, saying which file this is
+            return self.file_source(path, "File {} in: ".format(os.path.relpath(path, newname)), newname)
+        else:
+            with self.catalog_lock:
+                self.cancel_prefetches()
+            return self.file_source(filename, "Filename: ")
+
+    def cancel_prefetches(self, keep=None):
+        """
+        Stops loading ahead for every folder except keep, since the user has
+        moved on. The caller must hold catalog_lock.
+        """
+        for folder in list(self.prefetchers):
+            if folder != keep:
+                loader = self.prefetchers.pop(folder)
+                if not loader.wait(0): # still going, so it won't be in the cache
+                    loader.cancel()
+                    self.next_images.pop(folder, None) # pick another next time
+
+    def fetch(self, url):
+        """
+        Returns the path of a downloaded image, timing the download.
+        """
+        with self.profiler.phase('fetch'):
+            return self.image_cache.fetch(url)
+
+    def file_source(self, path, description, folder=None):
+        """
+        Returns find_image()'s result for a local file. The key includes the
+        file's modification time, so an edited file is decoded again.
+        """
+        path = os.path.abspath(path)
+        return ('file', path, os.path.getmtime(path)), description, \
+            lambda: Image.open(path), (folder, path)
+
+    def prefetch(self):
+        """
+        Picks the next random image from the current folder and decodes it in
+        the background, so the next restart can start right away.
+        """
+        folder = self.img_folder
+        if folder is None or folder not in self.catalogs:
+            return
+        with self.catalog_lock:
+            if folder in self.next_images: # already done
                 return
-            else:
-                # if it works, reset the label
-                self.photo_label.config(text="Filename: ")
-        else: # if it's not a URL
-            try: # try to open the image in the given filename
-                orig = Image.open(filename)
-            except: # if that fails
-                try:
-                    newname = os.path.dirname(filename) # get a path
-                    if self.img_folder != newname: # if it's new,
-                        self.img_folder = newname # save it
-                        self.img_folder_contents = os.listdir(self.img_folder) # save the contents
-                    f = choice(self.img_folder_contents) # choose an image
-                    orig = Image.open(os.path.join(self.img_folder, f)) # and load it
-                except: # if something's wrong there,
-                    self.photo_label.config(text="Not found. ") # say so
-                    return # and don't create the game
-                else: # if it worked, say which file this is
-                    self.photo_label.config(text="File {} in: ".format(f))
-            else:
-                # if it works, reset the label
-                self.photo_label.config(text="Filename: ")
-        sequence = [i.copy() for i in ImageSequence.Iterator(orig)] # exhaust the iterator to find the animation length
-        # if you don't make copies it doesn't work. don't ask me why.
-        master_image = sequence[0] # get a base image
-        if master_image.size[1] > max_height: # if the image is too big,
-            width = int(master_image.size[0]*max_height/master_image.size[1])
-            for i in range(len(sequence)):
-                sequence[i] = sequence[i].resize((width, max_height),
-                                                 resample=Image.ANTIALIAS) # resize it according to the entered max height
-            master_image = master_image.resize((int(master_image.size[0]*max_height/master_image.size[1]),
-                                                   max_height),
-                                                   resample=Image.ANTIALIAS)
+            path = self.catalogs[folder].choose()
+            if path is None:
+                return
+            self.next_images[folder] = path
+            # nothing polls this loader; it only fills the decoded cache
+            self.prefetchers[folder] = FrameLoader(lambda: self.file_source(path, None), self.max_height,
+                                                   self.decoded_cache, prefetch=True, profiler=self.profiler)
+
+    def stop_loading(self):
+        """
+        Cancels any image that's still loading and stops the animation.
+        """
+        if self.loader:
+            self.loader.cancel()
+            self.loader = None
+        self.parent.after_cancel(self.load_schedule)
+        self.parent.after_cancel(self.animation_schedule)
+        self.animating = False
+        self.stop_solving()
+        if self.hinter:
+            self.hinter.cancel()
+            self.hinter = None
+
+    def poll_loader(self):
+        """
+        Collects newly loaded frames, building the board from the first one
+        and adding the rest to the animation as they arrive.
+        """
+        frames = self.loader.poll()
+        if self.loader.error and not self.frames and not frames:
+            self.photo_label.config(text="Not found. ") # say so
+            self.loader = None
+            return # and don't create the game
+        if frames:
+            new_board = not self.frames
+            # extend the lists in place, since every Tile shares them
+            for frame, keys in frames:
+                if self.frame_keys: # note which tiles differ from the last frame
+                    last = self.frame_keys[-1]
+                    self.changes.append([unit_id for unit_id, key in enumerate(keys) if key != last[unit_id]])
+                else:
+                    self.changes.append(None) # frame 0 follows whichever frame was last
+                self.frames.append(frame)
+                self.frame_keys.append(keys)
+                self.unique_keys.update(keys)
+            if new_board:
+                # say which file this is, or reset the label
+                self.photo_label.config(text=self.loader.description)
+                # and note where it came from, for prefetch() and save_game()
+                self.img_folder, self.source = self.loader.details
+                self.build_board()
+                # from pressing Enter to a playable board
+                self.profiler.record('board ready', time.perf_counter() - self.load_started)
+            if len(self.frames) > 1 and not self.animating:
+                self.animating = True
+                self.update_fps()
+                self.clock = AnimationClock(self.frames, self.fps_ms)
+                # frame 0 is already up, so wait for its turn to end
+                self.animation_schedule = self.parent.after(self.clock.start(), self.animate)
+        if self.loader.done:
+            self.loader = None
+            self.prefetch() # get the next image from a folder ready
+        else: # check again soon
+            self.load_schedule = self.parent.after(POLL_INTERVAL, self.poll_loader)
+
+    def build_board(self):
+        """
+        Slices the first frame into Tiles, shuffles them, and draws the board.
+        """
+        master_image = self.frames[0] # get a base image
         self.all_tiles = [] # create a list for the Tiles
+        self.frame_cache.clear() # and forget the last image's frames
         # this will be the width of each tile, in pixels
         self.x_step = int(master_image.size[0]/self.photo_columns)
         # this will be the height of each tile, in pixels
         self.y_step = int(master_image.size[1]/self.photo_rows)
-        current_id = 0 # we'll start with an ID of 0
-        for row in range(self.photo_rows): # for each row
-            for column in range(self.photo_columns): # and column,
-                # add a new Tile to the list, with the current ID, and a
-                # column and row based on the location of the cropped image
-                # within the master image, and a sequence of the crops
-                dim = (column*self.x_step,
-                       row*self.y_step,
-                       (column + 1) * self.x_step,
-                       (row + 1) * self.y_step
-                      )
-                s = [ImageTk.PhotoImage(img.crop(dim))
-                            for img in sequence]
-                self.all_tiles.append(Tile(current_id,
-                                           column,
-                                           row,
-                                           master_image.crop(dim),
-                                           s
+        with self.profiler.phase('slice'):
+            current_id = 0 # we'll start with an ID of 0
+            for row in range(self.photo_rows): # for each row
+                for column in range(self.photo_columns): # and column,
+                    # add a new Tile to the list, with the current ID, and a
+                    # column and row based on the location of the cropped image
+                    # within the master image, and a sequence of the crops,
+                    # which are only made when they're needed
+                    dim = (column*self.x_step,
+                           row*self.y_step,
+                           (column + 1) * self.x_step,
+                           (row + 1) * self.y_step
+                          )
+                    s = TileFrames(current_id, dim, self.frames, self.frame_cache, self.frame_keys)
+                    self.all_tiles.append(Tile(current_id,
+                                               column,
+                                               row,
+                                               master_image.crop(dim),
+                                               s
+                                               )
                                            )
-                                       )
-                # increment the current ID for the next Tile to use
-                current_id += 1
-
-        # and now to randomize, check inversions, and fix unsolvable boards
-        self.spare = self.all_tiles.pop() # remove a tile so the game can work
-        shuffle(self.all_tiles) # randomize the tiles
-        # look at each tile in the shuffled list
-        for i in range(len(self.all_tiles)):
-            # assign it an x_loc and y_loc based on its location in the
-            # shuffled list
-            self.all_tiles[i].y_loc, self.all_tiles[i].x_loc = \
-            divmod(i,self.photo_columns)
-
-        # an inversion is when a tile with a larger ID comes before a tile with
-        # a smaller ID - their order is "inverted." This is a factor in
-        # whether a given puzzle is solvable. For more information, see
+                    # increment the current ID for the next Tile to use
+                    current_id += 1
+        self.tiles = list(self.all_tiles) # keep them in ID order for lookups
+        self.profiler.count('tiles', len(self.tiles))
+
+        # and now to randomize. Half of all shuffles can't be solved, so
+        # random_cells() checks the permutation's parity and fixes bad ones.
+        # For more information, see
         # http://www.cs.bham.ac.uk/~mdr/teaching/
         # modules04/java2/TilesSolvability.html
-        inversions = 0
-        for tile in range(len(self.all_tiles)): # go through each list element
-            # for each element on or after the given element,
-            for subsequent in range(tile,len(self.all_tiles)):
-                # if the ID of that later element is smaller than the ID of
-                # the one we're looking at,
-                if self.all_tiles[subsequent].unit_id < \
-                self.all_tiles[tile].unit_id:
-                    # add to our inversion count
-                    inversions += 1
-
-        # based on the way the blank tile is always the 'last' one, in the
-        # lower-right corner, we need an even number of inversions if we want
-        # this to be solvable.
-        if inversions % 2: # so, if it's odd,
-            # switch the last two elements in the list of Tiles
-            self.all_tiles[-1], self.all_tiles[-2] = \
-            self.all_tiles[-2], self.all_tiles[-1]
-            # and have them swap locations
-            (self.all_tiles[-1].x_loc, self.all_tiles[-1].y_loc), \
-            (self.all_tiles[-2].x_loc, self.all_tiles[-2].y_loc) = \
-            (self.all_tiles[-2].x_loc, self.all_tiles[-2].y_loc), \
-            (self.all_tiles[-1].x_loc, self.all_tiles[-1].y_loc)
+        with self.profiler.phase('shuffle'):
+            restoring, self.restoring = self.restoring, None
+            if restoring and (restoring[1].rows, restoring[1].columns) == \
+                    (self.photo_rows, self.photo_columns): # pick up a saved game where it left off
+                self.seed, self.log = restoring
+                cells = list(self.log.cells)
+            else: # the seed is saved with the game, to shuffle it the same way again
+                self.seed = randrange(1 << 32)
+                cells = random_cells(self.photo_rows, self.photo_columns, Random(self.seed))
+                self.log = MoveLog(self.photo_rows, self.photo_columns, cells)
+            # the Board keeps track of the layout from here on, with the spare
+            # tile's ID marking the empty cell in the lower-right corner
+            self.game = Board(self.photo_rows, self.photo_columns, cells)
+        self.success = False
+        self.hinter = Hinter(self.photo_rows, self.photo_columns)
+        self.spare = self.tiles[self.game.blank_id] # remove a tile so the game can work
+        self.all_tiles = [] # and put the rest in board order
+        for position, unit_id in enumerate(cells):
+            tile = self.tiles[unit_id]
+            # assign it an x_loc and y_loc based on its location on the board
+            tile.y_loc, tile.x_loc = divmod(position, self.photo_columns)
+            if tile is not self.spare:
+                self.all_tiles.append(tile)
 
         # now that we have a good set of Tiles for our puzzle, we can
         # make the board with a Canvas the size of the given (above) image
@@ -399,32 +662,15 @@ class SlidingPuzzle(object):
         # put the Canvas into the Frame
         self.board.grid(row=0, column=0, columnspan=7)
         
-        # create each Tile's image on the board and save it in a dictionary,
-        # which we can later access with a location tuple as the key
-        self.images = {(tile.x_loc,tile.y_loc):self.board.create_image \
-            (tile.x_loc*self.x_step, tile.y_loc*self.y_step, \
-            anchor=NW, image=tile.seq[0]) for tile in self.all_tiles}
-        # create each Tile's coordinate label and save it in a dictionary,
-        # which we can later access with a location tuple as the key
-        self.labels = {(tile.x_loc,tile.y_loc):self.board.create_text \
-            (tile.x_loc*self.x_step, tile.y_loc*self.y_step, \
-            anchor=NW, text=' %d' % (tile.unit_id+1),
-            font=('Arial', 14)) for tile in self.all_tiles}
-        # create each Tile's coordinate label background and save it in a dictionary,
-        # which we can later access with a location tuple as the key
-        self.text_bgs = {(tile.x_loc,tile.y_loc):self.board.create_rectangle \
-            (self.board.bbox(self.labels[(tile.x_loc,tile.y_loc)]), \
-            outline='white', fill='white') for tile in self.all_tiles}
-        for l in self.labels.values():
-            self.board.tag_raise(l) # put the numbers above the bgs
-        
-        # turn off the text/image if we're not supposed to show them
-        if not self.show_text:
-            self.show_text = True
-            self.toggle_text()
-        if not self.show_image:
-            self.show_image = True
-            self.toggle_image()
+        with self.profiler.phase('draw'):
+            if self.composite: # draw the whole board as one image
+                self.images, self.labels, self.text_bgs = {}, {}, {}
+                self.renderer = CompositeRenderer(self.board, self.game, self.frames,
+                                                  self.x_step, self.y_step, self.bgcolor,
+                                                  self.show_image, self.show_text)
+            else: # or give each tile its own canvas items
+                self.renderer = None
+                self.draw_items()
         
         # bind the Enter button and right-click-release button to drawing a new board
         self.parent.bind("<Return>", self.draw_board)
@@ -437,17 +683,140 @@ class SlidingPuzzle(object):
         self.board.bind("<Right>", lambda x: self.move((max(0,self.spare.x_loc-1), self.spare.y_loc)))
         self.board.bind("<Down>", lambda x: self.move((self.spare.x_loc, max(0,self.spare.y_loc-1))))
         self.board.focus_set()
-        self.parent.after_cancel(self.animation_schedule)
-        if len(sequence) > 1:
-            self.update_fps()
-            self.animate(1)
     
+    def draw_items(self):
+        """
+        Creates the canvas items for each Tile's image and label.
+        """
+        with self.profiler.phase('photoimages'):
+            for tile in self.all_tiles:
+                tile.img = tile.seq[0] # make the first frame and hold on to it
+        with self.profiler.phase('canvas items'):
+            # create each Tile's image on the board and save it in a dictionary,
+            # which we can later access with a location tuple as the key
+            self.images = {(tile.x_loc,tile.y_loc):self.board.create_image \
+                (tile.x_loc*self.x_step, tile.y_loc*self.y_step, \
+                anchor=NW, image=tile.img) for tile in self.all_tiles}
+            # create each Tile's coordinate label and save it in a dictionary,
+            # which we can later access with a location tuple as the key
+            self.labels = {(tile.x_loc,tile.y_loc):self.board.create_text \
+                (tile.x_loc*self.x_step, tile.y_loc*self.y_step, \
+                anchor=NW, text=' %d' % (tile.unit_id+1),
+                font=('Arial', 14)) for tile in self.all_tiles}
+            # create each Tile's coordinate label background and save it in a dictionary,
+            # which we can later access with a location tuple as the key
+            self.text_bgs = {(tile.x_loc,tile.y_loc):self.board.create_rectangle \
+                (self.board.bbox(self.labels[(tile.x_loc,tile.y_loc)]), \
+                outline='white', fill='white') for tile in self.all_tiles}
+            for l in self.labels.values():
+                self.board.tag_raise(l) # put the numbers above the bgs
+        
+        # turn off the text/image if we're not supposed to show them
+        if not self.show_text:
+            self.show_text = True
+            self.toggle_text()
+        if not self.show_image:
+            self.show_image = True
+            self.toggle_image()
+
+    def toggle_renderer(self):
+        '''
+        Switches between canvas items for each tile and a single image for
+        the whole board, starting with the next game.
+        '''
+        self.composite = not self.composite
+        self.render_toggle.config(text='Single image' if self.composite else 'Canvas items')
+
+    def hint(self):
+        '''
+        Outlines the best tile to move, once the worker has found it.
+        '''
+        if self.hinter is None or self.success:
+            return
+        self.hinter.ask(self.game.cells)
+        self.poll_hint()
+
+    def toggle_solve(self):
+        '''
+        Starts or stops playing the rest of the puzzle automatically.
+        '''
+        if self.solving:
+            self.stop_solving()
+        elif self.hinter is not None and not self.success:
+            self.solving = True
+            self.solve_button.config(text='Stop')
+            self.hint()
+
+    def stop_solving(self):
+        '''
+        Stops auto-solve.
+        '''
+        self.solving = False
+        self.solve_button.config(text='Solve')
+        self.parent.after_cancel(self.solve_schedule)
+
+    def poll_hint(self):
+        '''
+        Checks whether the worker has found the path yet, and shows its first
+        move or plays it.
+        '''
+        self.parent.after_cancel(self.hint_schedule)
+        path = self.hinter.poll()
+        if path is None:
+            if self.hinter.searching: # check again soon
+                self.hint_schedule = self.parent.after(POLL_INTERVAL, self.poll_hint)
+            elif self.hinter.error: # say so
+                self.photo_label.config(text="No hint. ")
+                self.stop_solving()
+            return
+        if self.hinter.latencies and self.profiler.enabled:
+            self.profiler.record('hint', self.hinter.latencies[-1])
+        if not path: # already solved
+            self.stop_solving()
+            return
+        if self.solving: # a Hint during auto-solve mustn't start a second chain
+            self.parent.after_cancel(self.solve_schedule)
+            self.solve_schedule = self.parent.after(self.solve_interval(), self.play_step)
+        else:
+            self.board.delete('hint')
+            x, y = self.game.coords(path[0])
+            self.board.create_rectangle(x*self.x_step+1, y*self.y_step+1, (x+1)*self.x_step-1,
+                                        (y+1)*self.y_step-1, outline='red', width=3, tags='hint')
+
+    def solve_interval(self):
+        '''
+        Returns the milliseconds between auto-solve's moves.
+        '''
+        rate = self.solve_entry.get()
+        return 1000//min(max(1, int(rate)), 100) if rate.isdigit() else 1000//SOLVE_RATE
+
+    def play_step(self):
+        '''
+        Plays auto-solve's next move through move(), like a click on it.
+        '''
+        if not self.solving or not self.hinter.path:
+            return
+        self.autoplaying = True
+        try:
+            self.move(self.game.coords(self.hinter.path[0]))
+        finally:
+            self.autoplaying = False
+        if self.success:
+            self.stop_solving()
+        elif self.hinter.path:
+            self.solve_schedule = self.parent.after(self.solve_interval(), self.play_step)
+        else: # shouldn't happen, but find the rest of the way
+            self.hint()
+
     def update_fps(self):
         """
-        Updates the animation's FPS value.
+        Updates the animation's FPS value. Without one, each frame is shown
+        for as long as the image itself says.
         """
         fps = self.fps_entry.get()
-        self.fps_ms = 1000//min(max(1, int(fps)), 120) if fps.isdigit() else 33
+        self.fps_ms = 1000//min(max(1, int(fps)), 120) if fps.isdigit() else None
+        if self.clock: # takes effect from the next frame
+            self.clock.interval = self.fps_ms
     
     def move(self, event):
         """
@@ -463,33 +832,26 @@ class SlidingPuzzle(object):
             # tuple that the game's logic can handle.
             click = (event.x//self.x_step, event.y//self.y_step)
 
-        # make a set of tuples that describe the locations of four tiles around
-        # the empty space
-        movable_tiles = {(self.spare.x_loc - 1, self.spare.y_loc),
-        (self.spare.x_loc, self.spare.y_loc - 1),
-        (self.spare.x_loc + 1, self.spare.y_loc),
-        (self.spare.x_loc, self.spare.y_loc + 1)}
-        # make a set of tuples to describe the locations of any supposed
-        # tiles that are actually not on the board
-        bad_tiles = set()
-        for tile in movable_tiles: # look at each tile in movable_tiles
-            # if its x is less than 0 or more than the number of columns,
-            # or if its y is less than 0 or more than the number of rows,
-            if tile[0] < 0 or tile[0] > self.photo_columns or \
-            tile[1] < 0 or tile[1] > self.photo_rows:
-                bad_tiles.add(tile) # add it to bad_tiles
-
-        # remove any tiles in bad_tiles from movable_tiles
-        movable_tiles -= bad_tiles
-
-        # if the user didn't click a tile that can be moved,
-        if click not in movable_tiles:
+        # clicks past the right or bottom edge would wrap around to another cell
+        if not (0 <= click[0] < self.photo_columns and 0 <= click[1] < self.photo_rows):
+            return
+        # slide the clicked tile into the empty space, if it's next to it
+        empty = self.game.blank
+        moved = self.game.move(self.game.position(*click))
+        if moved is None: # if the user didn't click a tile that can be moved,
             return # then we're done here
+        self.log.append(self.game.blank)
+        # keep the hint's path if this was its move, or start over if not
+        self.hinter.moved(self.game.position(*click))
+        self.board.delete('hint')
+        if self.solving and not self.autoplaying: # the player's taking over
+            self.stop_solving()
+        with self.profiler.phase('move'): # only moves that happen are timed
+            tile = self.tiles[moved]
 
-        self.success = True # first we'll assume the user won the game with this move
-        for tile in self.all_tiles: # look at each tile
-            # if it's the one that was clicked on,
-            if (tile.x_loc, tile.y_loc) == click:
+            if self.renderer: # just repaint the two cells that changed
+                self.renderer.repaint(empty, self.game.blank)
+            else:
                 # its image, label, and label bg move to where the spare tile is,
                 # which we're using as an "empty" space since we're not displaying its image
                 self.board.coords(self.images.get(click), self.spare.x_loc * \
@@ -499,60 +861,169 @@ class SlidingPuzzle(object):
                 self.board.itemconfig(self.labels.get(click), state=NORMAL)
                 self.board.coords(self.text_bgs.get(click), self.board.bbox(self.labels[click]))
                 self.board.itemconfig(self.labels.get(click), state=NORMAL if self.show_text else HIDDEN)
-                # its location is set to where the spare tile ("empty" space)
-                # currently is
-                tile.x_loc, tile.y_loc = self.spare.x_loc, self.spare.y_loc
-                # the spare tile now gets a location of where the moved tile
-                # was, which is still described in the click location
-                self.spare.x_loc, self.spare.y_loc = click[0], click[1]
                 # the images, labels, and text_bgs dictionaries have to be updated
                 # with the moved Tile's new location by making that new location
                 # point to the old value
-                self.images[(tile.x_loc, tile.y_loc)] = self.images.get(click)
-                self.labels[(tile.x_loc, tile.y_loc)] = self.labels.get(click)
-                self.text_bgs[(tile.x_loc, tile.y_loc)] = self.text_bgs.get(click)
-                # now to check if this was a winning move
-                for tile in self.all_tiles: # look at each tile
-                    # if its ID doesn't match its current location,
-                    if tile.unit_id != self.photo_columns*tile.y_loc+tile.x_loc:
-                        self.success = False # it wasn't a win
-                        break # so stop looking
-                else: # if we didn't break on failure, then each Tile is now in the
-                      # right place, so it's a win
-                    # fill in the corner piece with the spare tile's image
-                    
-                    self.all_tiles.append(self.spare)
-                    self.spare.y_loc = self.photo_rows-1
-                    self.spare.x_loc = self.photo_columns-1
+                spare = (self.spare.x_loc, self.spare.y_loc)
+                self.images[spare] = self.images.get(click)
+                self.labels[spare] = self.labels.get(click)
+                self.text_bgs[spare] = self.text_bgs.get(click)
+            # its location is set to where the spare tile ("empty" space)
+            # currently is
+            tile.x_loc, tile.y_loc = self.spare.x_loc, self.spare.y_loc
+            # the spare tile now gets a location of where the moved tile
+            # was, which is still described in the click location
+            self.spare.x_loc, self.spare.y_loc = click[0], click[1]
+            # now to check if this was a winning move, which the Board tracks
+            # as it goes so we don't have to look at every tile
+            self.success = self.game.solved
+            if self.success: # each Tile is now in the right place, so it's a win
+                # fill in the corner piece with the spare tile's image
+                self.all_tiles.append(self.spare)
+                self.spare.y_loc = self.photo_rows-1
+                self.spare.x_loc = self.photo_columns-1
+                if self.renderer:
+                    self.renderer.complete = True
+                    self.renderer.repaint(self.game.blank)
+                else:
+                    self.spare.img = self.spare.seq[self.clock.index if self.animating else 0]
                     self.images[(self.spare.x_loc, self.spare.y_loc)] = self.board.create_image(
-                        self.spare.x_loc*self.x_step, self.spare.y_loc*self.y_step, anchor=NW, image=self.spare.seq[0],
+                        self.spare.x_loc*self.x_step, self.spare.y_loc*self.y_step, anchor=NW, image=self.spare.img,
                         state=NORMAL if self.show_image else HIDDEN)
-                    # and unbind all the movement keys
-                    self.board.unbind("<Button-1>")
-                    self.board.unbind("<B1-Motion>")
-                    self.board.unbind("<Left>")
-                    self.board.unbind("<Up>")
-                    self.board.unbind("<Down>")
-                    self.board.unbind("<Right>")
-                # don't keep checking whether we clicked on one of the other
-                # tiles, because we already found it
-                return
+                # and unbind all the movement keys
+                self.board.unbind("<Button-1>")
+                self.board.unbind("<B1-Motion>")
+                self.board.unbind("<Left>")
+                self.board.unbind("<Up>")
+                self.board.unbind("<Down>")
+                self.board.unbind("<Right>")
         
-    def animate(self, counter):
+    def save_game(self, event=None):
         """
-        Animates the image sequence.
-        Parameter:
-            counter: the index of the next image from the sequence list
+        Saves the game in progress: the image, the board size, the seed it
+        was shuffled with, and every move so far.
+        """
+        if self.log is None or not self.frames: # nothing to save yet
+            return
+        path = filedialog.asksaveasfilename(parent=self.parent, defaultextension='.json',
+                                            filetypes=[('Sliding Puzzle games', '*.json')])
+        if path:
+            save_session(path, self.source, self.log, self.seed)
+
+    def open_game(self, event=None):
+        """
+        Loads a saved game and its image, with the board as it was left.
+        """
+        path = filedialog.askopenfilename(parent=self.parent,
+                                          filetypes=[('Sliding Puzzle games', '*.json')])
+        if not path:
+            return
+        try:
+            image, seed, log = load_session(path)
+        except (OSError, ValueError):
+            self.photo_label.config(text="Bad save. ")
+            return
+        for entry, value in ((self.photo_entry, image), (self.rows_entry, log.rows),
+                             (self.columns_entry, log.columns)):
+            entry.delete(0, END)
+            entry.insert(0, str(value))
+        self.restoring = seed, log
+        self.draw_board(None)
+
+    def toggle_overlay(self, event=None):
+        """
+        Shows or hides the profiling overlay on the board, switching
+        profiling on the first time.
+        """
+        if not self.profiler.enabled:
+            self.profiler = Profiler()
+            if self.loader: # catch the rest of this load too
+                self.loader.profiler = self.profiler
+        self.overlay = not self.overlay
+        self.parent.after_cancel(self.overlay_schedule)
+        self.show_overlay()
+
+    def show_overlay(self):
+        """
+        Redraws the profiling overlay, and keeps redrawing it while it's on.
+        """
+        try:
+            self.board.delete('overlay')
+        except (AttributeError, TclError): # no board yet, or it's been destroyed
+            pass
+        else:
+            if self.overlay:
+                dedupe = self.dedupe_stats()
+                summary = '\n'.join([self.profiler.summary(),
+                                     '{:<12} {:>12}'.format('crops', dedupe['crops']),
+                                     '{:<12} {:>12}'.format('unique', dedupe['unique']),
+                                     '{:<12} {:>12.2f}'.format('dedupe ratio', dedupe['dedupe_ratio']),
+                                     '{:<12} {:>12.2f}'.format('changed/frame', dedupe['changed_per_frame'])])
+                text = self.board.create_text(4, 4, anchor=NW, text=summary,
+                                              font=('Courier', 9), tags='overlay')
+                self.board.tag_lower(self.board.create_rectangle(self.board.bbox(text),
+                                     fill='white', outline='', tags='overlay'), text)
+        if self.overlay:
+            self.overlay_schedule = self.parent.after(OVERLAY_INTERVAL, self.show_overlay)
+
+    def changed_tiles(self, old, new):
+        """
+        Returns the IDs of the tiles that look different in frame new than in
+        frame old. Consecutive frames use the list made while loading; any
+        other pair, like the wrap back to frame 0 or a jump over skipped
+        frames, is compared tile by tile.
+        """
+        if new == old + 1:
+            return self.changes[new]
+        old_keys, new_keys = self.frame_keys[old], self.frame_keys[new]
+        return [unit_id for unit_id, key in enumerate(new_keys) if key != old_keys[unit_id]]
+
+    def dedupe_stats(self):
+        """
+        Returns a dictionary of how many tile crops the image has, how many
+        of them are different, and how many tiles change per frame on average.
+        """
+        crops = len(self.frame_keys)*self.photo_rows*self.photo_columns if self.frame_keys else 0
+        changed = sum(len(c) for c in self.changes[1:])
+        return {'crops': crops, 'unique': len(self.unique_keys),
+                'dedupe_ratio': crops/len(self.unique_keys) if self.unique_keys else 1.0,
+                'changed_per_frame': changed/max(1, len(self.changes)-1),
+                'frame_cache': {'hits': self.frame_cache.hits, 'misses': self.frame_cache.misses,
+                                'evictions': self.frame_cache.evictions, 'bytes': self.frame_cache.used}}
+
+    def animate(self):
+        """
+        Shows the next animation frame that's due, and schedules the one
+        after it. Only tiles that look different from the frame being
+        replaced are touched.
         """
-        for tile in self.all_tiles:
-            tile.img = tile.seq[counter]
-            self.board.itemconfig(self.images[(tile.x_loc,tile.y_loc)], image=tile.img)
-        self.animation_schedule = self.parent.after(self.fps_ms, self.animate, (counter+1) % len(tile.seq))
+        shown = self.clock.index
+        counter, delay = self.clock.tick() # the index of the next image from the sequence list
+        with self.profiler.phase('frame'):
+            changed = self.changed_tiles(shown, counter)
+            self.profiler.count('tiles animated', len(changed))
+            if self.renderer: # one paste for the whole board, or a few cells
+                self.renderer.show_frame(counter, changed)
+            else:
+                for unit_id in changed:
+                    tile = self.tiles[unit_id]
+                    if tile is self.spare and not self.success: # not on the board yet
+                        continue
+                    tile.img = tile.seq[counter]
+                    self.board.itemconfig(self.images[(tile.x_loc,tile.y_loc)], image=tile.img)
+        # frames that are still loading join in once they arrive
+        self.animation_schedule = self.parent.after(delay, self.animate)
 
 def main():
     root = Tk() # Create a Tk object from tkinter.
-    sliding_puzzle = SlidingPuzzle(root) # Make my game inherit from that object.
+    # SLIDINGPUZZLE_PROFILE=report.json profiles from the start, and saves
+    # the report there when the window closes
+    report = os.environ.get('SLIDINGPUZZLE_PROFILE')
+    profiler = Profiler() if report else NULL_PROFILER
+    sliding_puzzle = SlidingPuzzle(root, profiler=profiler) # Make my game inherit from that object.
     root.mainloop() # Run the main loop.
+    if report:
+        sliding_puzzle.profiler.export(report, {'dedupe': sliding_puzzle.dedupe_stats()})
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,98 @@
+#-------------------------------------------------------------------------------
+# Name:        Sliding Puzzle solvability
+# Purpose:     Fast inversion counts, solvability checks, and solvable random
+#              layouts for boards of any size.
+#-------------------------------------------------------------------------------
+import random
+
+def count_inversions(sequence):
+    """
+    Counts the pairs in a sequence where a larger number comes before a
+    smaller one, in O(n log n) time with a Fenwick (binary indexed) tree.
+    Parameter:
+        sequence (iterable): distinct non-negative ints.
+    """
+    sequence = list(sequence)
+    if not sequence:
+        return 0
+    size = max(sequence) + 1
+    tree = [0]*(size+1) # tree[i] counts numbers seen so far, by range
+    inversions = 0
+    for seen, number in enumerate(sequence):
+        # count how many of the numbers already seen are <= this one
+        smaller = 0
+        i = number + 1
+        while i:
+            smaller += tree[i]
+            i &= i - 1 # drop the lowest set bit to move to the parent range
+        inversions += seen - smaller # everything else seen was larger
+        # and record this number
+        i = number + 1
+        while i <= size:
+            tree[i] += 1
+            i += i & -i
+    return inversions
+
+def permutation_parity(cells):
+    """
+    Returns 0 if the given permutation is even and 1 if it's odd, in O(n)
+    time. A cycle of length k takes k-1 swaps to undo, so the parity is the
+    number of cells minus the number of cycles.
+    Parameter:
+        cells (sequence): a permutation of range(len(cells)).
+    """
+    seen = bytearray(len(cells))
+    cycles = 0
+    for start in range(len(cells)):
+        if not seen[start]: # found a new cycle,
+            cycles += 1
+            i = start
+            while not seen[i]: # so follow it all the way around
+                seen[i] = 1
+                i = cells[i]
+    return (len(cells) - cycles) % 2
+
+def is_solvable(cells, rows, columns):
+    """
+    Whether a layout can be solved. Every move swaps the empty cell with a
+    neighbour, which flips the permutation's parity and also the parity of
+    the empty cell's distance from its home in the lower-right corner, so
+    those two parities always match on a solvable board. This holds for any
+    width and any position of the empty cell.
+    Parameters:
+        cells (sequence): the ID of the tile at each position, with the
+            highest ID marking the empty cell.
+        rows (int): the number of rows.
+        columns (int): the number of columns.
+    """
+    blank_y, blank_x = divmod(list(cells).index(rows*columns-1), columns)
+    distance = (rows-1-blank_y) + (columns-1-blank_x)
+    return permutation_parity(cells) == distance % 2
+
+def random_cells(rows, columns, rng=None, blank=None):
+    """
+    Returns a random, solvable layout as a list of tile IDs, one per
+    position. Half of all layouts are unsolvable, and swapping any two
+    tiles other than the empty cell turns one kind into the other, so a
+    single swap is enough to fix a bad shuffle.
+    Parameters:
+        rows (int): the number of rows.
+        columns (int): the number of columns.
+        rng (Random): the random number generator to use, for reproducible
+            layouts. The random module's shared one is used by default.
+        blank (int): the position of the empty cell. By default it's in the
+            lower-right corner, where the game starts.
+    """
+    rng = rng or random
+    size = rows*columns
+    blank_id = size - 1
+    cells = list(range(blank_id)) # every tile but the empty cell
+    rng.shuffle(cells)
+    if blank is None:
+        blank = blank_id
+    cells.insert(blank, blank_id)
+    if not is_solvable(cells, rows, columns):
+        # swap the first two real tiles, skipping the empty cell
+        a, b = [i for i in range(3) if i != blank][:2]
+        cells[a], cells[b] = cells[b], cells[a]
+    return cells
@@ -0,0 +1,287 @@
+#-------------------------------------------------------------------------------
+# Name:        Sliding Puzzle solver
+# Purpose:     Optimal solutions with IDA* search.
+#-------------------------------------------------------------------------------
+import sys
+import time
+import random
+from collections import namedtuple
+from solvability import is_solvable, random_cells
+
+class SearchAborted(Exception):
+    """
+    Raised when a search is cancelled or runs out of its node budget.
+    """
+
+class Solution(namedtuple('Solution', 'moves nodes seconds')):
+    """
+    The result of a search.
+    Attributes:
+        moves (list): the position of each tile to slide into the empty cell,
+            in order. Each one can be passed straight to Board.move().
+        nodes (int): how many positions the search looked at.
+        seconds (float): how long the search took.
+    """
+    __slots__ = ()
+
+    @property
+    def rate(self):
+        """
+        Nodes searched per second.
+        """
+        return self.nodes/self.seconds if self.seconds else 0.0
+
+def neighbor_table(rows, columns):
+    """
+    Returns a tuple with, for each position, a tuple of the positions next to it.
+    """
+    table = []
+    for position in range(rows*columns):
+        y, x = divmod(position, columns)
+        table.append(tuple(p for p, ok in ((position-columns, y > 0),
+                                           (position-1, x > 0),
+                                           (position+1, x < columns-1),
+                                           (position+columns, y < rows-1)) if ok))
+    return tuple(table)
+
+class ManhattanHeuristic(object):
+    """
+    An object of this class estimates the number of moves left to solve a
+    board, using the Manhattan distance of each tile from home plus linear
+    conflicts: two tiles in their home row (or column) but in the wrong
+    order, one of which has to step out of the line to let the other past.
+    After estimate() has been called once, moved() keeps the value up to date
+    by looking only at the lines the moved tile touched.
+    Attributes:
+        columns (int): the number of columns.
+        column_conflicts (list): the current conflict cost of each column.
+        column_of (list): the column of each position, or of each tile's home.
+        row_of (list): the row of each position, or of each tile's home.
+        rows (int): the number of rows.
+        row_conflicts (list): the current conflict cost of each row.
+        size (int): the number of cells.
+    """
+    def __init__(self, rows, columns):
+        self.rows = rows
+        self.columns = columns
+        self.size = size = rows*columns
+        # a tile's ID is its home position, so one row and one column per
+        # position are enough to work out any tile's distance from any cell
+        self.row_of = [position // columns for position in range(size)]
+        self.column_of = [position % columns for position in range(size)]
+        self.row_conflicts = [0]*rows
+        self.column_conflicts = [0]*columns
+        # scratch space for the longest increasing subsequence, reused each time
+        self._tails = [0]*max(rows, columns)
+
+    def line_conflicts(self, cells, start, stop, step, line, axis):
+        """
+        Returns the conflict cost of one row or column: two moves for each
+        tile that has to leave the line so the rest can reach home in order.
+        That's however many of the line's own tiles aren't in its longest
+        increasing run.
+        Parameters:
+            cells (list): the current layout.
+            start, stop, step (int): the slice of cells that makes up the line.
+            line (int): the row or column number.
+            axis (int): 0 for a row, 1 for a column.
+        """
+        columns = self.columns
+        blank_id = self.size - 1
+        tails = self._tails
+        count = 0 # tiles that belong in this line
+        longest = 0 # length of the longest increasing run of them
+        for position in range(start, stop, step):
+            tile = cells[position]
+            if tile == blank_id:
+                continue
+            if axis: # columns are ordered by home row
+                if tile % columns != line:
+                    continue
+                key = tile // columns
+            else: # rows are ordered by home column
+                if tile // columns != line:
+                    continue
+                key = tile % columns
+            count += 1
+            # patience sorting: find the first tail >= key and replace it
+            low, high = 0, longest
+            while low < high:
+                middle = (low+high) >> 1
+                if tails[middle] < key:
+                    low = middle + 1
+                else:
+                    high = middle
+            tails[low] = key
+            if low == longest:
+                longest += 1
+        return 2*(count-longest)
+
+    def row(self, cells, row):
+        """
+        Returns the conflict cost of the given row.
+        """
+        start = row*self.columns
+        return self.line_conflicts(cells, start, start+self.columns, 1, row, 0)
+
+    def column(self, cells, column):
+        """
+        Returns the conflict cost of the given column.
+        """
+        return self.line_conflicts(cells, column, self.size, self.columns, column, 1)
+
+    def estimate(self, cells):
+        """
+        Computes the estimate from scratch and caches each line's conflicts.
+        """
+        row_of, column_of = self.row_of, self.column_of
+        blank_id = self.size - 1
+        total = sum(abs(row_of[tile]-row_of[position]) + abs(column_of[tile]-column_of[position])
+                    for position, tile in enumerate(cells) if tile != blank_id)
+        for row in range(self.rows):
+            self.row_conflicts[row] = self.row(cells, row)
+            total += self.row_conflicts[row]
+        for column in range(self.columns):
+            self.column_conflicts[column] = self.column(cells, column)
+            total += self.column_conflicts[column]
+        return total
+
+    def moved(self, cells, tile, source, target, value):
+        """
+        Returns the new estimate after a tile has slid from source to target.
+        The cells must already show the move. Calling this again with source
+        and target swapped, after undoing the move, puts everything back.
+        Parameters:
+            cells (list): the current layout.
+            tile (int): the ID of the tile that moved.
+            source (int): where the tile was.
+            target (int): where the tile is now.
+            value (int): the estimate before the move.
+        """
+        size = self.size
+        columns = self.columns
+        if source - target == 1 or target - source == 1:
+            # it moved sideways, so only its distance across and its old and
+            # new columns changed
+            column_of = self.column_of
+            home = column_of[tile]
+            value += abs(home-column_of[target]) - abs(home-column_of[source])
+            conflicts = self.column_conflicts
+            for column in (source % columns, target % columns):
+                new = self.line_conflicts(cells, column, size, columns, column, 1)
+                value += new - conflicts[column]
+                conflicts[column] = new
+        else:
+            # it moved up or down, so only its distance down and its old and
+            # new rows changed
+            row_of = self.row_of
+            home = row_of[tile]
+            value += abs(home-row_of[target]) - abs(home-row_of[source])
+            conflicts = self.row_conflicts
+            for row in (source // columns, target // columns):
+                start = row*columns
+                new = self.line_conflicts(cells, start, start+columns, 1, row, 0)
+                value += new - conflicts[row]
+                conflicts[row] = new
+        return value
+
+def solve(cells, rows, columns, heuristic=None, cancel=None, max_nodes=None):
+    """
+    Finds a shortest solution with IDA*: a series of depth-first searches,
+    each one cut off where the moves so far plus the heuristic's estimate go
+    over a bound, which rises to the smallest overshoot each time.
+    Parameters:
+        cells (sequence): the ID of the tile at each position, with the
+            highest ID marking the empty cell, as in Board.cells.
+        rows (int): the number of rows.
+        columns (int): the number of columns.
+        heuristic (object): an admissible estimate with estimate() and moved()
+            methods like ManhattanHeuristic, which is used by default.
+        cancel (Event): stops the search with SearchAborted once it's set.
+        max_nodes (int): stops the search with SearchAborted after this many
+            nodes.
+    Returns:
+        Solution: the moves, with search statistics.
+    """
+    cells = list(cells) # plain lists index fastest
+    if not is_solvable(cells, rows, columns):
+        raise ValueError('this layout cannot be solved')
+    started = time.perf_counter()
+    size = rows*columns
+    blank_id = size - 1
+    goal = list(range(size))
+    neighbors = neighbor_table(rows, columns)
+    heuristic = heuristic or ManhattanHeuristic(rows, columns)
+    moved = heuristic.moved
+    path = [] # positions of the tiles slid so far
+    nodes = 0
+    limit = max_nodes or float('inf')
+    is_cancelled = cancel.is_set if cancel is not None else (lambda: False)
+
+    def search(blank, g, h, previous):
+        """
+        Looks for a solution within the bound from the current layout.
+        Returns -1 when solved, or the smallest f-value that went past the bound.
+        """
+        nonlocal nodes
+        nodes += 1
+        if not nodes & 0xFFF: # check in every few thousand nodes
+            if nodes > limit or is_cancelled():
+                raise SearchAborted('stopped after {} nodes'.format(nodes))
+        if h == 0 and cells == goal:
+            return -1
+        g += 1
+        minimum = sys.maxsize
+        for position in neighbors[blank]:
+            if position == previous: # never undo the last move
+                continue
+            # slide the tile at position into the empty cell
+            tile = cells[position]
+            cells[blank] = tile
+            cells[position] = blank_id
+            h2 = moved(cells, tile, position, blank, h)
+            f = g + h2
+            if f <= bound:
+                path.append(position)
+                f = search(position, g, h2, blank)
+                if f < 0:
+                    return f # leave everything as it is on the way out
+                path.pop()
+            # and slide it back
+            cells[position] = tile
+            cells[blank] = blank_id
+            moved(cells, tile, blank, position, h2)
+            if f < minimum:
+                minimum = f
+        return minimum
+
+    h = heuristic.estimate(cells)
+    bound = h
+    blank = cells.index(blank_id)
+    while True:
+        result = search(blank, 0, h, -1)
+        if result < 0:
+            break
+        bound = result
+    return Solution(path, nodes, time.perf_counter()-started)
+
+def main():
+    """
+    Solves random boards and prints search statistics.
+    Usage: solver.py [rows] [columns] [count] [seed]
+    """
+    args = [int(arg) for arg in sys.argv[1:]]
+    rows, columns, count, seed = args + [4, 4, 10, 0][len(args):]
+    rng = random.Random(seed)
+    total_nodes = total_seconds = 0
+    for i in range(count):
+        solution = solve(random_cells(rows, columns, rng), rows, columns)
+        total_nodes += solution.nodes
+        total_seconds += solution.seconds
+        print('{}: {} moves, {} nodes, {:.2f}s, {:.0f} nodes/s'.format(
+            i, len(solution.moves), solution.nodes, solution.seconds, solution.rate))
+    print('total: {} nodes, {:.2f}s, {:.0f} nodes/s'.format(
+        total_nodes, total_seconds, total_nodes/total_seconds if total_seconds else 0))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,297 @@
+#-------------------------------------------------------------------------------
+# Name:        Sliding Puzzle state spaces
+# Purpose:     Enumerate every reachable layout of a small board, so the exact
+#              distance and an optimal next move can be looked up directly.
+#-------------------------------------------------------------------------------
+import os
+import sys
+import mmap
+import time
+import struct
+import hashlib
+import argparse
+import tempfile
+from array import array
+from solver import neighbor_table
+
+MAGIC = b'SPSS'
+VERSION = 1
+# magic, version, rows, columns, greatest distance, then a sha256 of the table
+HEADER = struct.Struct('<4sHBBB32s')
+# distances are kept mod MODULUS in four bits, leaving 15 for unreachable
+MODULUS = 15
+UNSEEN = 15
+# 12 cells is 240MB on disk and hours of pure Python to build, so that's the limit
+MAX_CELLS = 12
+# the shapes that build in seconds to a minute or so
+SHAPES = ((2, 2), (2, 3), (2, 4), (2, 5), (3, 3))
+
+def factorial(number):
+    result = 1
+    for i in range(2, number + 1):
+        result *= i
+    return result
+
+def rank(cells):
+    """
+    Ranks a permutation with Myrvold and Ruskey's linear-time perfect hash:
+    every ordering of n tiles gets a distinct number below n!.
+    """
+    cells = list(cells)
+    inverse = [0]*len(cells)
+    for position, tile in enumerate(cells):
+        inverse[tile] = position
+    result = 0
+    multiplier = 1
+    for last in range(len(cells) - 1, 0, -1):
+        tile = cells[last]
+        other = inverse[last]
+        cells[last], cells[other] = last, tile
+        inverse[tile], inverse[last] = other, last
+        result += tile*multiplier
+        multiplier *= last + 1
+    return result
+
+def unrank(number, size):
+    """
+    The inverse of rank(): returns the permutation with the given number.
+    """
+    cells = list(range(size))
+    for last in range(size - 1, 0, -1):
+        number, digit = divmod(number, last + 1)
+        cells[last], cells[digit] = cells[digit], cells[last]
+    return cells
+
+def build(rows, columns, progress=None):
+    """
+    Finds every layout's distance from the goal with a breadth-first search
+    outward from the goal, one distance at a time.
+    Parameters:
+        rows (int): the number of rows.
+        columns (int): the number of columns.
+        progress (function): called with each distance and how many layouts
+            are that far away, or None.
+    Returns:
+        tuple: the table of nibbles, two per byte, holding each rank()'s
+            distance mod MODULUS, and the greatest distance.
+    """
+    size = rows*columns
+    if size > MAX_CELLS:
+        raise ValueError('{}x{} has too many layouts to enumerate'.format(rows, columns))
+    blank_id = size - 1
+    neighbors = neighbor_table(rows, columns)
+    table = bytearray(b'\xff'*((factorial(size) + 1)//2))
+    goal = rank(range(size))
+    table[goal >> 1] &= 0xF0 if goal & 1 == 0 else 0x0F # distance 0
+    frontier = array('Q', [goal])
+    distance = 0
+    while frontier:
+        if progress:
+            progress(distance, len(frontier))
+        distance += 1
+        value = distance % MODULUS
+        following = array('Q')
+        for number in frontier:
+            cells = unrank(number, size)
+            blank = cells.index(blank_id)
+            for position in neighbors[blank]:
+                cells[blank], cells[position] = cells[position], blank_id
+                neighbor = rank(cells)
+                cells[position], cells[blank] = cells[blank], blank_id
+                index = neighbor >> 1
+                shift = (neighbor & 1) << 2
+                if (table[index] >> shift) & 15 == UNSEEN:
+                    table[index] = (table[index] & ~(15 << shift)) | (value << shift)
+                    following.append(neighbor)
+        frontier = following
+    return table, distance - 1
+
+def filename(rows, columns):
+    """
+    Returns the file name for a state space, such as 3x3.sss.
+    """
+    return '{}x{}.sss'.format(rows, columns)
+
+def save(path, rows, columns, table, depth):
+    """
+    Writes a state space to disk with a header and checksum.
+    """
+    digest = hashlib.sha256(table).digest()
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, rows, columns, depth, digest))
+        f.write(table)
+
+class StateSpace(object):
+    """
+    An object of this class is a state space loaded from disk, memory-mapped
+    like a PatternDatabase. Each layout's distance is only stored mod
+    MODULUS, but every move changes the distance by exactly one, so the
+    neighbor that's one step closer is always the one whose value is one
+    less: that's an optimal next move, and following them to the goal gives
+    the exact distance.
+    Attributes:
+        columns (int): the number of columns.
+        depth (int): the greatest distance of any layout.
+        digest (bytes): the sha256 of the table, from the file's header.
+        neighbors (list): each position's neighboring positions.
+        rows (int): the number of rows.
+        size (int): the number of cells.
+        table (memoryview): the nibble for each rank(), two per byte.
+    """
+    def __init__(self, path, verify=False):
+        """
+        Maps the given file.
+        Parameters:
+            path (str): the file to load.
+            verify (bool): whether to check the table against its checksum,
+                which means reading the whole thing.
+        """
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, version, self.rows, self.columns, self.depth, self.digest = \
+                HEADER.unpack_from(self._map)
+        except struct.error:
+            raise ValueError('{} is too short to be a state space'.format(path))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('{} is not a version {} state space'.format(path, VERSION))
+        self.size = self.rows*self.columns
+        self.table = memoryview(self._map)[HEADER.size:]
+        if len(self.table) != (factorial(self.size) + 1)//2:
+            raise ValueError('{} has the wrong table size'.format(path))
+        if verify and not self.verify():
+            raise ValueError('{} failed its checksum'.format(path))
+        self.neighbors = neighbor_table(self.rows, self.columns)
+
+    def verify(self):
+        """
+        Whether the table matches the checksum in the header.
+        """
+        return hashlib.sha256(self.table).digest() == self.digest
+
+    def value(self, cells):
+        """
+        Returns the given layout's distance mod MODULUS, or UNSEEN if it
+        can't be solved.
+        """
+        number = rank(cells)
+        return (self.table[number >> 1] >> ((number & 1) << 2)) & 15
+
+    def next_move(self, cells):
+        """
+        Returns the position of a tile to move, as Board.move() takes it,
+        that brings the given layout one step closer to solved, or None if
+        it's already solved.
+        """
+        cells = list(cells)
+        value = self.value(cells)
+        if value == UNSEEN:
+            raise ValueError('this layout cannot be solved')
+        blank_id = self.size - 1
+        blank = cells.index(blank_id)
+        if value == 0 and blank == blank_id and cells == sorted(cells):
+            return None
+        closer = (value - 1) % MODULUS
+        for position in self.neighbors[blank]:
+            cells[blank], cells[position] = cells[position], blank_id
+            found = self.value(cells) == closer
+            cells[position], cells[blank] = cells[blank], blank_id
+            if found:
+                return position
+        raise ValueError('the state space is inconsistent')
+
+    def solution(self, cells):
+        """
+        Returns an optimal list of moves for the given layout.
+        """
+        cells = list(cells)
+        blank_id = self.size - 1
+        moves = []
+        position = self.next_move(cells)
+        while position is not None:
+            blank = cells.index(blank_id)
+            cells[blank], cells[position] = cells[position], blank_id
+            moves.append(position)
+            position = self.next_move(cells)
+        return moves
+
+    def distance(self, cells):
+        """
+        Returns the exact number of moves the given layout needs.
+        """
+        return len(self.solution(cells))
+
+def load(rows, columns, directory, verify=False):
+    """
+    Loads the state space for the given board size from a folder.
+    """
+    return StateSpace(os.path.join(directory, filename(rows, columns)), verify)
+
+def report(shapes=SHAPES, directory=None):
+    """
+    Builds each shape's state space, printing how long it took, how big it
+    is, and how long lookups take.
+    """
+    from solvability import random_cells
+    import random
+    directory = directory or tempfile.mkdtemp()
+    os.makedirs(directory, exist_ok=True)
+    print('shape  layouts       build     file size  depth  next move  distance')
+    for rows, columns in shapes:
+        start = time.perf_counter()
+        table, depth = build(rows, columns)
+        built = time.perf_counter() - start
+        path = os.path.join(directory, filename(rows, columns))
+        save(path, rows, columns, table, depth)
+        space = StateSpace(path)
+        rng = random.Random(0)
+        layouts = [random_cells(rows, columns, rng) for _ in range(100)]
+        start = time.perf_counter()
+        for cells in layouts:
+            space.next_move(cells)
+        move = (time.perf_counter() - start)/len(layouts)
+        start = time.perf_counter()
+        for cells in layouts:
+            space.distance(cells)
+        distance = (time.perf_counter() - start)/len(layouts)
+        print('{}x{}  {:>9}  {:8.2f}s  {:10.1f}KiB  {:5}  {:7.1f}us  {:6.2f}ms'.format(
+            rows, columns, factorial(rows*columns)//2, built, os.path.getsize(path)/1024,
+            depth, move*1e6, distance*1e3), flush=True)
+
+def main():
+    parser = argparse.ArgumentParser(description='Build or check complete state spaces of small boards.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    builder = commands.add_parser('build', help='build the state space for a board size')
+    builder.add_argument('--rows', type=int, default=3)
+    builder.add_argument('--columns', type=int, default=3)
+    builder.add_argument('--output', default='.', help='folder for the .sss file')
+    checker = commands.add_parser('check', help='verify the checksums of .sss files')
+    checker.add_argument('files', nargs='+')
+    reporter = commands.add_parser('report', help='build every shape up to 2x5 and 3x3, '
+                                   'with timings and sizes')
+    reporter.add_argument('--output', help='folder to keep the .sss files in')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        os.makedirs(args.output, exist_ok=True)
+        path = os.path.join(args.output, filename(args.rows, args.columns))
+        print('building', path)
+        table, depth = build(args.rows, args.columns,
+                             lambda distance, count: print('  distance {}: {} layouts'.format(distance, count)))
+        save(path, args.rows, args.columns, table, depth)
+    elif args.command == 'check':
+        failed = False
+        for path in args.files:
+            try:
+                StateSpace(path, verify=True)
+            except ValueError as e:
+                print(e)
+                failed = True
+            else:
+                print(path, 'OK')
+        sys.exit(failed)
+    else:
+        report(directory=args.output)
+
+if __name__ == '__main__':
+    main()
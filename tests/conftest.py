@@ -0,0 +1,36 @@
+import os
+import sys
+import pytest
+
+# the game's modules sit at the top of the repository, not in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import statespace
+from board import Board
+
+@pytest.fixture(scope='session')
+def state_folder(tmp_path_factory):
+    """
+    A folder holding the 3x3 state space, built once for every test that
+    needs exact distances, which takes a few seconds.
+    """
+    folder = tmp_path_factory.mktemp('statespace')
+    table, depth = statespace.build(3, 3)
+    statespace.save(str(folder / statespace.filename(3, 3)), 3, 3, table, depth)
+    return str(folder)
+
+@pytest.fixture(scope='session')
+def space_3x3(state_folder):
+    return statespace.load(3, 3, state_folder, verify=True)
+
+@pytest.fixture
+def replay():
+    """
+    Plays moves on a Board, failing on an illegal one, and returns the Board.
+    """
+    def replay(rows, columns, cells, moves):
+        board = Board(rows, columns, cells)
+        for number, position in enumerate(moves):
+            assert board.move(position) is not None, 'move {} is illegal'.format(number)
+        return board
+    return replay
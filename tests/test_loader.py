@@ -0,0 +1,36 @@
+from PIL import Image
+from loader import DecodedCache, FrameLoader, scaled_size
+
+def load(open_image, max_height, cache=None, key='image'):
+    loader = FrameLoader(lambda: (key, 'Filename: ', open_image, None), max_height, cache)
+    assert loader.wait(10)
+    return loader, loader.poll()
+
+def test_scaled_size():
+    assert scaled_size((800, 600), 1000) == (800, 600)
+    assert scaled_size((800, 600), 300) == (400, 300)
+
+def test_mpo_frames_are_all_decoded(tmp_path):
+    # a multi-frame JPEG can't seek past frame 0 once it's been drafted
+    path = str(tmp_path / 'pair.mpo')
+    first = Image.new('RGB', (800, 600), 'red')
+    first.save(path, save_all=True, append_images=[Image.new('RGB', (800, 600), 'blue')])
+    cache = DecodedCache(10**8)
+    loader, frames = load(lambda: Image.open(path), 150, cache)
+    assert loader.error is None and loader.done
+    assert [frame.size for frame, keys in frames] == [(200, 150)]*2
+    assert frames[0][0].getpixel((100, 75))[0] > 200
+    assert frames[1][0].getpixel((100, 75))[2] > 200
+    assert cache.stats()['entries'] == 1
+    # so the second load comes from the cache without opening the file
+    loader, frames = load(None, 150, cache)
+    assert loader.error is None and len(frames) == 2
+    assert cache.stats()['hits'] == 1
+
+def test_open_error_is_reported():
+    def missing():
+        raise FileNotFoundError('missing.png')
+    cache = DecodedCache(10**8)
+    loader, frames = load(missing, 100, cache)
+    assert frames == [] and isinstance(loader.error, FileNotFoundError)
+    assert cache.stats()['entries'] == 0
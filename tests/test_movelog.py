@@ -0,0 +1,117 @@
+import json
+import random
+import pytest
+from board import Board
+from movelog import (MoveLog, direction, load_session, save_session, session_dict,
+                     starting_cells, step_table, validate)
+from solvability import random_cells
+
+def random_game(rows, columns, count, seed=0):
+    """
+    Returns a starting layout and count random legal moves from it.
+    """
+    rng = random.Random(seed)
+    cells = random_cells(rows, columns, rng)
+    board = Board(rows, columns, cells)
+    moves = []
+    while len(moves) < count:
+        position = rng.choice([p for p in step_table(rows, columns)[board.blank] if p >= 0])
+        board.move(position)
+        moves.append(position)
+    return cells, moves
+
+def logged(rows, columns, cells, moves, interval=1024):
+    log = MoveLog(rows, columns, cells, interval)
+    for position in moves:
+        log.append(position)
+    return log
+
+def test_direction():
+    assert direction(5, 1, 4) is not None and direction(5, 9, 4) is not None
+    assert direction(4, 3, 4) is None # that wraps round to the row above
+    assert direction(5, 7, 4) is None
+
+def test_bytes_round_trip():
+    for count in (0, 1, 3, 4, 5, 1000, 2049):
+        cells, moves = random_game(4, 5, count, seed=count)
+        log = logged(4, 5, cells, moves)
+        assert len(log.to_bytes()) == (count + 3)//4
+        copy = MoveLog.from_bytes(4, 5, cells, log.to_bytes(), count)
+        assert list(copy.positions()) == moves
+        assert copy.cells == log.cells
+        board = Board(4, 5, cells)
+        for position in moves:
+            board.move(position)
+        assert list(copy.cells) == list(board.cells)
+
+def test_seek_matches_replaying():
+    cells, moves = random_game(5, 5, 300, seed=1)
+    log = logged(5, 5, cells, moves, interval=16)
+    assert len(log.checkpoints) == 300//16 + 1
+    board = Board(5, 5, cells)
+    assert log.seek(0) == list(cells)
+    for index, position in enumerate(moves, 1):
+        board.move(position)
+        assert log.seek(index) == list(board.cells)
+    with pytest.raises(IndexError):
+        log.seek(301)
+
+def test_illegal_moves_are_refused():
+    log = MoveLog(3, 3, range(9))
+    with pytest.raises(ValueError):
+        log.append(0)
+    with pytest.raises(ValueError):
+        MoveLog(3, 3, [0]*9)
+    with pytest.raises(ValueError):
+        MoveLog.from_bytes(3, 3, range(9), b'', 4)
+
+def test_validate():
+    # walk the empty cell away from solved, then log the walk back
+    rng = random.Random(2)
+    board = Board(4, 4)
+    trail = [board.blank]
+    for i in range(200):
+        position = rng.choice([p for p in step_table(4, 4)[board.blank] if p >= 0])
+        board.move(position)
+        trail.append(position)
+    cells = list(board.cells)
+    log = logged(4, 4, cells, trail[-2::-1])
+    assert log.solved
+    assert validate(4, 4, cells, log.to_bytes(), log.count)
+    assert not validate(4, 4, cells, log.to_bytes(), log.count - 2) # stopped short
+    assert not validate(4, 4, cells, log.to_bytes()[:-1], log.count) # not enough data
+    assert validate(4, 4, range(16), b'', 0)
+
+def test_validate_rejects_moves_off_the_board():
+    assert not validate(4, 4, range(16), bytes([1]), 1) # DOWN from the bottom row
+    assert not validate(4, 4, range(16), bytes([3]), 1) # RIGHT from the last column
+
+def test_session_round_trip(tmp_path):
+    path = str(tmp_path / 'game.json')
+    cells = starting_cells(4, 4, 7)
+    board = Board(4, 4, cells)
+    log = MoveLog(4, 4, cells)
+    rng = random.Random(3)
+    for i in range(50):
+        position = rng.choice([p for p in step_table(4, 4)[board.blank] if p >= 0])
+        board.move(position)
+        log.append(position)
+    save_session(path, 'cat.png', log, 7)
+    image, seed, loaded = load_session(path)
+    assert (image, seed, loaded.count) == ('cat.png', 7, 50)
+    assert list(loaded.cells) == list(board.cells)
+
+@pytest.mark.parametrize('field, value', [('moves', '5'), ('rows', '4'), ('seed', None),
+                                          ('moves', -1), ('columns', 0), ('log', 5),
+                                          ('version', 2), ('image', KeyError)])
+def test_bad_sessions_raise_value_error(tmp_path, field, value):
+    path = str(tmp_path / 'game.json')
+    session = session_dict('cat.png', MoveLog(4, 4, starting_cells(4, 4, 1)), 1)
+    if value is KeyError:
+        del session[field]
+    else:
+        session[field] = value
+    with open(path, 'w') as file:
+        json.dump(session, file)
+    with pytest.raises(ValueError):
+        load_session(path)
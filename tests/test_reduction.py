@@ -0,0 +1,50 @@
+import random
+import threading
+import pytest
+import reduction
+from solvability import random_cells
+from solver import SearchAborted
+
+SHAPES = [(3, 3), (3, 4), (4, 3), (4, 4), (3, 7), (7, 3), (5, 6), (6, 5), (8, 8), (4, 11), (12, 5)]
+
+@pytest.mark.parametrize('rows, columns', SHAPES)
+def test_reduction_solves_small_shapes(rows, columns, replay):
+    rng = random.Random(rows*100 + columns)
+    for i in range(10):
+        cells = random_cells(rows, columns, rng, rng.randrange(rows*columns))
+        moves = reduction.solve(cells, rows, columns)
+        assert replay(rows, columns, cells, moves).solved
+
+@pytest.mark.parametrize('rows, columns', [(4, 4), (6, 9), (20, 20)])
+def test_compress_keeps_the_result(rows, columns, replay):
+    rng = random.Random(rows*columns)
+    for i in range(3):
+        cells = random_cells(rows, columns, rng, rng.randrange(rows*columns))
+        raw = reduction.solve(cells, rows, columns)
+        moves = reduction.solve(cells, rows, columns, compress=True)
+        assert len(moves) <= len(raw)
+        assert replay(rows, columns, cells, moves).solved
+
+def test_compress_cancels_back_and_forth_and_full_turns(replay):
+    # the empty cell starts at 5 on a 3x3: out and back, then twelve turns of
+    # the lower right square, which put every tile back, leave nothing
+    square = [4, 7, 8, 5]*3
+    moves = [4, 5] + square
+    assert reduction.compress(moves, 5, 3) == []
+    # and 13 turns are the same as one
+    cells = [0, 1, 2, 3, 4, 8, 6, 7, 5]
+    assert reduction.compress(square + [4], 5, 3) == [4]
+    assert replay(3, 3, cells, square + [4]).cells == replay(3, 3, cells, [4]).cells
+
+def test_already_solved_board_needs_no_moves():
+    assert reduction.solve(range(20), 4, 5) == []
+
+def test_unsolvable_layout_is_refused():
+    with pytest.raises(ValueError):
+        reduction.solve([1, 0] + list(range(2, 16)), 4, 4)
+
+def test_cancel_stops_between_lines():
+    cancel = threading.Event()
+    cancel.set()
+    with pytest.raises(SearchAborted):
+        reduction.solve(random_cells(10, 10, random.Random(0)), 10, 10, cancel=cancel)
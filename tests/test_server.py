@@ -0,0 +1,130 @@
+import asyncio
+import base64
+import io
+import json
+import pytest
+from PIL import Image
+from board import Board
+from movelog import starting_cells, validate
+from server import MAX_BATCH, MAX_SIDE, Client, GameServer
+from solver import solve
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+async def request(server, **message):
+    return await server.handle(json.dumps(message))
+
+def test_new_move_state_save_close():
+    async def game():
+        server = GameServer()
+        reply = await request(server, op='new', id=1, rows=3, columns=4, seed=5)
+        assert reply['id'] == 1 and reply['seed'] == 5
+        assert reply['cells'] == starting_cells(3, 4, 5)
+        session = reply['session']
+        board = Board(3, 4, reply['cells'])
+        legal = [p for p in range(12) if board.is_movable(p)]
+        board.move(legal[0])
+        reply = await request(server, op='move', session=session, moves=[legal[0], 99])
+        assert reply == {'moved': 1, 'blank': board.blank, 'solved': False, 'rejected': 99}
+        reply = await request(server, op='state', session=session)
+        assert reply == {'cells': list(board.cells), 'moves': 1, 'solved': False}
+        saved = await request(server, op='save', session=session)
+        assert (saved['rows'], saved['columns'], saved['seed'], saved['moves']) == (3, 4, 5, 1)
+        assert (await request(server, op='stats'))['sessions'] == 1
+        assert await request(server, op='close', session=session) == {}
+        assert 'error' in await request(server, op='state', session=session)
+        assert (await request(server, op='stats'))['sessions'] == 0
+    run(game())
+
+def test_solving_a_game_is_reported_and_validates():
+    async def game():
+        server = GameServer()
+        reply = await request(server, op='new', rows=3, columns=3, seed=2)
+        cells, session = reply['cells'], reply['session']
+        moves = solve(cells, 3, 3).moves
+        reply = await request(server, op='move', session=session, moves=moves)
+        assert reply == {'moved': len(moves), 'blank': 8, 'solved': True}
+        saved = await request(server, op='save', session=session)
+        assert validate(3, 3, cells, base64.b64decode(saved['log']), saved['moves'])
+    run(game())
+
+@pytest.mark.parametrize('message', [
+    'not json', '[1, 2]', '{"op": "fly"}',
+    '{"op": "new", "rows": 1}', '{"op": "new", "columns": %d}' % (MAX_SIDE + 1),
+    '{"op": "new", "rows": "4"}', '{"op": "new", "seed": "x"}',
+    '{"op": "new", "max_height": 4.5}', '{"op": "new", "max_height": 100000}',
+    '{"op": "new", "image": "cat.png"}', '{"op": "new", "image": "http://example.com/a.png"}',
+    '{"op": "move", "session": "nope", "moves": []}', '{"op": "state"}',
+])
+def test_bad_messages_get_errors(message):
+    reply = run(GameServer().handle(message))
+    assert set(reply) == {'error'}
+
+def test_move_limits():
+    async def game():
+        server = GameServer()
+        session = (await request(server, op='new'))['session']
+        for moves in ('5', [0]*(MAX_BATCH + 1)):
+            assert 'error' in await request(server, op='move', session=session, moves=moves)
+        reply = await request(server, op='move', session=session, moves=['a'])
+        assert reply['moved'] == 0 and reply['rejected'] == 'a'
+    run(game())
+
+def test_images_stay_in_the_folder_and_are_sliced_once(tmp_path):
+    Image.new('RGB', (80, 40), 'red').save(str(tmp_path / 'red.png'))
+    (tmp_path / 'inner').mkdir()
+    async def game():
+        server = GameServer(str(tmp_path / 'inner'))
+        assert 'error' in await request(server, op='new', image='../red.png')
+        server = GameServer(str(tmp_path))
+        sessions = [(await request(server, op='new', rows=2, columns=4, image='red.png',
+                                   max_height=20))['session'] for i in range(2)]
+        first = await request(server, op='tiles', session=sessions[0])
+        second = await request(server, op='tiles', session=sessions[1])
+        assert first == second
+        assert (first['width'], first['height'], len(first['tiles'])) == (40, 20, 8)
+        tile = Image.open(io.BytesIO(base64.b64decode(first['tiles'][0])))
+        assert tile.size == (10, 10) and tile.getpixel((5, 5))[:3] == (255, 0, 0)
+        assert (server.slices.hits, server.slices.misses) == (1, 1)
+        plain = (await request(server, op='new'))['session']
+        assert 'error' in await request(server, op='tiles', session=plain)
+    run(game())
+
+def test_clients_over_tcp():
+    async def game():
+        server = GameServer()
+        listening = asyncio.get_running_loop().create_future()
+        task = asyncio.create_task(server.run('127.0.0.1', 0, listening.set_result))
+        port = await listening
+        try:
+            clients = [await Client.connect('127.0.0.1', port) for i in range(3)]
+            # several requests in flight at once on each connection
+            replies = await asyncio.gather(*(client.request('new', rows=3, columns=3, seed=i)
+                                             for i, client in enumerate(clients*4)))
+            assert len({reply['session'] for reply in replies}) == 12
+            assert [reply['seed'] for reply in replies] == list(range(12))
+            with pytest.raises(ValueError):
+                await clients[0].request('state', session='nope')
+            # sessions outlive connections
+            await clients[0].close()
+            reply = await clients[1].request('state', session=replies[0]['session'])
+            assert reply['moves'] == 0
+            assert (await clients[2].request('stats'))['sessions'] == 12
+            for client in clients[1:]:
+                await client.close()
+        finally:
+            task.cancel()
+    run(game())
+
+def test_idle_sessions_are_evicted():
+    async def game():
+        server = GameServer(idle_timeout=0.05)
+        listening = asyncio.get_running_loop().create_future()
+        task = asyncio.create_task(server.run('127.0.0.1', 0, listening.set_result))
+        await listening
+        await request(server, op='new')
+        await asyncio.sleep(0.2)
+        task.cancel()
+        assert not server.sessions and server.evicted == 1
+    run(game())
@@ -0,0 +1,41 @@
+import itertools
+import random
+import pytest
+import statespace
+from solvability import count_inversions, is_solvable, permutation_parity, random_cells
+
+@pytest.mark.parametrize('rows, columns', [(2, 2), (2, 3), (3, 2), (2, 4)])
+def test_is_solvable_matches_the_state_space(rows, columns):
+    # every layout the breadth-first search reached is solvable, and no other
+    table, depth = statespace.build(rows, columns)
+    size = rows*columns
+    for cells in itertools.permutations(range(size)):
+        number = statespace.rank(cells)
+        reached = (table[number >> 1] >> ((number & 1) << 2)) & 15 != statespace.UNSEEN
+        assert is_solvable(cells, rows, columns) == reached, cells
+
+def test_count_inversions_matches_brute_force():
+    rng = random.Random(0)
+    for length in (0, 1, 2, 5, 17, 100):
+        for i in range(20):
+            sequence = [rng.randrange(50) for j in range(length)]
+            expected = sum(1 for a, b in itertools.combinations(sequence, 2) if a > b)
+            assert count_inversions(sequence) == expected
+
+def test_permutation_parity_matches_inversions():
+    rng = random.Random(1)
+    for i in range(50):
+        cells = list(range(30))
+        rng.shuffle(cells)
+        assert permutation_parity(cells) == count_inversions(cells) % 2
+
+@pytest.mark.parametrize('rows, columns', [(3, 3), (4, 4), (3, 5), (6, 4), (10, 10)])
+def test_random_cells_are_solvable(rows, columns):
+    rng = random.Random(2)
+    size = rows*columns
+    for blank in (None, 0, size//2, size - 1):
+        for i in range(20):
+            cells = random_cells(rows, columns, rng, blank)
+            assert sorted(cells) == list(range(size))
+            assert cells.index(size - 1) == (size - 1 if blank is None else blank)
+            assert is_solvable(cells, rows, columns)
@@ -0,0 +1,116 @@
+import random
+import threading
+import time
+import pytest
+import patterndb
+from hints import Hinter
+from solvability import random_cells
+from solver import ManhattanHeuristic, SearchAborted, neighbor_table, solve
+
+def layouts(count, seed=0):
+    rng = random.Random(seed)
+    return [random_cells(3, 3, rng, rng.randrange(9)) for i in range(count)]
+
+@pytest.fixture(scope='module')
+def pattern_folder(tmp_path_factory):
+    folder = tmp_path_factory.mktemp('patterndb')
+    for pattern in patterndb.partition(3, 3):
+        path = str(folder / patterndb.filename(3, 3, pattern))
+        patterndb.save(path, 3, 3, pattern, patterndb.build(3, 3, pattern))
+    return str(folder)
+
+def test_state_space_solutions_are_exact(space_3x3, replay):
+    for cells in layouts(30):
+        moves = space_3x3.solution(cells)
+        assert replay(3, 3, cells, moves).solved
+        assert space_3x3.distance(cells) == len(moves) <= space_3x3.depth
+
+def test_state_space_rejects_unsolvable_layouts(space_3x3):
+    with pytest.raises(ValueError):
+        space_3x3.next_move([1, 0, 2, 3, 4, 5, 6, 7, 8])
+
+def test_ida_star_is_optimal_on_3x3(space_3x3, replay):
+    for cells in layouts(25, seed=1):
+        moves = solve(cells, 3, 3).moves
+        assert replay(3, 3, cells, moves).solved
+        assert len(moves) == space_3x3.distance(cells)
+
+def test_pattern_databases_are_optimal_on_3x3(space_3x3, pattern_folder, replay):
+    for cells in layouts(25, seed=2):
+        heuristic = patterndb.load_heuristic(3, 3, pattern_folder, verify=True)
+        assert heuristic.estimate(cells) <= space_3x3.distance(cells) # admissible
+        moves = solve(cells, 3, 3, heuristic).moves
+        assert replay(3, 3, cells, moves).solved
+        assert len(moves) == space_3x3.distance(cells)
+
+def test_manhattan_moved_matches_estimate():
+    # the incremental update has to agree with estimating from scratch
+    rng = random.Random(3)
+    rows, columns = 4, 5
+    heuristic = ManhattanHeuristic(rows, columns)
+    neighbors = neighbor_table(rows, columns)
+    cells = random_cells(rows, columns, rng)
+    blank_id = rows*columns - 1
+    blank = cells.index(blank_id)
+    value = heuristic.estimate(cells)
+    for i in range(500):
+        position = rng.choice(neighbors[blank])
+        tile = cells[position]
+        cells[blank], cells[position] = tile, blank_id
+        value = heuristic.moved(cells, tile, position, blank, value)
+        blank = position
+        assert value == ManhattanHeuristic(rows, columns).estimate(cells)
+
+def test_solve_rejects_unsolvable_layouts():
+    with pytest.raises(ValueError):
+        solve([1, 0, 2, 3, 4, 5, 6, 7, 8], 3, 3)
+
+def test_node_limit_and_cancel_abort_the_search():
+    # a random 4x4 takes far more than a few thousand nodes
+    cells = random_cells(4, 4, random.Random(7))
+    with pytest.raises(SearchAborted):
+        solve(cells, 4, 4, max_nodes=10000)
+    cancel = threading.Event()
+    cancel.set()
+    with pytest.raises(SearchAborted):
+        solve(cells, 4, 4, cancel=cancel)
+
+def wait_for(hinter, seconds=30):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        path = hinter.poll()
+        if path is not None or hinter.error:
+            return path
+        time.sleep(0.01)
+    raise AssertionError('no hint after {} seconds'.format(seconds))
+
+def test_hinter_follows_the_state_space(space_3x3, state_folder):
+    cells = layouts(1, seed=4)[0]
+    hinter = Hinter(3, 3, state_folder=state_folder)
+    hinter.ask(cells)
+    path = list(wait_for(hinter))
+    assert len(path) == space_3x3.distance(cells)
+    hinter.moved(path[0]) # on course, so the rest is kept
+    assert hinter.path == path[1:]
+    hinter.moved(-1) # off course
+    assert hinter.path is None and not hinter.searching
+
+def test_hinter_reduces_big_boards(tmp_path, replay):
+    cells = random_cells(30, 30, random.Random(5))
+    hinter = Hinter(30, 30, pdb_folder=str(tmp_path))
+    hinter.ask(cells)
+    path = wait_for(hinter)
+    assert replay(30, 30, cells, path).solved
+
+def test_hinter_cancel_stops_a_reduction(tmp_path):
+    # a 100x100 takes over a second, so a cancelled one has to stop early
+    hinter = Hinter(100, 100, pdb_folder=str(tmp_path))
+    before = threading.active_count()
+    hinter.ask(random_cells(100, 100, random.Random(6)))
+    assert threading.active_count() == before + 1
+    time.sleep(0.1)
+    hinter.cancel()
+    deadline = time.perf_counter() + 0.5
+    while threading.active_count() > before and time.perf_counter() < deadline:
+        time.sleep(0.01)
+    assert threading.active_count() == before
@@ -0,0 +1,111 @@
+#-------------------------------------------------------------------------------
+# Name:        Sliding Puzzle tile frames
+# Purpose:     Create each tile's animation frames only when they're first
+#              shown, and keep the most recently used ones in a bounded cache.
+#-------------------------------------------------------------------------------
+import hashlib
+from collections import OrderedDict
+from PIL import ImageTk
+
+def tile_boxes(width, height, rows, columns):
+    """
+    Returns the (left, upper, right, lower) box of each tile in an image of
+    the given size, in ID order, the same way the game slices it.
+    """
+    x_step = int(width/columns)
+    y_step = int(height/rows)
+    return [(column*x_step, row*y_step, (column+1)*x_step, (row+1)*y_step)
+            for row in range(rows) for column in range(columns)]
+
+def tile_keys(frame, boxes):
+    """
+    Returns a digest of each tile's crop of a frame. Tiles with the same
+    digest look exactly the same, in this frame or any other.
+    """
+    return [hashlib.blake2b(frame.crop(box).tobytes(), digest_size=16).digest() for box in boxes]
+
+class FrameCache(object):
+    """
+    An object of this class is a least-recently-used cache of PhotoImages
+    with a memory budget. A PhotoImage that's still on the board stays alive
+    after it's evicted as long as its Tile refers to it, so the budget only
+    decides what gets rebuilt later, never what's on screen.
+    Attributes:
+        budget (int): the most bytes to hold before evicting, estimated at
+            4 bytes per pixel.
+        evictions (int): how many PhotoImages have been dropped.
+        hits (int): how many lookups found their PhotoImage already made.
+        misses (int): how many lookups had to make a new PhotoImage.
+        used (int): the estimated bytes held now.
+    """
+    def __init__(self, budget):
+        self.budget = budget
+        self.used = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._items = OrderedDict() # key: (PhotoImage, bytes), oldest first
+
+    def get(self, key, make):
+        """
+        Returns the PhotoImage for the given key, calling make() to create it
+        if it's not in the cache.
+        Parameters:
+            key (hashable): identifies the PhotoImage.
+            make (function): returns a new (PhotoImage, bytes) tuple.
+        """
+        items = self._items
+        if key in items:
+            self.hits += 1
+            items.move_to_end(key) # it's the newest now
+            return items[key][0]
+        self.misses += 1
+        photo, size = items[key] = make()
+        self.used += size
+        while self.used > self.budget and len(items) > 1:
+            self.used -= items.popitem(last=False)[1][1] # drop the oldest
+            self.evictions += 1
+        return photo
+
+    def clear(self):
+        """
+        Drops everything.
+        """
+        self._items.clear()
+        self.used = 0
+
+class TileFrames(object):
+    """
+    An object of this class is the list of one tile's animation frames,
+    creating each PhotoImage the first time it's asked for. When the frames
+    come with tile_keys(), PhotoImages are cached by digest, so every crop
+    that looks the same shares one PhotoImage, whichever tile or frame it's
+    from.
+    Attributes:
+        box (tuple): the tile's (left, upper, right, lower) box within the
+            full image.
+        cache (FrameCache): where the PhotoImages are kept.
+        frames (list): the full-size frames of the image, shared by every tile.
+        keys (list): each frame's tile_keys(), shared by every tile, or None.
+        unit_id (int): the ID of the tile, as part of each cache key.
+    """
+    def __init__(self, unit_id, box, frames, cache, keys=None):
+        self.unit_id = unit_id
+        self.box = box
+        self.frames = frames
+        self.cache = cache
+        self.keys = keys
+
+    def __len__(self):
+        return len(self.frames)
+
+    def __getitem__(self, index):
+        key = self.keys[index][self.unit_id] if self.keys else (self.unit_id, index)
+        return self.cache.get(key, lambda: self._make(index))
+
+    def _make(self, index):
+        """
+        Crops the given frame and makes a PhotoImage of it.
+        """
+        left, upper, right, lower = self.box
+        return ImageTk.PhotoImage(self.frames[index].crop(self.box)), 4*(right-left)*(lower-upper)